@@ -17,27 +17,43 @@ class StaticObjectType(Enum):
     STATIC_STRING = 0
     STATIC_FUNC = 1
 
+# type bytes used by the native conversions, which run on every global access and call
+NULL_TYPE = ValueType.NULL.value
+I32_TYPE = ValueType.I32.value
+BOOL_TYPE = ValueType.BOOL.value
+F32_TYPE = ValueType.F32.value
+HEAP_OBJ_TYPE = ValueType.HEAP_OBJ.value
+STATIC_OBJ_TYPE = ValueType.STATIC_OBJ.value
+
 def generate_max_val():
     value = bytearray(8)
     value[0] = ValueType.MAX_VAL.value
     return value
 
+def i32_to_value(data):
+    if data > 2147483647 or data < -2147483648:
+        raise Exception("Int is Too Big!")
+    value = bytearray(8)
+    value[0] = I32_TYPE
+    value[4:] = data.to_bytes(4, byteorder='little', signed=True)
+    return value
+
+def f32_to_value(data):
+    if not(-3.4028235e+38 <= data <= 3.4028235e+38):
+        raise Exception("Float is Too Big!")
+    value = bytearray(8)
+    value[0] = F32_TYPE
+    value[4:] = struct.pack('<f', data)
+    return value
+
 def python_repr_to_value(data):
     value = bytearray(8)
     if data == None:
         return value
     elif type(data) == int:
-        if data > 2147483647 or data < -2147483648:
-            raise Exception("Int is Too Big!")
-        value[0] = ValueType.I32.value
-        value[4:] = data.to_bytes(4, byteorder='little', signed=True)
-        return value
+        return i32_to_value(data)
     elif type(data) == float:
-        if not(-3.4028235e+38 <= data <= 3.4028235e+38):
-            raise Exception("Float is Too Big!")
-        value[0] = ValueType.F32.value
-        value[4:] = struct.pack('<f', data)
-        return value
+        return f32_to_value(data)
     elif type(data) == bool:
         value[0] = ValueType.BOOL.value
         value[4:] = int(data).to_bytes(4, byteorder='little')
@@ -153,6 +169,99 @@ def compare_values(v1, v2, heap_manager):
 def print_value(val, static_objs, heap_manager):
     print(value_to_string(val, static_objs, heap_manager))
 
+class HeapRef:
+    """
+    A reference to a heap object held on a native stack, stores the object's heap id.
+    """
+    __slots__ = ("id",)
+    
+    def __init__(self, id):
+        self.id = id
+    
+    def __repr__(self):
+        return f"HeapRef[{self.id}]"
+
+class StaticRef:
+    """
+    A reference to a static object held on a native stack, stores the object's index.
+    """
+    __slots__ = ("index",)
+    
+    def __init__(self, index):
+        self.index = index
+    
+    def __repr__(self):
+        return f"StaticRef[{self.index}]"
+
+def value_to_native(v):
+    """
+    Converts a value into its native form: an int, float, bool, None, HeapRef or StaticRef. Values without a native form (addresses, op codes and max values) are kept as bytes.
+    """
+    value_type = v[0]
+    if value_type == I32_TYPE:
+        return int.from_bytes(v[4:], byteorder='little', signed=True)
+    elif value_type == F32_TYPE:
+        return struct.unpack('<f', v[4:])[0]
+    elif value_type == BOOL_TYPE:
+        return bool(int.from_bytes(v[4:], byteorder='little'))
+    elif value_type == NULL_TYPE:
+        return None
+    elif value_type == HEAP_OBJ_TYPE:
+        return HeapRef(int.from_bytes(v[4:], byteorder='little'))
+    elif value_type == STATIC_OBJ_TYPE:
+        return StaticRef(int.from_bytes(v[4:], byteorder='little'))
+    else:
+        return bytes(v)
+
+def native_to_value(n):
+    """
+    Converts a native value back into an 8 byte value.
+    """
+    if type(n) == HeapRef:
+        value = bytearray(8)
+        value[0] = HEAP_OBJ_TYPE
+        value[4:] = n.id.to_bytes(4, byteorder='little')
+        return value
+    elif type(n) == StaticRef:
+        value = bytearray(8)
+        value[0] = STATIC_OBJ_TYPE
+        value[4:] = n.index.to_bytes(4, byteorder='little')
+        return value
+    elif type(n) == bytes:
+        return bytearray(n)
+    else:
+        return python_repr_to_value(n)
+
+def native_i32(n):
+    # the range check i32_to_value makes, for the result of arithmetic on native ints
+    if n > 2147483647 or n < -2147483648:
+        raise Exception("Int is Too Big!")
+    return n
+
+def native_f32(n):
+    # rounds a native float to the nearest f32, like a round trip through f32_to_value
+    if not(-3.4028235e+38 <= n <= 3.4028235e+38):
+        raise Exception("Float is Too Big!")
+    return struct.unpack('<f', struct.pack('<f', n))[0]
+
+def round_native(n):
+    """
+    Rounds the result of arithmetic on native numbers the way storing it as a value would, so native stacks compute what the 8 byte format does.
+    """
+    if type(n) == int:
+        return native_i32(n)
+    elif type(n) == float:
+        return native_f32(n)
+    raise Exception("Trying to Convert Incorrect Data Type to Value!")
+
+def value_to_i32(v):
+    # the payload of a value known to be an i32, the type byte isn't checked
+    return int.from_bytes(v[4:], byteorder='little', signed=True)
+
+def value_to_f32(v):
+    # the payload of a value known to be an f32, the type byte isn't checked
+    return struct.unpack('<f', v[4:])[0]
+
 def value_to_python_repr(v):
     if v[0] == ValueType.I32.value:
         return int.from_bytes(v[4:], byteorder='little', signed=True)
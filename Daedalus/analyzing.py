@@ -133,6 +133,25 @@ def annotation_to_type(annotation, analyzer):
     else:
         raise Exception("Invalid Annotaton")
         
+def field_key(key):
+    """
+    Returns a constant that identifies a struct or record key written as a literal, or None for any other key. Fields with constant keys have a fixed index, which the compiler resolves accesses to.
+    """
+    if type(key) in (base_ast_objects.BaseASTString, base_ast_objects.BaseASTInt):
+        return (type(key), key.value)
+    return None
+
+def field_keys(keys):
+    fields = []
+    for key in keys:
+        fields.append(field_key(key))
+        if fields[-1] == None:
+            return None
+    return fields
+
+# functions the compiler runs with CALL_BUILTIN, an array op or a deque op, see op_codes.BUILTINS, op_codes.ARRAY_OPS and op_codes.DEQUE_OPS
+BUILTIN_NAMES = ("sum", "min", "max", "map", "sort", "extract_max", "extend", "slice", "copy", "fill", "pop_front")
+
 class StaticStringType:
     def __init__(self, string):
         self.string = string
@@ -163,9 +182,20 @@ class ListStructType:
         return "{" + str(self.el_type) + "}"
 
 class StructStructType:
-    def __init__(self, key_types, el_types):
+    def __init__(self, key_types, el_types, fields=None):
         self.key_types = key_types
         self.el_types = el_types
+        # the constant key of each field when they're all literals (see field_key), otherwise None
+        self.fields = fields
+    
+    def field_index(self, key):
+        """
+        Returns the index of the field a key refers to, or None when it isn't known at compile-time.
+        """
+        key = field_key(key)
+        if self.fields == None or key == None or not key in self.fields:
+            return None
+        return self.fields.index(key)
     
     def __str__(self):
         struct = "["
@@ -205,9 +235,16 @@ class TupleStructType:
         return tup + ")"
 
 class RecordStructType:
-    def __init__(self, key_types, el_types):
+    def __init__(self, key_types, el_types, fields=None):
         self.key_types = key_types
         self.el_types = el_types
+        self.fields = fields
+    
+    def field_index(self, key):
+        key = field_key(key)
+        if self.fields == None or key == None or not key in self.fields:
+            return None
+        return self.fields.index(key)
     
     def __str__(self):
         rec = "("
@@ -324,21 +361,28 @@ class BaseTypeChecker:
             return t
         return res_type
     
+    # Expression nodes are annotated with their types (node.type), the compiler uses them to emit type specialized ops
+    
     def visit_BaseASTInt(self, i):
-        return BaseSimpleType.I32_TYPE
+        i.type = BaseSimpleType.I32_TYPE
+        return i.type
         
     def visit_BaseASTFloat(self, f):
-        return BaseSimpleType.F32_TYPE
+        f.type = BaseSimpleType.F32_TYPE
+        return f.type
 
     def visit_BaseASTBool(self, b):
-        return BaseSimpleType.BOOL_TYPE
+        b.type = BaseSimpleType.BOOL_TYPE
+        return b.type
 
     def visit_BaseASTNull(self, n):
-        return BaseSimpleType.NULL_TYPE
+        n.type = BaseSimpleType.NULL_TYPE
+        return n.type
 
     def visit_BaseASTString(self, s):
         if s.str_type == "IMMUTABLE":
-            return BaseSimpleType.IMUTABLE_STR_TYPE
+            s.type = BaseSimpleType.IMUTABLE_STR_TYPE
+            return s.type
         else:
             print(s.str_type)
             raise Exception("Static Strings Are Not Implemented Yet!")
@@ -385,13 +429,13 @@ class BaseTypeChecker:
             elif type(t1) == ListStructType:
                 return self.compare_types(t1.el_type, t2.el_type)
             elif type(t1) == StructStructType:
-                return self.compare_type_lists(t1.key_types, t2.key_types) and self.compare_type_lists(t1.el_types, t2.el_types)
+                return self.compare_type_lists(t1.key_types, t2.key_types) and self.compare_type_lists(t1.el_types, t2.el_types) and self.compare_fields(t1, t2)
             elif type(t1) == ArrayStructType:
                 return compare_type_lists(t1.el_types, t2.el_types)
             elif type(t1) == TupleStructType:
                 return compare_type_lists(t1.el_types, t2.el_types)
             elif type(t1) == RecordStructType:
-                return self.compare_type_lists(t1.key_types, t2.key_types) and self.compare_type_lists(t1.el_types, t2.el_types)
+                return self.compare_type_lists(t1.key_types, t2.key_types) and self.compare_type_lists(t1.el_types, t2.el_types) and self.compare_fields(t1, t2)
             elif type(t1) == DequeStructType:
                 return self.compare_types(t1.el_type, t2.el_type)
             elif type(t1) == PriorityQueueStructType:
@@ -401,6 +445,10 @@ class BaseTypeChecker:
             else:
                 raise Exception("Comparing Invalid Types!")
     
+    def compare_fields(self, t1, t2):
+        # an annotation doesn't name the fields, so it matches any struct with the same types
+        return t1.fields == None or t2.fields == None or t1.fields == t2.fields
+    
     def any_upcast(self, t1, t2):
         if t1 != t2:
             return BaseSimpleType.ANY_TYPE
@@ -454,16 +502,30 @@ class BaseTypeChecker:
                 expr.type = self.up_cast_number_binary_op(t1, t2)
             elif t1 in STRING_TYPES:
                 self.check_type(STRING_TYPES, t2, expr.line)
-                expr.type = self.up_cast_number_binary_op(t1, t2)
+                expr.type = self.adjust_binary_op_for_any(t1, t2, BaseSimpleType.IMUTABLE_STR_TYPE)
             elif type(t1) in STRUCT_TYPES:
                 expr.type = self.check_merge_struct(t1, t2)
             else:
                 raise Exception("Internal Error: Invalid Type")
             
-        elif op in ("-", "*", "/", "^"):
+        elif op in ("-", "*"):
             self.check_type(NUMBER_TYPES, t1, expr.line)
             self.check_type(NUMBER_TYPES, t2, expr.line)
             expr.type = self.up_cast_number_binary_op(t1, t2)
+        
+        elif op == "/":
+            # division always makes a float
+            self.check_type(NUMBER_TYPES, t1, expr.line)
+            self.check_type(NUMBER_TYPES, t2, expr.line)
+            expr.type = self.adjust_binary_op_for_any(t1, t2, BaseSimpleType.F32_TYPE)
+        
+        elif op == "^":
+            self.check_type(NUMBER_TYPES, t1, expr.line)
+            self.check_type(NUMBER_TYPES, t2, expr.line)
+            expr.type = self.up_cast_number_binary_op(t1, t2)
+            # an int to a negative power is a float, so the result is only an int for literal exponents that aren't negative
+            if expr.type == BaseSimpleType.I32_TYPE and not (type(expr.rhs) == base_ast_objects.BaseASTInt and expr.rhs.value >= 0):
+                expr.type = BaseSimpleType.ANY_TYPE
             
         elif op == "%":
             self.check_type(INTEGER_TYPES, t1, expr.line)
@@ -521,7 +583,7 @@ class BaseTypeChecker:
         op = expr.op
         if expr.prefix and op == "-":
             self.check_type(NUMBER_TYPES, t, expr.line)
-            expr.type = self.adjust_unary_op_for_any(t, BaseSimpleType.I32_TYPE)
+            expr.type = t
         elif expr.prefix and op == "~":
             self.check_type(BOOLEAN_TYPES, t, expr.line)
             expr.type = self.adjust_unary_op_for_any(t, BaseSimpleType.BOOL_TYPE)
@@ -609,6 +671,7 @@ class BaseTypeChecker:
         if t == None:
             self.errors.append(TypeError(f"Attempting to Reference Undeclared Variable:{id.text}", id.line))
             return BaseSimpleType.ANY_TYPE
+        id.type = t
         return t
     
     def type_check_homog_struct(self, keys, elements, open_bracket):
@@ -656,25 +719,28 @@ class BaseTypeChecker:
             raise Exception("Invalid Bracket")
     
     def type_check_hetero_struct(self, keys, elements, open_bracket):
-        key_types = keys
-        el_types = elements
+        # the types are new lists, the keys and elements are still compiled
+        key_types = []
+        el_types = []
         if len(elements) != 0:
             i = 0
             while i < len(keys):
-                key_types[i] = keys[i].accept(self)
-                el_types[i] = elements[i].accept(self)
+                key_types.append(keys[i].accept(self))
+                el_types.append(elements[i].accept(self))
                 i += 1
-                
+            
+            fields = field_keys(keys)
+            if fields != None and len(set(fields)) != len(fields):
+                self.errors.append(BaseTypeError("Duplicate Struct Field!", keys[0].line))
             if open_bracket == "[":
-                return StructStructType(key_types, el_types)
+                return StructStructType(key_types, el_types, fields)
             elif open_bracket == "(":
-                return RecordStructType(key_types, el_types)
+                return RecordStructType(key_types, el_types, fields)
             raise Exception("Invalid Bracket")
         else:
-            key_types = keys
             i = 0
             while i < len(keys):
-                key_types[i] = keys[i].accept(self)
+                key_types.append(keys[i].accept(self))
                 i += 1
             if open_bracket == "[":
                 return ArrayStructType(key_types)
@@ -683,11 +749,14 @@ class BaseTypeChecker:
             raise Exception("Invalid Bracket")
     
     def visit_BaseASTStruct(self, s):
+        # the compiler stores arrays of only ints or only floats unboxed, see BaseCompiler.packed_el_type
         if s.open_bracket in ("{", "<|"):
-            return self.type_check_homog_struct(s.keys, s.elements, s.open_bracket)
+            s.type = self.type_check_homog_struct(s.keys, s.elements, s.open_bracket)
         elif s.open_bracket in ("[", "("):
-            return self.type_check_hetero_struct(s.keys, s.elements, s.open_bracket)
-        raise Exception("Invalid Bracket!")
+            s.type = self.type_check_hetero_struct(s.keys, s.elements, s.open_bracket)
+        else:
+            raise Exception("Invalid Bracket!")
+        return s.type
             
     def type_check_struct_ref(self, ref, struct_index_type, res_type):
         key_type = ref.key_or_index.accept(self)
@@ -700,6 +769,14 @@ class BaseTypeChecker:
     
     def type_check_fixed_keyed_struct_ref(self, ref, struct_type):
         key_type = ref.key_or_index.accept(self)
+        if struct_type.fields != None and field_key(ref.key_or_index) != None:
+            # the field is known, so is the type of its value
+            index = struct_type.field_index(ref.key_or_index)
+            if index == None:
+                self.errors.append(BaseTypeError(f"Attempting to Access Structure:{str(struct_type)} using a Key it doesn't Have: {str(ref.key_or_index)}!", ref.line))
+                return BaseSimpleType.ANY_TYPE
+            ref.type = struct_type.el_types[index]
+            return ref.type
         i = 0
         while i < len(struct_type.key_types):
             if self.compatible_types(struct_type.key_types[i], key_type):
@@ -766,6 +843,12 @@ class BaseTypeChecker:
         
         el_types = struct_type.el_types
         
+        if type(struct_type) == StructStructType and struct_type.field_index(update.ref.key_or_index) != None:
+            # only the field the key names can be written
+            index = struct_type.field_index(update.ref.key_or_index)
+            key_types = key_types[index:index+1]
+            el_types = el_types[index:index+1]
+        
         if not self.check_compatible_key_value_types(key_types, el_types, key_type, val_type):
             self.errors.append(BaseTypeError(f"Attempting to Modify Struct:{struct_type} with Invalid Key:Value Types: {key_type}:{val_type}", update.line))
               
@@ -804,17 +887,27 @@ class BaseTypeChecker:
         elif type(s_type) in (StructStructType, ArrayStructType):
             return self.type_check_square_mod(s_type, update)
         elif s_type == BaseSimpleType.ANY_TYPE:
-            mod.value.accept(self)
+            update.ref.key_or_index.accept(self)
+            update.expr1.accept(self)
             return BaseSimpleType.VOID_TYPE
         else:
             if type(s_type) in STRUCT_TYPES:
-                self.errors.append(BaseTypeError(f"Structure of Type: {str(s_type)} doesn't Support Modification!", mod.line))
+                self.errors.append(BaseTypeError(f"Structure of Type: {str(s_type)} doesn't Support Modification!", update.line))
             else:
-                self.errors.append(BaseTypeError(f"Attempting to Modify an Invalid Structure! Expected a Structure Type, got: {str(s_type)}", mod.line))
-                return BaseSimpleType.VOID_TYPE
+                self.errors.append(BaseTypeError(f"Attempting to Modify an Invalid Structure! Expected a Structure Type, got: {str(s_type)}", update.line))
+            return BaseSimpleType.VOID_TYPE
 
     def type_check_struct_prepend(self, update):
-        pass
+        s_type = update.ref.accept(self)
+        expr1_type = update.expr1.accept(self)
+        if update.expr2 != None:
+            self.errors.append(BaseTypeError(f"Attempting to Push a Key:Value Pair to the Front of a Deque!", update.line))
+        elif type(s_type) == DequeStructType:
+            if not self.compatible_types(s_type.el_type, expr1_type):
+                self.errors.append(BaseTypeError(f"Attempting to Push an Invalid Element to a Deque! Expected: {str(s_type.el_type)}, but got: {str(expr1_type)}", update.line))
+        elif s_type != BaseSimpleType.ANY_TYPE:
+            self.errors.append(BaseTypeError(f"Invalid Use of >>, Expected a Deque, but got: {s_type}", update.line))
+        return BaseSimpleType.VOID_TYPE
 
     def visit_BaseASTUpdateStatement(self, update):
         ASSIGNMENT_OPS = ("=", "+=", "-=", "*=", "/=", "%=")
@@ -827,7 +920,7 @@ class BaseTypeChecker:
             return self.type_check_struct_modify(update)
         elif type(update.op) == base_ast_objects.BaseASTIdentifier and update.op.value == "<<":
             return self.type_check_append(update)
-        elif type(update.op) == base_ast_objects.BaseASTIdentifier and update.op.text == ">>":
+        elif update.op.value == ">>":
             return self.type_check_struct_prepend(update)
         else:
             self.errors.append(BaseTypeError(f"Invalid Update Statement", update.line))      
@@ -867,9 +960,77 @@ class BaseTypeChecker:
         return BaseSimpleType.VOID_TYPE
 
     def visit_BaseASTCall(self, call):
+        if call.id.text in BUILTIN_NAMES:
+            return self.type_check_builtin(call)
         if call.id.text != "print":
             raise Exception("Invalid Call")
         call.args[0].accept(self)
+    
+    def type_check_builtin(self, call):
+        arg_types = [arg.accept(self) for arg in call.args]
+        if len(arg_types) == 0:
+            self.errors.append(BaseTypeError(f"Builtin {call.id.text} Takes an Array!", call.id.line))
+            return BaseSimpleType.ANY_TYPE
+        arr_type = arg_types[0]
+        if call.id.text == "extract_max":
+            return self.type_check_extract_max(call, arg_types)
+        elif call.id.text == "pop_front":
+            return self.type_check_pop_front(call, arr_type)
+        if not type(arr_type) in (ListStructType, ArrayStructType, TupleStructType):
+            if arr_type != BaseSimpleType.ANY_TYPE:
+                self.errors.append(BaseTypeError(f"Builtin {call.id.text} Takes an Array, not: {str(arr_type)}!", call.id.line))
+            return BaseSimpleType.ANY_TYPE
+        
+        name = call.id.text
+        # the elements of arrays and tuples can each have their own type
+        el_type = arr_type.el_type if type(arr_type) == ListStructType else BaseSimpleType.ANY_TYPE
+        if name in ("sum", "min", "max"):
+            return el_type if el_type in (BaseSimpleType.I32_TYPE, BaseSimpleType.F32_TYPE) else BaseSimpleType.ANY_TYPE
+        elif name == "map":
+            # ints stay ints unless they're divided or mapped with a float
+            op = call.args[1].value if len(call.args) == 3 and type(call.args[1]) == base_ast_objects.BaseASTString else None
+            if el_type == BaseSimpleType.I32_TYPE and arg_types[-1] == BaseSimpleType.I32_TYPE and op in ("+", "-", "*", "%"):
+                return ListStructType(BaseSimpleType.I32_TYPE)
+            elif el_type in (BaseSimpleType.I32_TYPE, BaseSimpleType.F32_TYPE) and arg_types[-1] in (BaseSimpleType.I32_TYPE, BaseSimpleType.F32_TYPE) and op != None:
+                return ListStructType(BaseSimpleType.F32_TYPE)
+            return ListStructType(BaseSimpleType.ANY_TYPE)
+        elif name == "fill" and len(arg_types) > 1 and not self.compatible_types(el_type, arg_types[1]):
+            # a list of ints or floats is packed, it can only hold values of its element type
+            self.errors.append(BaseTypeError(f"Attempting to Fill a List with an Invalid Element! Expected: {str(el_type)}, but got: {str(arg_types[1])}", call.id.line))
+        elif name == "extend" and len(arg_types) > 1:
+            src_type = arg_types[1]
+            if type(src_type) == ListStructType:
+                src_el_types = [src_type.el_type]
+            elif type(src_type) in (ArrayStructType, TupleStructType):
+                src_el_types = src_type.el_types
+            elif src_type == BaseSimpleType.ANY_TYPE:
+                src_el_types = [BaseSimpleType.ANY_TYPE]
+            else:
+                self.errors.append(BaseTypeError(f"Builtin extend Takes an Array, not: {str(src_type)}!", call.id.line))
+                src_el_types = []
+            for src_el_type in src_el_types:
+                if not self.compatible_types(el_type, src_el_type):
+                    self.errors.append(BaseTypeError(f"Attempting to Extend a List with an Invalid Element! Expected: {str(el_type)}, but got: {str(src_el_type)}", call.id.line))
+                    break
+        # the others return the array they're given, or a copy of (part of) it
+        return arr_type
+
+    def type_check_extract_max(self, call, arg_types):
+        # the keys with the highest priorities, in a new list
+        if len(arg_types) > 1 and not arg_types[1] in (BaseSimpleType.I32_TYPE, BaseSimpleType.ANY_TYPE):
+            self.errors.append(BaseTypeError(f"Number of Keys to Extract Must be an Int, not: {str(arg_types[1])}!", call.id.line))
+        if type(arg_types[0]) == PriorityQueueStructType:
+            return ListStructType(arg_types[0].key_type)
+        elif arg_types[0] != BaseSimpleType.ANY_TYPE:
+            self.errors.append(BaseTypeError(f"Builtin extract_max Takes a Priority Queue, not: {str(arg_types[0])}!", call.id.line))
+        return BaseSimpleType.ANY_TYPE
+
+    def type_check_pop_front(self, call, t):
+        if type(t) == DequeStructType:
+            return t.el_type
+        elif t != BaseSimpleType.ANY_TYPE:
+            self.errors.append(BaseTypeError(f"Attempting to Pop Front of an Incompatible Structure: {str(t)}", call.id.line))
+        return BaseSimpleType.ANY_TYPE
 
     def visit_BaseASTFunction(self, func):
         return None
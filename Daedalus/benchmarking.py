@@ -0,0 +1,246 @@
+import argparse, contextlib, io, random, time
+import base_lexing, base_parsing, analyzing, compiling, optimizing, interpreting, heaping
+
+"""
+Benchmarks for the bytecode VM. Each program is lexed, parsed and compiled once, then VM.execute is timed on its own (best of several runs). Output printed by the program, and the VM's ending stack, is suppressed.
+"""
+
+def parse_program(program):
+    tokens = base_lexing.BaseLexer(program).lex_base()
+    return base_parsing.BaseParser(tokens).parse()
+
+def untyped_reason(program):
+    """
+    Returns why the typed mode can't compile a program, or None if it can. The analyzer doesn't handle every program yet: it raises on functions and tables, and reports type errors for some it should accept (push updates). Only the analysis is checked, a program that type checks is compiled and run like any other.
+    """
+    analyzer = analyzing.BaseASTAnalyzer(parse_program(program))
+    try:
+        analyzer.type_check()
+    except Exception as e:
+        return f"the analyzer can't check it: {e!r}"
+    if len(analyzer.type_errors) > 0:
+        return "type errors"
+    return None
+
+def compile_program(program, optimize=False, analyze=False, **compiler_options):
+    ast = parse_program(program)
+    if analyze:
+        # annotates the AST with types, so the compiler can emit type specialized ops
+        analyzer = analyzing.BaseASTAnalyzer(ast)
+        analyzer.type_check()
+        if len(analyzer.type_errors) > 0:
+            raise Exception("Program Has Type Errors!")
+    c = compiling.BaseCompiler(ast, **compiler_options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ops, consts, static_objs = c.compile()
+    if optimize:
+        ops, consts, static_objs = optimizing.PeepholeOptimizer(ops, consts, static_objs).optimize()
+    return ops, consts, static_objs, c.static_global_count()
+
+def time_program(program, repeat=3, stack_size=1024, engine=interpreting.VM, compiler_options={}, gc_budget=None):
+    """
+    Returns the best time and the heap manager of the run that took it, for its garbage collector's pauses.
+    """
+    ops, consts, static_objs, static_global_count = compile_program(program, **compiler_options)
+    best = None
+    best_heap = None
+    i = 0
+    while i < repeat:
+        vm = engine(stack_size, ops, consts, static_objs, static_global_count, gc_budget)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            vm.execute()
+            elapsed = time.perf_counter() - t0
+        if best == None or elapsed < best:
+            best = elapsed
+            best_heap = vm.heap_manager
+        i += 1
+    return best, best_heap
+
+def loop_programs(iterations):
+    """
+    The counting loops used by the slowly_statement/expensive_statement expansion classes in testing_parallel.py, run directly on the VM.
+    """
+    return {
+        "global count loop": f"var count = 0; while count < {iterations} {{ count = count + 1; }}",
+        "local count loop": f"{{ var count = 0; while count < {iterations} {{ count = count + 1; }} }}",
+        "function count loop": f"def expr[f](){{ var count = 0; while count < {iterations} {{ count = count + 1; }} return count; }} f();",
+    }
+
+def arithmetic_programs(iterations):
+    """
+    Loops dominated by arithmetic and comparisons on locals, where the cost of converting every operand is most visible.
+    """
+    return {
+        "int arithmetic": f"{{ var i = 0; var acc = 0; while i < {iterations} {{ acc = (acc + i * 3 - 1) % 1000; i = i + 1; }} }}",
+        "float arithmetic": f"{{ var i = 0; var x = 0.5; while i < {iterations} {{ x = x * 1.5 + 0.25 - x; i = i + 1; }} }}",
+        "comparisons": f"{{ var i = 0; var evens = 0; while i < {iterations} {{ if i % 2 == 0 {{ evens = evens + 1; }} i = i + 1; }} }}",
+    }
+
+def recursion_programs(iterations):
+    """
+    Recursive calls, dominated by call frames rather than loop bodies. The argument grows with the iteration count, fib(20) makes about 22000 calls.
+    """
+    n = 10
+    while n < 25 and 1.618 ** n < iterations / 4:
+        n += 1
+    return {
+        "recursive fib": f"def expr[fib](expr[n]){{ if n < 2 {{ return n; }} return fib(n-1) + fib(n-2); }} fib({n});",
+        "recursive sum": f"def expr[total](expr[n]){{ if n == 0 {{ return 0; }} return n + total(n-1); }} var i = 0; while i < {iterations // 100} {{ total(100); i = i + 1; }}",
+    }
+
+def table_programs(iterations):
+    """
+    Lookups in tables, structs and arrays that are built once, outside the loop, and priority queue literals built every iteration, or grown past their cappacity one insert at a time, then popped one key at a time or several at once. A deque that's pushed and popped at both ends, which wraps around its ring buffer. Struct fields are only resolved to their offsets in the typed mode.
+    """
+    keys = ", ".join(f"\"key{k}\":{k}" for k in range(64))
+    int_keys = ", ".join(f"{k * 7}:{k}" for k in range(64))
+    priorities = ", ".join(f"\"key{k}\":{(k * 37) % 64}" for k in range(32))
+    deque = ", ".join(str(k) for k in range(64))
+    return {
+        "table lookups": f"{{ var t = {{\"a\":1, \"b\":2, \"c\":3}}; var i = 0; var acc = 0; while i < {iterations} {{ acc = acc + t[\"a\"] + t[\"c\"]; i = i + 1; }} }}",
+        "large table lookups": f"{{ var t = {{{keys}}}; var i = 0; var acc = 0; while i < {iterations} {{ acc = acc + t[\"key5\"] + t[\"key63\"]; i = i + 1; }} }}",
+        "int key lookups": f"{{ var t = {{{int_keys}}}; var i = 0; var acc = 0; while i < {iterations} {{ acc = acc + t[(i % 64) * 7]; i = i + 1; }} }}",
+        "struct fields": f"{{ var p = [\"a\":1, \"b\":2, \"c\":3]; var i = 0; var acc = 0; while i < {iterations} {{ acc = acc + p[\"a\"] + p[\"c\"]; i = i + 1; }} }}",
+        "queue literals": f"{{ var i = 0; var acc = 0; while i < {iterations // 100} {{ var q = <|{priorities}|>; q!; acc = acc + q#; i = i + 1; }} }}",
+        "queue extracts": f"{{ var i = 0; var acc = 0; while i < {iterations // 100} {{ var q = <|{priorities}|>; var top = extract_max(q, 8); acc = acc + top# + q#; i = i + 1; }} }}",
+        "queue inserts": f"{{ var i = 0; var acc = 0; while i < {iterations // 100} {{ var q = <|\"key0\":0|>; var k = 1; while k < 64 {{ q << k : (k * 37) % 64; k = k + 1; }} acc = acc + extract_max(q, 8)# + q#; i = i + 1; }} }}",
+        "deque ends": f"{{ var d = <|{deque}|>; var i = 0; var acc = 0; while i < {iterations} {{ d >> i; d >> i + 1; acc = acc + pop_front(d) - d!; i = i + 1; }} }}",
+        "array lookups": f"{{ var a = {{1, 2, 3, 4}}; var i = 0; var acc = 0; while i < {iterations} {{ acc = acc + a[i % 4] + a#; i = i + 1; }} }}",
+    }
+
+def array_programs(iterations):
+    """
+    Builtins run on a 256 element array literal of ints or floats. In the typed mode the literals are packed arrays, which the builtins work on without unboxing each element. Arrays built a push at a time, and with the ops that work on a whole range at once, which the typed mode runs on packed arrays when the analyzer finds the elements match.
+    """
+    ints = ", ".join(str((k * 37) % 256) for k in range(256))
+    floats = ", ".join(f"{(k * 37) % 256}.5" for k in range(256))
+    loops = iterations // 256
+    return {
+        "array sum": f"{{ var a = {{{ints}}}; var i = 0; var acc = 0; while i < {loops} {{ acc = acc + sum(a) % 7; i = i + 1; }} }}",
+        "float array max": f"{{ var a = {{{floats}}}; var i = 0; var acc = 0.0; while i < {loops} {{ acc = acc + max(a) + min(a); i = i + 1; }} }}",
+        "array map": f"{{ var a = {{{ints}}}; var i = 0; var acc = 0; while i < {loops} {{ var b = map(a, \"*\", 3); acc = acc + b[i % 256]; i = i + 1; }} }}",
+        "array sort": f"{{ var i = 0; var acc = 0; while i < {loops} {{ var a = {{{ints}}}; sort(a); acc = acc + a[255]; i = i + 1; }} }}",
+        "array pushes": f"{{ var a = [0]; var i = 0; while i < {iterations} {{ a << i; i = i + 1; }} }}",
+        "array fill": f"{{ var a = fill([0], 0, {iterations}); }}",
+        "array extend": f"{{ var a = {{{ints}}}; var b = [0]; var i = 0; while i < {loops} {{ extend(b, a); i = i + 1; }} }}",
+        "packed fill": f"{{ var a = {{{floats}}}; var i = 0; var acc = 0.0; while i < {loops} {{ fill(a, acc); acc = a[i % 256] + 0.5; i = i + 1; }} }}",
+        "packed extend": f"{{ var a = {{{ints}}}; var b = {{0}}; var i = 0; while i < {loops} {{ extend(b, a); i = i + 1; }} }}",
+        "array slices": f"{{ var a = {{{ints}}}; var i = 0; var acc = 0; while i < {loops} {{ acc = acc + slice(a, i % 128, 128 + i % 128)# + copy(a)#; i = i + 1; }} }}",
+    }
+
+def garbage_programs(iterations):
+    """
+    Loops that allocate a structure every iteration and drop it, the heap only holds them all because the garbage collector frees them.
+    """
+    return {
+        "array garbage": f"{{ var i = 0; while i < {iterations} {{ var a = {{i, i + 1, i + 2}}; i = i + 1; }} }}",
+        "table garbage": f"{{ var i = 0; while i < {iterations} {{ var t = {{\"a\":i, \"b\":{{i}}}}; i = i + 1; }} }}",
+        "live tables": f"{{ var keep = {{\"a\":{{0}}, \"b\":{{\"c\":{{1, 2}}}}}}; var i = 0; while i < {iterations} {{ keep = {{\"a\":{{i, i}}, \"b\":keep[\"b\"]}}; var t = {{\"x\":i, \"y\":{{i}}}}; i = i + 1; }} }}",
+        "array copies": f"{{ var a = {{1, 2, 3}}; var i = 0; var acc = 0; while i < {iterations} {{ var c = copy(a); c << i; acc = acc + a[i % 3] + c#; i = i + 1; }} }}",
+    }
+
+# VM classes that can run a compiled program
+ENGINES = {
+    "stack": interpreting.VM,
+    "native": interpreting.NativeVM,
+    "register": interpreting.RegisterVM,
+}
+
+# Options each program can be compiled with, see compile_program
+COMPILER_MODES = {
+    "fused": {"fuse": True},
+    "unfused": {"fuse": False},
+    "optimized": {"fuse": True, "optimize": True},
+    "typed": {"fuse": True, "analyze": True},
+}
+
+# Benchmark suites, each builds its programs from an iteration count
+SUITES = {
+    "loops": loop_programs,
+    "arithmetic": arithmetic_programs,
+    "recursion": recursion_programs,
+    "tables": table_programs,
+    "arrays": array_programs,
+    "garbage": garbage_programs,
+}
+
+def churn_heap(heap, operations, seed=0, max_live=64):
+    """
+    Allocates, frees and grows objects at random, like a program that builds, resizes and drops many tables. Growing doubles an object's size, at most max_live objects are live at once.
+    """
+    rng = random.Random(seed)
+    live = {}
+    i = 0
+    while i < operations:
+        choice = rng.random()
+        if len(live) == 0 or (choice < 0.4 and len(live) < max_live):
+            size = rng.randint(16, 256)
+            id = heap.new_id()
+            heap.allocate(id, size)
+            live[id] = size
+        elif choice < 0.7:
+            id = rng.choice(list(live))
+            heap.free(id, live.pop(id))
+        else:
+            id = rng.choice(list(live))
+            if live[id] < 2048:
+                heap.reallocate(id, live[id], 2 * live[id])
+                live[id] *= 2
+        i += 1
+
+def time_churn(heap_class, operations, repeat=3, heap_size=8*65536):
+    best = None
+    i = 0
+    while i < repeat:
+        heap = heap_class(heap_size)
+        t0 = time.perf_counter()
+        churn_heap(heap, operations)
+        elapsed = time.perf_counter() - t0
+        if best == None or elapsed < best:
+            best = elapsed
+        i += 1
+    return best
+
+# DynamicHeap allocators, for the allocation churn benchmark
+ALLOCATORS = {
+    "first-fit": heaping.DynamicHeap,
+    "segregated": heaping.SegregatedHeap,
+}
+
+def run_benchmarks(programs, engines, modes, repeat, gc_budgets=[None], pauses=False):
+    for name in programs:
+        for engine in engines:
+            for mode in modes:
+                for gc_budget in gc_budgets:
+                    label = f"{name} [{engine}, {mode}]" if gc_budget == None else f"{name} [{engine}, {mode}, gc budget {gc_budget}]"
+                    reason = untyped_reason(programs[name]) if COMPILER_MODES[mode].get("analyze", False) else None
+                    if reason != None:
+                        print(f"{label}: skipped ({reason})")
+                        continue
+                    elapsed, heap_manager = time_program(programs[name], repeat, engine=ENGINES[engine], compiler_options=COMPILER_MODES[mode], gc_budget=gc_budget)
+                    print(f"{label}: {elapsed:.4f}s")
+                    if pauses and len(heap_manager.gc_pauses) > 0:
+                        print(f"    gc pauses: {len(heap_manager.gc_pauses)}, p99 {heap_manager.gc_pause_percentile(0.99)*1000:.3f}ms, longest {heap_manager.gc_pause_percentile(1)*1000:.3f}ms")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Time Daedalus programs on the bytecode VM.")
+    arg_parser.add_argument("--iterations", type=int, default=100000, help="loop iterations per program")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per program, the best is reported")
+    arg_parser.add_argument("--suite", choices=list(SUITES), action="append", help="suite to run, may be repeated (default: all)")
+    arg_parser.add_argument("--engine", choices=list(ENGINES), action="append", help="engine to run, may be repeated (default: all)")
+    arg_parser.add_argument("--mode", choices=list(COMPILER_MODES), action="append", help="compiler mode, may be repeated (default: fused)")
+    arg_parser.add_argument("--churn", type=int, default=0, help="heap operations for the allocation churn benchmark, 0 skips it")
+    arg_parser.add_argument("--allocator", choices=list(ALLOCATORS), action="append", help="allocator to churn, may be repeated (default: all)")
+    arg_parser.add_argument("--gc-budget", type=int, action="append", help="garbage collector work per safe point, may be repeated; 0 stops the world (default)")
+    arg_parser.add_argument("--pauses", action="store_true", help="report the garbage collector's p99 and longest pause")
+    args = arg_parser.parse_args()
+    gc_budgets = [budget or None for budget in args.gc_budget or [0]]
+    
+    if args.churn > 0:
+        for allocator in args.allocator or list(ALLOCATORS):
+            elapsed = time_churn(ALLOCATORS[allocator], args.churn, args.repeat)
+            print(f"allocation churn [{allocator}]: {elapsed:.4f}s")
+
+    for suite in args.suite or list(SUITES):
+        run_benchmarks(SUITES[suite](args.iterations), args.engine or list(ENGINES), args.mode or ["fused"], args.repeat, gc_budgets, args.pauses)
@@ -1,4 +1,7 @@
-import parsing, base_ast_objects, Values, op_codes
+import parsing, base_ast_objects, analyzing, Values, op_codes
+
+# value types of the elements of packed arrays, by the type the analyzer gives them
+PACKED_EL_TYPES = {analyzing.BaseSimpleType.I32_TYPE: Values.I32_TYPE, analyzing.BaseSimpleType.F32_TYPE: Values.F32_TYPE}
 
 class Local:
     def __init__(self, offset, func_id, func_index):
@@ -40,18 +43,105 @@ class Function:
             up_vals += f"{str(v)} at: {index}, "
         up_vals += "]"
         return f"Func[{self.id}, UpValues:{up_vals}]"
+
+def fuse_superinstructions(instructions, consts):
+    """
+    Rewrites common sequences of instructions into single superinstructions, so they take one dispatch instead of several:
+    CONST k; GET_LOCAL a; SUM; SET_LOCAL a (or GET_LOCAL a; CONST k; SUM; SET_LOCAL a) -> INC_LOCAL a k, when k is a number
+    LESS_THAN; FALSE_JUMP t -> LESS_THAN_JUMP_FALSE t
+    ADD_I32/ADD_F32 match like SUM, and LT_I32/LT_F32 like LESS_THAN.
+    GET_LOCAL a; GET_LOCAL b -> GET_LOCAL_GET_LOCAL a b
+    Only the first instruction of a sequence may be a jump target. It's the one rewritten in place, so jumps to it stay valid.
+    """
+    # opcodes as ints, looking up an Enum member's value is slow
+    # each position of a sequence is a tuple of the opcodes that match there
+    CONST, GET_LOCAL, SET_LOCAL = (op_codes.OpCode.CONST.value,), (op_codes.OpCode.GET_LOCAL.value,), (op_codes.OpCode.SET_LOCAL.value,)
+    SUM = (op_codes.OpCode.SUM.value, op_codes.OpCode.ADD_I32.value, op_codes.OpCode.ADD_F32.value)
+    LESS_THAN = (op_codes.OpCode.LESS_THAN.value, op_codes.OpCode.LT_I32.value, op_codes.OpCode.LT_F32.value)
+    FALSE_JUMP = (op_codes.OpCode.FALSE_JUMP.value,)
+    NUMBER_TYPES = (Values.ValueType.I32.value, Values.ValueType.F32.value)
+    targets = set()
+    for ins in instructions:
+        if ins.target != None:
+            targets.add(id(ins.target))
+    
+    def matches(i, ops):
+        if i + len(ops) > len(instructions):
+            return False
+        j = 0
+        while j < len(ops):
+            if not instructions[i+j].op in ops[j] or (j > 0 and id(instructions[i+j]) in targets):
+                return False
+            j += 1
+        return True
+    
+    def is_number(const_index):
+        return consts[const_index][0] in NUMBER_TYPES
+    
+    fused = []
+    i = 0
+    while i < len(instructions):
+        ins = instructions[i]
+        if matches(i, (CONST, GET_LOCAL, SUM, SET_LOCAL)) and instructions[i+1].operands[0] == instructions[i+3].operands[0] and is_number(ins.operands[0]):
+            ins.operands = [instructions[i+1].operands[0], ins.operands[0]]
+            ins.op = op_codes.OpCode.INC_LOCAL.value
+            i += 4
+        elif matches(i, (GET_LOCAL, CONST, SUM, SET_LOCAL)) and ins.operands[0] == instructions[i+3].operands[0] and is_number(instructions[i+1].operands[0]):
+            ins.operands = [ins.operands[0], instructions[i+1].operands[0]]
+            ins.op = op_codes.OpCode.INC_LOCAL.value
+            i += 4
+        elif matches(i, (LESS_THAN, FALSE_JUMP)):
+            ins.op = op_codes.OpCode.LESS_THAN_JUMP_FALSE.value
+            ins.operands = [0]
+            ins.target = instructions[i+1].target
+            i += 2
+        elif matches(i, (GET_LOCAL, GET_LOCAL)):
+            ins.op = op_codes.OpCode.GET_LOCAL_GET_LOCAL.value
+            ins.operands = [ins.operands[0], instructions[i+1].operands[0]]
+            i += 2
+        else:
+            i += 1
+        fused.append(ins)
+    return fused
     
 class BaseCompiler:
-    def __init__(self, ast):
+    # value types constant folding does arithmetic on
+    NUMBER_TYPES = (Values.ValueType.I32.value, Values.ValueType.F32.value)
+    # type specialized ops, by operator and the type both operands were annotated with
+    TYPED_BINARY_OPS = {
+        ("+", analyzing.BaseSimpleType.I32_TYPE): op_codes.OpCode.ADD_I32,
+        ("-", analyzing.BaseSimpleType.I32_TYPE): op_codes.OpCode.SUB_I32,
+        ("*", analyzing.BaseSimpleType.I32_TYPE): op_codes.OpCode.MUL_I32,
+        ("%", analyzing.BaseSimpleType.I32_TYPE): op_codes.OpCode.MOD_I32,
+        ("<", analyzing.BaseSimpleType.I32_TYPE): op_codes.OpCode.LT_I32,
+        (">", analyzing.BaseSimpleType.I32_TYPE): op_codes.OpCode.GT_I32,
+        ("+", analyzing.BaseSimpleType.F32_TYPE): op_codes.OpCode.ADD_F32,
+        ("-", analyzing.BaseSimpleType.F32_TYPE): op_codes.OpCode.SUB_F32,
+        ("*", analyzing.BaseSimpleType.F32_TYPE): op_codes.OpCode.MUL_F32,
+        ("/", analyzing.BaseSimpleType.F32_TYPE): op_codes.OpCode.DIV_F32,
+        ("<", analyzing.BaseSimpleType.F32_TYPE): op_codes.OpCode.LT_F32,
+        (">", analyzing.BaseSimpleType.F32_TYPE): op_codes.OpCode.GT_F32,
+    }
+    
+    def __init__(self, ast, bytecode_format=op_codes.COMPACT_FORMAT, fuse=True):
         self.ast = ast
         self.error = None
+        # rewrite common op sequences into superinstructions
+        self.fuse = fuse
         
-        self.op_addr = 0
+        # The program starts with a byte naming the format of its operands
+        self.bytecode_format = bytecode_format
+        self.op_addr = 1
         self.op_code_size = 64
         self.op_codes = bytearray(64)
+        self.op_codes[0] = bytecode_format
         
         self.consts = []
         self.const_index = 0
+        # index of every constant in the pool, keyed by its bytes, so equal constants share one slot
+        self.const_indices = {}
+        # values of operator nodes that have already been folded, keyed by node id
+        self.folded_constants = {}
         
         self.static_objs = []
         self.static_obj_index = 0
@@ -130,24 +220,61 @@ class BaseCompiler:
         if self.op_addr + 1 == self.op_code_size:
             self.op_codes += b"\x00" * (self.op_code_size)
             
-        if type(op) == op_codes.OpCode:
-            self.op_codes[self.op_addr:self.op_addr+1] = (op.value).to_bytes(1, byteorder="little")
-            self.op_addr += 1
-            return self.op_addr-1
-        else:
-            self.op_codes[self.op_addr:self.op_addr+8] = Values.python_repr_to_value(op)
-            self.op_addr += 8
-            return self.op_addr - 8 
+        self.op_codes[self.op_addr:self.op_addr+1] = (op.value).to_bytes(1, byteorder="little")
+        self.op_addr += 1
+        return self.op_addr-1
+    
+    def emit_operand(self, operand, width):
+        encoded = op_codes.encode_operand(operand, width, self.bytecode_format)
+        self.op_codes[self.op_addr:self.op_addr+len(encoded)] = encoded
+        self.op_addr += len(encoded)
+        return self.op_addr - len(encoded)
+    
+    def emit_instruction(self, op, *operands):
+        """
+        Emits an op followed by its operands, each encoded with the width op_codes.OPERAND_WIDTHS gives it. Returns the address of the first operand.
+        """
+        widths = op_codes.operand_widths(op.value, operands)
+        if len(widths) != len(operands):
+            raise Exception("Wrong Number of Operands!")
+            
+        self.emit_op(op)
+        operand_addr = self.op_addr
+        i = 0
+        while i < len(operands):
+            self.emit_operand(operands[i], widths[i])
+            i += 1
+        return operand_addr
+    
+    def patch_operand(self, addr, operand, width):
+        encoded = op_codes.encode_operand(operand, width, self.bytecode_format)
+        self.op_codes[addr:addr+len(encoded)] = encoded
+    
+    def fuse_ops(self, ops, start):
+        """
+        Runs fuse_superinstructions over the ops from start, keeping the bytes before them (a format byte or function header)
+        """
+        instructions = op_codes.disassemble(ops, start, self.bytecode_format)
+        return ops[:start] + op_codes.assemble(fuse_superinstructions(instructions, self.consts), self.bytecode_format)
+    
+    def patch_jump(self, addr):
+        """
+        Points the forward jump whose operand is at addr to the current address
+        """
+        self.patch_operand(addr, self.op_addr - addr, op_codes.OPERAND_WIDTHS[op_codes.OpCode.JUMP.value][0])
     
     def emit_const(self, const):
-        self.emit_op(op_codes.OpCode.CONST)
-        self.emit_op(self.const_index)
+        key = bytes(const)
+        if key in self.const_indices:
+            self.emit_instruction(op_codes.OpCode.CONST, self.const_indices[key])
+            return
+        self.emit_instruction(op_codes.OpCode.CONST, self.const_index)
+        self.const_indices[key] = self.const_index
         self.const_index += 1
         self.consts.append(const)
 
     def emit_static_obj(self, obj, op):
-        self.emit_op(op) 
-        self.emit_op(self.static_obj_index)
+        self.emit_instruction(op, self.static_obj_index)
         self.static_objs.append(obj)
         self.static_obj_index += 1
         
@@ -172,14 +299,13 @@ class BaseCompiler:
     def visit_BaseASTIdentifier(self, id):
         op_type, index = self.resolve_reference(id.text, id.line)
         if op_type == "local":
-            self.emit_op(op_codes.OpCode.GET_LOCAL)
+            self.emit_instruction(op_codes.OpCode.GET_LOCAL, index)
         elif op_type == "global":
-            self.emit_op(op_codes.OpCode.GET_STATIC_GLOBAL)
+            self.emit_instruction(op_codes.OpCode.GET_STATIC_GLOBAL, index)
         elif op_type == "up_value":
-            self.emit_op(op_codes.OpCode.GET_UP_VALUE)
+            self.emit_instruction(op_codes.OpCode.GET_UP_VALUE, index)
         else:
             raise Exception("Invalid Reference Type!")
-        self.emit_op(index)
            
     def visit_BaseASTInt(self, i):
         self.emit_const(Values.python_repr_to_value(i.value))
@@ -203,10 +329,89 @@ class BaseCompiler:
     def visit_BaseASTString(self, s):       
         self.emit_static_string(s.value)
         
+    def fold_constant(self, expr):
+        """
+        Returns the value a literal, or an operator on literals, evaluates to, or None if it's only known at run time. Operators are folded by the same rules the VM uses on 8 byte values. Results that would raise (division by zero, an int that's too big) are left for the VM.
+        """
+        if type(expr) == base_ast_objects.BaseASTInt or type(expr) == base_ast_objects.BaseASTFloat or type(expr) == base_ast_objects.BaseASTBool:
+            return Values.python_repr_to_value(expr.value)
+        elif type(expr) == base_ast_objects.BaseASTBinaryOp:
+            if not id(expr) in self.folded_constants:
+                self.folded_constants[id(expr)] = self.fold_binary_op(expr.op, self.fold_constant(expr.lhs), self.fold_constant(expr.rhs))
+            return self.folded_constants[id(expr)]
+        elif type(expr) == base_ast_objects.BaseASTUnaryOp and expr.prefix:
+            if not id(expr) in self.folded_constants:
+                self.folded_constants[id(expr)] = self.fold_unary_op(expr.op, self.fold_constant(expr.expr))
+            return self.folded_constants[id(expr)]
+        return None
+    
+    def fold_binary_op(self, op, v1, v2):
+        if v1 == None or v2 == None:
+            return None
+        
+        if op in ("+", "-", "*", "/", "%", "^") and v1[0] in self.NUMBER_TYPES and v2[0] in self.NUMBER_TYPES:
+            p_v1 = Values.value_to_python_repr(v1)
+            p_v2 = Values.value_to_python_repr(v2)
+            try:
+                if op == "+":
+                    res = p_v1 + p_v2
+                elif op == "-":
+                    res = p_v1 - p_v2
+                elif op == "*":
+                    res = p_v1 * p_v2
+                elif op == "/":
+                    res = p_v1 / p_v2
+                elif op == "%":
+                    res = p_v1 % p_v2
+                else:
+                    res = p_v1 ** p_v2
+            except ArithmeticError:
+                return None
+            return self.fold_result(res)
+        elif op == "<":
+            return Values.python_repr_to_value(Values.less_than(v1, v2, None))
+        elif op == ">":
+            return Values.python_repr_to_value(Values.greater_than(v1, v2, None))
+        elif op == "==":
+            return Values.python_repr_to_value(Values.compare_values(v1, v2, None))
+        elif op == "&&" or op == "||":
+            b1 = bool(int.from_bytes(v1[4:], byteorder='little'))
+            b2 = bool(int.from_bytes(v2[4:], byteorder='little'))
+            return Values.python_repr_to_value((b1 and b2) if op == "&&" else (b1 or b2))
+        return None
+    
+    def fold_unary_op(self, op, v):
+        if v == None:
+            return None
+        if op == "-" and v[0] in self.NUMBER_TYPES:
+            return self.fold_result(-Values.value_to_python_repr(v))
+        elif op == "!":
+            return Values.python_repr_to_value(not bool(int.from_bytes(v[4:], byteorder='little')))
+        return None
+    
+    def fold_result(self, res):
+        if not type(res) in (int, float):
+            return None
+        try:
+            return Values.python_repr_to_value(res)
+        except Exception:
+            # too big for 32 bits, the VM raises when it gets there
+            return None
+    
     def visit_BaseASTBinaryOp(self, expr):
+        value = self.fold_constant(expr)
+        if value != None:
+            self.emit_const(value)
+            return
+        
         expr.rhs.accept(self)
         expr.lhs.accept(self)
         
+        typed_op = self.typed_binary_op(expr)
+        if typed_op != None:
+            self.emit_op(typed_op)
+            return
+        
         op = expr.op
         if op == "+":
             self.emit_op(op_codes.OpCode.SUM)
@@ -239,7 +444,21 @@ class BaseCompiler:
         else:
             raise Exception(f"Attempting to Compile Invalid Binary Operation: {op}", expr.line)
     
+    def typed_binary_op(self, expr):
+        """
+        Returns the type specialized op for a binary op, or None for the generic one. Ops are only specialized when the analyzer annotated both operands with the same i32 or f32 type; unannotated nodes (type None) and ANY_TYPE fall back to the generic op.
+        """
+        lhs_type = getattr(expr.lhs, "type", None)
+        if lhs_type == None or lhs_type != getattr(expr.rhs, "type", None):
+            return None
+        return self.TYPED_BINARY_OPS.get((expr.op, lhs_type))
+    
     def visit_BaseASTUnaryOp(self, expr):
+        value = self.fold_constant(expr)
+        if value != None:
+            self.emit_const(value)
+            return
+        
         expr.expr.accept(self)
         
         op = expr.op
@@ -269,37 +488,60 @@ class BaseCompiler:
         if type(call.id) == base_ast_objects.BaseASTIdentifier and call.id.text == "print":
             call.args[0].accept(self)
             self.emit_op(op_codes.OpCode.OUT)
+        elif self.is_builtin(call.id, op_codes.BUILTINS):
+            if len(call.args) != op_codes.BUILTIN_ARITIES[call.id.text]:
+                raise Exception("Incorrect Number of Arguments to a Builtin!", call.id.line)
+            for arg in call.args:
+                arg.accept(self)
+            self.emit_instruction(op_codes.OpCode.CALL_BUILTIN, op_codes.BUILTINS.index(call.id.text), len(call.args))
+        elif self.is_builtin(call.id, op_codes.ARRAY_OPS):
+            if not len(call.args) in op_codes.ARRAY_OP_ARITIES[call.id.text]:
+                raise Exception("Incorrect Number of Arguments to a Builtin!", call.id.line)
+            for arg in call.args:
+                arg.accept(self)
+            op = op_codes.ARRAY_OPS[call.id.text]
+            if op == op_codes.OpCode.ARRAY_FILL:
+                self.emit_instruction(op, len(call.args))
+            else:
+                self.emit_op(op)
+        elif self.is_builtin(call.id, op_codes.DEQUE_OPS):
+            if len(call.args) != op_codes.DEQUE_OP_ARITIES[call.id.text]:
+                raise Exception("Incorrect Number of Arguments to a Builtin!", call.id.line)
+            for arg in call.args:
+                arg.accept(self)
+            self.emit_op(op_codes.DEQUE_OPS[call.id.text])
         else:
             i = 0
             for arg in call.args:
                 arg.accept(self)
                 i += 1
             call.id.accept(self)
-            self.emit_op(op_codes.OpCode.CALL)
-            self.emit_op(i)
+            self.emit_instruction(op_codes.OpCode.CALL, i)
+
+    def is_builtin(self, id, builtins):
+        # a variable or function with a builtin's name hides the builtin
+        if type(id) != base_ast_objects.BaseASTIdentifier or not id.text in builtins:
+            return False
+        return type(self.resolve_local(id.text)) != Local and not id.text in self.static_globals
 
     def visit_BaseASTWhile(self, w):
         start = self.op_addr
         w.cond.accept(self)
-        self.emit_op(op_codes.OpCode.FALSE_JUMP)
-        fill1 = self.emit_op(-1)
+        fill1 = self.emit_instruction(op_codes.OpCode.FALSE_JUMP, 0)
         w.statement.accept(self)
-        self.emit_op(op_codes.OpCode.JUMP_BACK)
-        self.emit_op(self.op_addr - start)
-        self.op_codes[fill1:fill1+8] = Values.python_repr_to_value(self.op_addr - fill1)
+        self.emit_instruction(op_codes.OpCode.JUMP_BACK, self.op_addr + 1 - start)
+        self.patch_jump(fill1)
     
     def visit_BaseASTIf(self, i):
         i.expr.accept(self)
-        self.emit_op(op_codes.OpCode.FALSE_JUMP)
-        fill1 = self.emit_op(-1)
+        fill1 = self.emit_instruction(op_codes.OpCode.FALSE_JUMP, 0)
         i.statement.accept(self)
         if i.else_statement != None:
-            self.emit_op(op_codes.OpCode.JUMP) 
-            fill2 = self.emit_op(-1)
-        self.op_codes[fill1:fill1+8] = Values.python_repr_to_value(self.op_addr - fill1)
+            fill2 = self.emit_instruction(op_codes.OpCode.JUMP, 0)
+        self.patch_jump(fill1)
         if i.else_statement != None:
             i.else_statement.accept(self)
-            self.op_codes[fill2:fill2+8] = Values.python_repr_to_value(self.op_addr - fill2)
+            self.patch_jump(fill2)
 
     def emit_local(self, id):
         self.scopes[self.scope_depth].update({id:Local(self.local_offset, self.function_stack[self.function_depth], self.function_depth)}) 
@@ -314,12 +556,16 @@ class BaseCompiler:
         return None
 
     def compile_up_values(self, f_id):
+        """
+        Returns the operands NEW_CLOSURE takes for each of the function's up values
+        """
+        operands = []
         up_values = self.function_map[f_id].up_values
         for v_id in up_values:
             v = up_values[v_id][0]
-            self.emit_op(v.index)
-            self.emit_op(v.is_local)
-        return len(up_values)
+            operands.append(v.index)
+            operands.append(v.is_local)
+        return operands
 
     def compile_function_object(self, f):
         og_op_addr = self.op_addr
@@ -330,16 +576,21 @@ class BaseCompiler:
         self.op_code_size = 64
         self.op_codes = bytearray(64)
 
+        # Header: type, format of the body, size and arity, the body starts at byte 16
         self.op_codes[0] = Values.StaticObjectType.STATIC_FUNC.value
-  
-        self.emit_op(len(f.params))
+        self.op_codes[1] = self.bytecode_format
+        self.op_codes[8:16] = Values.python_repr_to_value(len(f.params))
+        self.op_addr = 16
         old_offset = self.compile_params(f.params)
 
         f.body.accept(self)
         
-        self.op_codes[4:8] = self.op_addr.to_bytes(4, byteorder='little')
+        func_obj = self.op_codes[:self.op_addr]
+        if self.fuse:
+            func_obj = self.fuse_ops(func_obj, 16)
+        func_obj[4:8] = len(func_obj).to_bytes(4, byteorder='little')
         
-        self.static_objs.append(self.op_codes)
+        self.static_objs.append(func_obj)
         self.static_obj_index += 1
         
         self.op_addr = og_op_addr
@@ -373,10 +624,8 @@ class BaseCompiler:
         
         if len(self.function_map[f.id.text].up_values) > 0:
             self.emit_static_string(f.id.text)
-            self.emit_op(op_codes.OpCode.NEW_CLOSURE)
-            self.emit_op(len(self.function_map[f.id.text].up_values))
-            self.emit_op(True)
-            self.compile_up_values(f.id.text)  
+            up_values = self.compile_up_values(f.id.text)
+            self.emit_instruction(op_codes.OpCode.NEW_CLOSURE, len(self.function_map[f.id.text].up_values), True, *up_values)
             
         self.close_scope()
         self.function_stack.pop()
@@ -388,20 +637,22 @@ class BaseCompiler:
     def update_variable(self, id, line):
         op_type, index = self.resolve_reference(id, line)
         if op_type == "local":
-            self.emit_op(op_codes.OpCode.SET_LOCAL)
-            self.emit_op(index)
+            self.emit_instruction(op_codes.OpCode.SET_LOCAL, index)
         elif op_type == "up_value":
-            self.emit_op(op_codes.OpCode.SET_UP_VALUE)
-            self.emit_op(index)
+            self.emit_instruction(op_codes.OpCode.SET_UP_VALUE, index)
         elif op_type == "global":
-            self.emit_op(op_codes.OpCode.SET_STATIC_GLOBAL)
-            self.emit_op(index)
+            self.emit_instruction(op_codes.OpCode.SET_STATIC_GLOBAL, index)
         else:
             raise Exception("Invalid Variable Assignment!")
 
+    def static_global_count(self):
+        """
+        Number of static globals in the compiled program, used to size the VM's global slots. A global's slot is its address divided by 8.
+        """
+        return self.static_global_addr // 8
+    
     def emit_static_global(self, id):
-        self.emit_op(op_codes.OpCode.SET_STATIC_GLOBAL)
-        self.emit_op(self.static_global_addr)
+        self.emit_instruction(op_codes.OpCode.SET_STATIC_GLOBAL, self.static_global_addr)
         self.static_globals.update({id:self.static_global_addr})
         self.static_global_addr += 8         
     
@@ -448,11 +699,21 @@ class BaseCompiler:
             update = self.rewrite_assignment(update)
             update.expr1.accept(self)
             self.update_variable(update.ref.text, update.line)
-        elif type(update) == base_ast_objects.BaseASTStructRef and update.op.value in ASSIGNMENT_OPS:
-            pass
+        elif type(update.ref) == base_ast_objects.BaseASTStructRef and update.op.value in ASSIGNMENT_OPS:
+            ref = update.ref
+            update = self.rewrite_assignment(update)
+            index = self.field_index(ref)
+            ref.struct.accept(self)
+            if index != None:
+                update.expr1.accept(self)
+                self.emit_instruction(op_codes.OpCode.SET_FIELD, index)
+            else:
+                ref.key_or_index.accept(self)
+                update.expr1.accept(self)
+                self.emit_op(op_codes.OpCode.MODIFY_STRUCT)
         elif type(update.op) == base_ast_objects.BaseASTIdentifier and update.op.value in ASSIGNMENT_OPS:
             pass
-        elif type(update.op) == base_ast_objects.BaseASTIdentifier and update.op.value == "<<":
+        elif update.op.value == "<<":
             update.ref.accept(self)
             if update.expr2 != None:
                 update.expr1.accept(self)
@@ -461,6 +722,13 @@ class BaseCompiler:
             else:
                 update.expr1.accept(self)
                 self.emit_op(op_codes.OpCode.PUSH_BACK_ARRAY)            
+        elif update.op.value == ">>":
+            # pushes onto the front of a deque, like << pushes onto its back
+            if update.expr2 != None:
+                raise Exception("Only a Value Can be Pushed Onto the Front of a Deque!", update.line)
+            update.ref.accept(self)
+            update.expr1.accept(self)
+            self.emit_op(op_codes.OpCode.PUSH_FRONT)
         else:
             raise Exception("Invalid Update Operation!")
     
@@ -472,9 +740,7 @@ class BaseCompiler:
         self.update_variable(ass.id.text, ass.line)
     
     def compile_new_struct(self, struct_op, flags):
-        self.emit_op(struct_op)
-        for flag in flags:
-            self.emit_op(flag)
+        self.emit_instruction(struct_op, *flags)
         
     def compile_keyed_elements(self, keys, elements):
         i = 0
@@ -490,8 +756,12 @@ class BaseCompiler:
             self.emit_const(Values.python_repr_to_value(i))
             i -= 1
     
-    def compile_curly_brackets(self, keys, elements):
-        if len(elements) > 0:
+    def compile_curly_brackets(self, keys, elements, el_type=None):
+        if el_type != None:
+            # the analyzer found an array of only ints or only floats, stored unboxed
+            self.compile_elements(keys)
+            self.compile_new_struct(op_codes.OpCode.NEW_PACKED_ARRAY, [len(keys), el_type, True, True])
+        elif len(elements) > 0:
             self.compile_keyed_elements(keys, elements)
             self.compile_new_struct(op_codes.OpCode.NEW_TABLE, [len(elements), True, False, True])
         else:
@@ -500,9 +770,11 @@ class BaseCompiler:
     
     def compile_square_brackets(self, keys, elements):
         if len(elements) > 0:
-            self.compile_keyed_elements(keys, elements, op_codes.OpCode.NEW_STRUCT, [])
+            self.compile_keyed_elements(keys, elements)
+            self.compile_new_struct(op_codes.OpCode.NEW_STRUCT, [len(elements), False, True])
         else:
-            self.compile_elements(elements, op_codes.OpCode.NEW_ARRAY)
+            self.compile_elements(keys)
+            self.compile_new_struct(op_codes.OpCode.NEW_ARRAY, [len(keys), False, False, True])
      
     def compile_alligator_brackets(self, keys, elements):
         if len(elements) > 0:
@@ -512,17 +784,21 @@ class BaseCompiler:
                 self.compile_keyed_elements(keys, elements)
                 self.compile_new_struct(op_codes.OpCode.NEW_PRIORITY_QUEUE, [len(elements), True, True, True])
         else:
-            self.compile_elements(elements, NEW_DEQUE)
+            self.compile_elements(keys)
+            self.compile_new_struct(op_codes.OpCode.NEW_DEQUE, [len(keys), True, True])
     
     def compile_paren_brackets(self, keys, elements):
+        # records are immutable structs, and tuples immutable arrays
         if len(elements) > 0:
-            self.compile_keyed_elements(keys, elements, NEW_RECORD, [])
+            self.compile_keyed_elements(keys, elements)
+            self.compile_new_struct(op_codes.OpCode.NEW_STRUCT, [len(elements), True, True])
         else:
-            self.compile_elements(elements, NEW_TUPLE)
+            self.compile_elements(keys)
+            self.compile_new_struct(op_codes.OpCode.NEW_ARRAY, [len(keys), False, True, True])
 
     def visit_BaseASTStruct(self, s):            
         if s.open_bracket == "{":
-            self.compile_curly_brackets(s.keys, s.elements)
+            self.compile_curly_brackets(s.keys, s.elements, self.packed_el_type(s))
         elif s.open_bracket == "[":
             self.compile_square_brackets(s.keys, s.elements)
         elif s.open_bracket == "<|":
@@ -532,8 +808,30 @@ class BaseCompiler:
         else:
             raise Exception("Attempting to Compile Invalid Structure", s.line)
     
+    def packed_el_type(self, s):
+        """
+        Returns the value type of a packed array's elements, I32 or F32, when the analyzer annotated an array literal as holding only that type, or None.
+        """
+        arr_type = getattr(s, "type", None)
+        if type(arr_type) != analyzing.ListStructType or len(s.keys) == 0:
+            return None
+        return PACKED_EL_TYPES.get(arr_type.el_type)
+
+    def field_index(self, acc):
+        """
+        Returns the index of the field a struct or record reference reads, or None for a generic access. The index is only known when the analyzer annotated the structure with its fields and the key is one of them, written as a literal.
+        """
+        struct_type = getattr(acc.struct, "type", None)
+        if not type(struct_type) in (analyzing.StructStructType, analyzing.RecordStructType):
+            return None
+        return struct_type.field_index(acc.key_or_index)
+    
     def visit_BaseASTStructRef(self, acc):
+        index = self.field_index(acc)
         acc.struct.accept(self)
+        if index != None:
+            self.emit_instruction(op_codes.OpCode.GET_FIELD, index)
+            return
         acc.key_or_index.accept(self)
         self.emit_op(op_codes.OpCode.ACCESS_STRUCT)
             
@@ -561,7 +859,11 @@ class BaseCompiler:
         
         for f_id in self.function_map:
             print(self.function_map[f_id])
-        return self.op_codes, self.consts, self.static_objs
+        # Trim the unused, zeroed space so the stream can be decoded to its end
+        ops = self.op_codes[:self.op_addr]
+        if self.fuse:
+            ops = self.fuse_ops(ops, 1)
+        return ops, self.consts, self.static_objs
 
     def print_ops(self):
         i = 0
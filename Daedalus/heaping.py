@@ -1,5 +1,6 @@
 
 from enum import Enum
+import array, itertools, math, operator, struct, time, zlib
 import Values, op_codes
 
 class HeapType(Enum):
@@ -11,6 +12,8 @@ class HeapType(Enum):
     DEQUE = 5
     CLOSURE = 6
     UP_VALUE = 7
+    STRUCT = 8
+    PACKED_ARRAY = 9
    
 NULL = 0b0000
 NULL_VALUE = bytearray(8)
@@ -26,113 +29,168 @@ NULL_VALUE[7] = 0b0000
 TRUE = Values.python_repr_to_value(True)
 
 IMMUTABLE_STRING = HeapType.IMMUTABLE_STRING.value
+MUTABLE_STRING = HeapType.MUTABLE_STRING.value
 TABLE = HeapType.TABLE.value
 ARRAY = HeapType.ARRAY.value
 PRIORITY_QUEUE = HeapType.PRIORITY_QUEUE.value
+DEQUE = HeapType.DEQUE.value
+STRUCT = HeapType.STRUCT.value
+PACKED_ARRAY = HeapType.PACKED_ARRAY.value
 
-class MinimalHeap:
-    def __init__(self, cap):
-        self.cap = cap
-        self.arr = bytearray(cap)
-    
-    def read_bytes(self, addr, size):
-        bytes = bytearray(size)
-        i = 0
-        while i < size:
-            bytes[i] = self.arr[addr + i]
-            i += 1
-        return bytes
+# Layouts for reading and writing heap fields in place, without copying them into a bytearray first
+U32 = struct.Struct("<I")
+# Type 1 byte | Flags 1 byte | Padding 2 bytes | Size 4 bytes
+HEAP_OBJECT_HEADER = struct.Struct("<BB2xI")
+# Type 1 byte | Flags 1 byte | Padding 1 byte | Structure flags 1 byte | Size 4 bytes | Entry count 4 bytes; arrays, packed arrays, priority queues, deques and structs
+STRUCT_HEADER = struct.Struct("<BBxBII")
+# Type 1 byte | Flags 1 byte | Padding 2 bytes | Size 4 bytes | Hash 4 bytes; strings, the UTF-8 characters follow
+STRING_HEADER = struct.Struct("<BB2xII")
+
+# Bits of a heap object's flag byte
+GC_FLAG = 0b0001 # the object is garbage collected
+MARK_FLAG = 0b0010 # the object was reached while marking, cleared by the sweep
+INTERNED_FLAG = 0b0100 # the string is in the intern table, no other string has its characters
+SHARED_FLAG = 0b1000 # more than one id refers to the object's block, see HeapManager.share_array
+
+# Packed arrays hold the 4 byte payloads of I32 or F32 values, this structure flag is set for F32s
+PACKED_F32_FLAG = 0b0100
+# memoryview and array formats of packed elements, by value type
+PACKED_FORMATS = {Values.I32_TYPE: "i", Values.F32_TYPE: "f"}
+# operators the map builtin applies with a constant
+MAP_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "%": operator.mod}
+
+# Phases of the garbage collector
+GC_IDLE = 0
+GC_MARK = 1
+GC_SWEEP = 2
+
+# Resizable tables grow once more than this fraction of their cells would be in use
+TABLE_LOAD_FACTOR = 0.75
+
+# Fewest ids sharing blocks that start a collection, see HeapManager.gc_needed
+GC_ALIAS_THRESHOLD = 1024
+
+def hash_bytes(data):
+    """
+    Hashes a string's UTF-8 characters. Strings are hashed once, heap strings keep it in their header and static strings in HeapManager.static_hashes.
+    """
+    return zlib.crc32(data)
+
+def hash_u32(n):
+    # murmur3's finalizer, every bit of n affects the low bits a table index is taken from
+    n ^= n >> 16
+    n = (n * 0x85ebca6b) & 0xFFFFFFFF
+    n ^= n >> 13
+    n = (n * 0xc2b2ae35) & 0xFFFFFFFF
+    return n ^ (n >> 16)
+
+# Every block of the dynamic heap starts with the id of the object in it, so compaction can find the handle to update
+BLOCK_HEADER = U32.size
+# Handle of an id that isn't in use
+FREE_HANDLE = -1
 
-    def write_bytes(self, addr, size, bytes):
-        i = 0
-        while i < size:
-            self.arr[addr + i] = bytes[i]
-            i += 1
-    
 class DynamicHeap:
-    def __init__(self, cap):
+    def __init__(self, cap, max_cap=None):
         self.cap = cap # cappacity
+        self.max_cap = cap if max_cap == None else max_cap # the array grows up to this many bytes, by default it never grows
+        if self.max_cap < cap:
+            raise Exception("Maximum Heap Size is Smaller Than the Heap!")
         self.arr = bytearray(cap) # stores the data
+        self.view = memoryview(self.arr) # zero copy slices of arr, for moving memory
         self.remaining = cap # remaining space
         
         self.head_to_end = cap # remaining space from head to the end
         self.head = 0 # head position; used for efficent writing
         
         self.free_map = {0:cap} # free slots; addr:size
-        self.alloc_map = {} # allocated slots; addr:size
+        self.alloc_map = {} # allocated blocks; addr:size, including the block header
 
-        self.heap_ids = {} # id -> addr
-        self.heap_addrs = {} # addr -> id
-        
-    def gc_mark_table():
-        pass
-    
-    def gc_mark_array():
-        pass
-    
-    def gc_mark_queue():
-        pass
-    
-    def gc_mark_closure():
-        pass
-    
-    def gc_mark_dynamic_up_value():
-        pass
-    
-    def gc_mark_object(self, heap_value):
-        addr, type, flags, size = self.read_heap_object_header(heap_value)
-        if type == HeapType.TABLE.value:
-            addr, _, total_entries, cappacity, is_set, resizable = self.read_table_header(heap_value)
-            return self.gc_mark_table(addr, cappacity, is_set)
-        elif type == HeapType.ARRAY.value:
-            addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(heap_value)
-            return self.gc_mark_array(addr, num_elements)
-        elif type == HeapType.PRIORITY_QUEUE.value:
-            addr, table_val, size, num_elements, resizable, using_map, gc = self.free_priority(heap_value)
-            return self.gc_free_priority_queue(addr, num_elements)
-        elif type == HeapType.CLOSURE.value:
-            addr, size, id_val, func_val, up_value_count, gc = read_closure_header(heap_value)
-            return self.gc_mark_closure()
-        elif type == HeapType.UP_VALUE.value:
-            addr, table_val, size, num_elements, resizable, using_map, gc = self.read_dynamic_up_value(heap_value)
-            return self.gc_mark_dynamic_up_value()
-        else:
-            print(type)
-            raise Exception("Attempting to Convert an Invalid Heap Object to a String!")
-    
-    def sweep(self, heap_id):
-        addr = self.heap_ids[heap_id]
-        # if the flag is set
-        # free it
+        self.handles = [] # id -> object addr (after its block header), FREE_HANDLE if the id isn't in use
+        self.free_ids = [] # ids that were freed, new_id reuses them
+        self.aliases = {} # id in a block's header -> the other ids that share the block, see share
+        self.alias_count = 0 # ids in aliases, they take no heap space but still hold a handle
         
-    def collect_garbage(self):
-        for id in self.heap_ids:
-            self.sweep(heap_id)
-    
     def get_addr(self, heap_id):
-        if not (heap_id in self.heap_ids):
+        try:
+            addr = self.handles[heap_id]
+        except IndexError:
             raise Exception("Invalid Heap ID")
-        return self.heap_ids[heap_id]
+        if addr == FREE_HANDLE:
+            raise Exception("Invalid Heap ID")
+        return addr
     
     def get_id(self, heap_addr):
-        if not (heap_addr in self.heap_addrs):
+        # the id is in the block header, just before the object
+        if not (heap_addr - BLOCK_HEADER in self.alloc_map):
             raise Exception("Invalid Heap Address")
-        return self.heap_addrs[heap_addr]
+        return U32.unpack_from(self.arr, heap_addr - BLOCK_HEADER)[0]
     
-    def update_id(self, id_1, id_2):
+    def new_id(self, reuse=True):
         """
-        Not Used
+        Returns an id for a new object. A freed id is reused if there is one, unless reuse is False.
         """
-        if not (id_1 in self.heap_ids):
-            raise Exception("Invalid Heap ID")
-        if not (id_2 in self.heap_ids):
-            raise Exception("Invalid Heap ID")
-        
-        self.addrs[id_1] = addr
-        self.ids[addr] = id_2
-        
-        self.addrs[id_2] = addr
-        self.addrs.remove(id_1)
+        if reuse and len(self.free_ids) > 0:
+            return self.free_ids.pop()
+        self.handles.append(FREE_HANDLE)
+        return len(self.handles) - 1
+    
+    def bind(self, id, block_addr):
+        """
+        Gives the block at block_addr to an id, writing the id into its header. Returns the object's address.
+        """
+        U32.pack_into(self.arr, block_addr, id)
+        addr = block_addr + BLOCK_HEADER
+        self.handles[id] = addr
+        return addr
+    
+    def move_handle(self, id, addr):
+        # the ids sharing a block move with it
+        self.handles[id] = addr
+        if id in self.aliases:
+            for alias in self.aliases[id]:
+                self.handles[alias] = addr
+    
+    def share(self, id):
+        """
+        Returns a new id for the object with an id, both refer to the same block until one of them is unshared. The block's header keeps the id of one of them.
+        """
+        addr = self.get_addr(id)
+        owner = U32.unpack_from(self.arr, addr - BLOCK_HEADER)[0]
+        alias = self.new_id()
+        self.handles[alias] = addr
+        self.aliases.setdefault(owner, []).append(alias)
+        self.alias_count += 1
+        return alias
+    
+    def is_shared(self, id):
+        return len(self.aliases) > 0 and U32.unpack_from(self.arr, self.handles[id] - BLOCK_HEADER)[0] in self.aliases
+    
+    def unshare(self, id):
+        """
+        Removes an id from the ids sharing its block, the block stays with the others. The id's handle is left for the caller to bind or free. Returns True if one id is left with the block.
+        """
+        block_addr = self.handles[id] - BLOCK_HEADER
+        owner = U32.unpack_from(self.arr, block_addr)[0]
+        aliases = self.aliases.pop(owner)
+        self.alias_count -= 1
+        if id == owner:
+            # another id takes over the block's header
+            owner = aliases.pop()
+            U32.pack_into(self.arr, block_addr, owner)
+        else:
+            aliases.remove(id)
+        if len(aliases) > 0:
+            self.aliases[owner] = aliases
+        return len(aliases) == 0
+
+    def replace(self, id, new_id):
+        """
+        Frees the object with an id and gives the id the object with new_id, whose id is freed instead. Used to move an object to a new allocation without changing its id.
+        """
+        self.free_block(self.get_addr(id) - BLOCK_HEADER)
+        self.bind(id, self.get_addr(new_id) - BLOCK_HEADER)
+        self.handles[new_id] = FREE_HANDLE
+        self.free_ids.append(new_id)
 
     def select_location(self, size):
         # Finds a suitable (big enough) location in the free list
@@ -141,13 +199,10 @@ class DynamicHeap:
                 return addr
         return -1
 
-    def allocate_addr(self, id, addr, size):
+    def allocate_addr(self, addr, size):
         """
-        Allocates a piece of memory at an address. It's assumed the address is free and has enough space.
+        Allocates a block of memory at an address. It's assumed the address is free and has enough space.
         """
-        if size <= 0:
-            raise Exception("Size Must be at Least 1!")
-        
         # Update the remaining space and free list
         old_size = self.free_map[addr]
         del self.free_map[addr]
@@ -160,18 +215,14 @@ class DynamicHeap:
         
         # Update the allocation map
         self.alloc_map[addr] = size
-        
-        # Add the new heap object to the mappings
-        self.heap_ids.update({id:addr})
-        self.heap_addrs.update({addr:id})
         return addr
         
-    def allocate_head(self, id, size):
+    def allocate_head(self, size):
         """
         DynamicHeap keeps track of a head for quick allocation and for compaction. This method allocates memory starting at the head address.
         """
         # Standard allocation, using the head as an address
-        addr = self.allocate_addr(id, self.head, size)
+        addr = self.allocate_addr(self.head, size)
         
         # Adjust head and the head to end space
         self.head += size
@@ -180,43 +231,92 @@ class DynamicHeap:
     
     def allocate(self, id, size):
         """
-        Allocate tries to allocate at the head, then a free slot. If these fail, it compacts the memory and allocates it at the new head.
+        Allocates size bytes for the object with an id, in a block with room for the block header. Returns the object's address.
+        """
+        if size <= 0:
+            raise Exception("Size Must be at Least 1!")
+        return self.bind(id, self.allocate_block(size + BLOCK_HEADER))
+    
+    def allocate_block(self, size):
+        """
+        Allocate tries to allocate at the head, then a free slot. If these fail, it grows or compacts the memory and allocates it at the new head.
         """
         
         # Try to allocate it at the head if there's space
         if size <= self.head_to_end:
-            return self.allocate_head(id, size)
+            return self.allocate_head(size)
         else:
-            # If there's no space whatsoever, throw an error
-            if self.remaining < size:
-                raise Exception("Allocation Failed: Heap is Out of Memory!")
+            # Try to find a large enough free space
+            addr = self.select_location(size) if size <= self.remaining else -1
+            
+            #If there isn't one, grow or compact the heap and allocate at the new head
+            if addr == -1:
+                self.make_room(size)
+                return self.allocate_head(size)
+            # If there is, allocate it in the free space
             else:
-                # Try to find a large enough free space
-                addr = self.select_location(size)
-                
-                #If there isn't one, compact and allocate at the new head
-                if addr == -1:
-                    self.compact()
-                    return self.allocate_head(id, size)
-                # If there is, allocate it in the free space
-                else:
-                    
-                    return self.allocate_addr(id, addr, size)
+                return self.allocate_addr(addr, size)
+    
+    def make_room(self, size):
+        """
+        Makes room for size bytes at the head, for an allocation that doesn't fit anywhere else. A heap that would be more than 3/4 full grows, otherwise (or if it's at max_cap) it compacts.
+        """
+        if self.remaining - size < self.cap // 4 and self.grow(size) and size <= self.head_to_end:
+            return
+        # If there's no space whatsoever, throw an error
+        if self.remaining < size:
+            raise Exception("Allocation Failed: Heap is Out of Memory!")
+        self.compact()
+    
+    def grow(self, size):
+        """
+        Grows the heap by at least size bytes, or as far as max_cap allows. The new memory is added to the end of the free space at the head. Returns False if the heap is already at max_cap.
+        """
+        if not self.extend(size):
+            return False
+        self.free_map[self.head] = self.head_to_end
+        return True
+    
+    def extend(self, size):
+        # at least doubles (up to max_cap), so a heap that keeps growing is copied amortized constant times per byte
+        new_cap = min(max(2 * self.cap, self.cap + size), self.max_cap)
+        if new_cap <= self.cap:
+            return False
+        added = new_cap - self.cap
+        # a bytearray can't be resized while a memoryview of it exists
+        self.view.release()
+        self.arr.extend(bytes(added))
+        self.view = memoryview(self.arr)
+        self.cap = new_cap
+        self.remaining += added
+        self.head_to_end += added
+        return True
                     
     def free(self, id, size):
         """
-        Frees a valid adress and adds the free memory to the free list
+        Frees the object with an id, the id can be reused by a new object. The allocation map has the real size, reallocating in place may have grown it.
         """
-        if not (id in self.heap_ids):
+        addr = self.handles[id] if id < len(self.handles) else FREE_HANDLE
+        if addr == FREE_HANDLE:
             raise Exception("Attempting to Free Invalid Heap ID!")
-        addr = self.heap_ids[id]
+        if self.is_shared(id):
+            # the other ids keep the block, the last one no longer shares it
+            if self.unshare(id):
+                self.arr[addr+1] &= ~SHARED_FLAG
+        else:
+            self.free_block(addr - BLOCK_HEADER)
+        self.handles[id] = FREE_HANDLE
+        self.free_ids.append(id)
+    
+    def free_block(self, addr):
+        """
+        Frees a valid block address and adds the free memory to the free list
+        """
         if not addr in self.alloc_map:
             raise Exception("Attempting to Free Unallocated Memory!")
         
-        # Remove it from the allocated objects, delte its id
-        del self.alloc_map[addr]
-        del self.heap_ids[id]
-        del self.heap_addrs[addr]
+        # Remove it from the allocated blocks
+        size = self.alloc_map.pop(addr)
         
         # Update the free map with the open space
         self.free_map[addr] = size
@@ -239,17 +339,9 @@ class DynamicHeap:
                 size = self.alloc_map[addr]
                 del self.alloc_map[addr]
                 
-                # Get the heap id of the current object
-                id = self.heap_addrs[addr] 
-                
-                # Update its address
-                self.heap_ids[id] = start
-                
-                # Delete the old address
-                del self.heap_addrs[addr] 
-                
-                # Update the new address to point to id
-                self.heap_addrs[start] = id 
+                # Get the heap id of the current object from the block header, and update its handle
+                id = U32.unpack_from(self.arr, addr)[0]
+                self.move_handle(id, start + BLOCK_HEADER)
                 
                 # Update the allocations map
                 self.alloc_map[start] = size 
@@ -270,38 +362,27 @@ class DynamicHeap:
    
     def overwrite_copy(self, new_addr, old_addr, size):
         """
-        Copies memory from one address to another, potentially overwriting memory at the old address durring the copy.
+        Copies memory from one address to another, potentially overwriting memory at the old address durring the copy. Assigning between memoryview slices is a single memmove, so overlapping blocks are safe.
         """
-        i = 0
-        while i < size:
-            self.arr[new_addr + i] = self.arr[old_addr + i]
-            i += 1
+        self.view[new_addr:new_addr+size] = self.view[old_addr:old_addr+size]
    
     def read_bytes(self, addr, size):
         """
         Reads bytes from a valid allocated address into a new byte array.
         """
-        s = self.alloc_map.get(addr)
+        s = self.alloc_map.get(addr - BLOCK_HEADER)
         # changed s != size
-        if s == None or s < size:
+        if s == None or s - BLOCK_HEADER < size:
             raise Exception("Attempting to Read Unallocated Memory")
-        chunk = bytearray(size)
-        i = 0
-        while i < size:
-            chunk[i] = self.arr[addr + i]
-            i += 1
-        return chunk
+        return self.arr[addr:addr+size]
 
     def write_bytes(self, addr, size, bytes):
         if size < 0:
             raise Exception("Size Must be Greater Than Zero!")
-        s = self.alloc_map.get(addr)
-        if s == None or s < size:
+        s = self.alloc_map.get(addr - BLOCK_HEADER)
+        if s == None or s - BLOCK_HEADER < size:
             raise Exception("Attempting to Write to Unfree Memory!")
-        i = 0
-        while i < size:
-            self.arr[addr + i] = bytes[i]
-            i += 1
+        self.view[addr:addr+size] = memoryview(bytes)[:size]
 
     def unsafe_write_bytes(self, addr, size, bytes):
         """
@@ -309,78 +390,509 @@ class DynamicHeap:
         """
         if size < 0:
             raise Exception("Size Must be Greater Than Zero!")
-        s = self.alloc_map.get(addr)
-        i = 0
-        while i < size:
-            self.arr[addr + i] = bytes[i]
-            i += 1
+        # the view can't be resized, so writing too few bytes raises instead of shifting the heap
+        self.view[addr:addr+size] = memoryview(bytes)[:size]
 
     def unsafe_read_bytes(self, addr, size):
         """
         Reads bytes from an address into a new byte array.
         """
-        chunk = bytearray(size)
-        i = 0
-        while i < size:
-            chunk[i] = self.arr[addr + i]
-            i += 1
-        return chunk
+        return self.arr[addr:addr+size]
     
-    def reallocate(self, id, size, new_size):
-        added_size = new_size - size
-        if not (id in self.heap_ids):
+    def fill_bytes(self, addr, size, byte=NULL):
+        """
+        Sets size bytes starting at an address to byte.
+        """
+        self.view[addr:addr+size] = bytes([byte]) * size
+    
+    def read_u32(self, addr):
+        return U32.unpack_from(self.arr, addr)[0]
+    
+    def write_u32(self, addr, n):
+        U32.pack_into(self.arr, addr, n)
+    
+    def block_to_reallocate(self, id, new_size):
+        """
+        Checks an object can be reallocated to new_size bytes, growing the heap if it's short of memory. Returns its block's address, size and new size.
+        """
+        if not (id < len(self.handles) and self.handles[id] != FREE_HANDLE):
             raise Exception("Attempting to Reallocate Invalid Heap ID!")
-        addr = self.heap_ids[id]
-        if new_size <= size:
-            raise Exception("New Size is Equal or Smaller Than Old Size!")
-        if added_size  > self.remaining:
-            raise Exception("Heap is Out of Memory!")
+        addr = self.handles[id] - BLOCK_HEADER
         if not (addr in self.alloc_map):
             raise Exception("Address isn't Allocated!")
+        # the allocation map has the real size, the caller's may be out of date
         size = self.alloc_map[addr]
+        new_size += BLOCK_HEADER
+        if new_size <= size:
+            raise Exception("New Size is Equal or Smaller Than Old Size!")
+        while new_size - size > self.remaining:
+            if not self.grow(new_size - size - self.remaining):
+                raise Exception("Heap is Out of Memory!")
+        return addr, size, new_size
+    
+    def move_block(self, id, addr, size, new_size):
+        """
+        Moves an object to a new block of new_size bytes, its id (in the block header) goes with it.
+        """
+        data = self.arr[addr:addr+size]
+        self.free_block(addr)
+        new_addr = self.allocate_block(new_size)
+        self.view[new_addr:new_addr+size] = data
+        self.move_handle(U32.unpack_from(data, 0)[0], new_addr + BLOCK_HEADER)
+        return new_addr + BLOCK_HEADER
+    
+    def reallocate(self, id, size, new_size):
+        addr, size, new_size = self.block_to_reallocate(id, new_size)
+        added_size = new_size - size
         next_addr = addr+size
         if next_addr in self.free_map and added_size <= self.free_map[next_addr]:
-            free_space = self.free_map[next_addr]
-            adjusted_addr = next_addr + added_size
-            del self.free_map[next_addr]
-            self.free_map[adjusted_addr] = free_space - added_size
+            free_space = self.free_map.pop(next_addr)
+            # a free block that's used up is dropped, a zero sized one would stop compaction moving past it
+            if free_space > added_size:
+                self.free_map[next_addr + added_size] = free_space - added_size
             self.alloc_map[addr] = new_size
             self.remaining -= added_size
             if next_addr == self.head:
                 self.head = next_addr + added_size
                 self.head_to_end -= added_size
-            return addr
+            return addr + BLOCK_HEADER
         else:
-            bytes = self.read_bytes(addr, size)
-            self.free(id, size)
-            new_addr = self.allocate(id, new_size)
-            self.write_bytes(new_addr, size, bytes)
-            return new_addr
+            return self.move_block(id, addr, size, new_size)
     
     def print_chunk(self, addr, size):
         print(f"Chunk at:{addr} [{self.arr[addr:addr+size]} {size} bytes")
+
+class SegregatedHeap(DynamicHeap):
+    """
+    A DynamicHeap with a segregated free list allocator, it has the same allocate/free/reallocate interface.
+    Free blocks are binned by size class, bin k holds the blocks whose size has a bit length of k, so an allocation only looks at blocks that could fit. Freed blocks are coalesced with free neighbours, and fresh allocations are bumped from the region after the head. Compaction only happens when no block fits and the bump region is too small, even though there's enough free memory in total.
+    """
+    def __init__(self, cap, max_cap=None):
+        super().__init__(cap, max_cap)
+        # free blocks before the head, the bump region [head, cap) isn't in them
+        self.free_map = {} # addr:size
+        self.free_ends = {} # end addr:addr, for coalescing with the block before
+        self.bins = [{} for i in range(cap.bit_length() + 1)] # size class:{addr:size}
+        self.bin_mask = 0 # bit k is set when bin k isn't empty
+    
+    def add_free_block(self, addr, size):
+        size_class = size.bit_length()
+        self.free_map[addr] = size
+        self.free_ends[addr + size] = addr
+        self.bins[size_class][addr] = size
+        self.bin_mask |= 1 << size_class
+    
+    def remove_free_block(self, addr):
+        size = self.free_map.pop(addr)
+        del self.free_ends[addr + size]
+        size_class = size.bit_length()
+        bin = self.bins[size_class]
+        del bin[addr]
+        if len(bin) == 0:
+            self.bin_mask &= ~(1 << size_class)
+        return size
+    
+    def select_location(self, size):
+        # First fit in the block's own size class, where blocks may be smaller than size
+        size_class = size.bit_length()
+        bin = self.bins[size_class]
+        for addr in bin:
+            if size <= bin[addr]:
+                return addr
+        # Any block in a bigger class fits, take one from the smallest non empty class
+        larger = self.bin_mask >> (size_class + 1)
+        if larger == 0:
+            return -1
+        size_class += (larger & -larger).bit_length()
+        return next(iter(self.bins[size_class]))
+    
+    def allocate_block(self, size):
+        """
+        Allocates from a free block if one fits, splitting off what's left over, otherwise from the bump region. If neither has room the heap grows or compacts first, see make_room.
+        """
+        addr = self.select_location(size)
+        if addr != -1:
+            block_size = self.remove_free_block(addr)
+            if block_size > size:
+                self.add_free_block(addr + size, block_size - size)
+        else:
+            if size > self.head_to_end:
+                self.make_room(size)
+            addr = self.head
+            self.head += size
+            self.head_to_end -= size
+        
+        self.remaining -= size
+        self.alloc_map[addr] = size
+        return addr
+    
+    def free_block(self, addr):
+        """
+        Frees a block, coalescing it with the free blocks on either side. A block that ends at the head goes back to the bump region.
+        """
+        if not addr in self.alloc_map:
+            raise Exception("Attempting to Free Unallocated Memory!")
+        
+        size = self.alloc_map.pop(addr)
+        self.remaining += size
+        
+        if addr + size in self.free_map:
+            size += self.remove_free_block(addr + size)
+        if addr in self.free_ends:
+            prev_addr = self.free_ends[addr]
+            size += self.remove_free_block(prev_addr)
+            addr = prev_addr
+        
+        if addr + size == self.head:
+            self.head = addr
+            self.head_to_end += size
+        else:
+            self.add_free_block(addr, size)
+    
+    def reallocate(self, id, size, new_size):
+        """
+        Grows an object in place when the free block or bump region after it has room, otherwise moves it.
+        """
+        addr, size, new_size = self.block_to_reallocate(id, new_size)
+        added_size = new_size - size
+        
+        next_addr = addr + size
+        if next_addr == self.head and added_size > self.head_to_end:
+            # the object ends at the head, so growing the heap lets it grow in place
+            self.grow(added_size - self.head_to_end)
+        if next_addr == self.head and added_size <= self.head_to_end:
+            self.head += added_size
+            self.head_to_end -= added_size
+        elif next_addr in self.free_map and added_size <= self.free_map[next_addr]:
+            free_size = self.remove_free_block(next_addr)
+            if free_size > added_size:
+                self.add_free_block(next_addr + added_size, free_size - added_size)
+        else:
+            return self.move_block(id, addr, size, new_size)
+        
+        self.alloc_map[addr] = new_size
+        self.remaining -= added_size
+        return addr + BLOCK_HEADER
+    
+    def compact(self):
+        """
+        Slides every allocated block down to the start of the heap, in address order, so all free memory becomes the bump region. Each block's header has its id, for updating its handle.
+        """
+        alloc_map = {}
+        arr = self.arr
+        start = 0
+        for addr in sorted(self.alloc_map):
+            size = self.alloc_map[addr]
+            if addr != start:
+                self.overwrite_copy(start, addr, size)
+                self.move_handle(U32.unpack_from(arr, start)[0], start + BLOCK_HEADER)
+            alloc_map[start] = size
+            start += size
+        self.alloc_map = alloc_map
+        
+        self.free_map = {}
+        self.free_ends = {}
+        self.bins = [{} for i in range(self.cap.bit_length() + 1)]
+        self.bin_mask = 0
+        self.head = start
+        self.head_to_end = self.cap - start
+    
+    def grow(self, size):
+        # the bump region is after the head, so the new memory only needs new size classes
+        if not self.extend(size):
+            return False
+        while len(self.bins) < self.cap.bit_length() + 1:
+            self.bins.append({})
+        return True
     
 class HeapManager:
-    def __init__(self, dynamic_size, static_size, static_obj_count, static_objs):
-        self.dynamic_heap = DynamicHeap(dynamic_size)
-        self.static_heap = MinimalHeap(static_size)
-        self.id = 0
+    def __init__(self, dynamic_size, static_global_count, static_obj_count, static_objs, dynamic_heap_class=SegregatedHeap, gc_budget=None, max_dynamic_size=None, table_load_factor=TABLE_LOAD_FACTOR):
+        # the allocator is pluggable, DynamicHeap or SegregatedHeap; the dynamic heap grows up to max_dynamic_size bytes
+        self.dynamic_heap = dynamic_heap_class(dynamic_size, max_dynamic_size)
+        self.peak_heap_used = 0 # most bytes of the dynamic heap in use at once, live or garbage
+        # one 8 byte value per static global, indexed by slot; grows when a global past the end is set
+        self.static_globals = [NULL_VALUE] * static_global_count
         self.static_obj_count = static_obj_count
-        self.intern_table_ref = self.new_table(1, True, True, False)
+        
+        # the garbage collector runs at the VM's next safe point once this many bytes of the dynamic heap are in use
+        self.gc_threshold = dynamic_size // 2
+        # copies that share a block allocate nothing, so they start a collection by count instead
+        self.gc_alias_threshold = GC_ALIAS_THRESHOLD
+        # work done at each safe point while a cycle runs, None runs whole cycles (stop the world)
+        self.gc_budget = gc_budget
+        self.gc_phase = GC_IDLE
+        self.gc_gray = [] # ids of marked objects that haven't been scanned
+        self.gc_sweep_ids = [] # ids left to sweep
+        self.gc_shared_marks = set() # ids of shared objects (see share_array) reached while marking
+        self.gc_count = 0
+        self.gc_cycle_reclaimed = 0
+        self.gc_reclaimed = 0 # bytes freed by every collection
+        self.gc_pauses = [] # seconds, one per safe point the collector ran at
+        
+        self.table_load_factor = table_load_factor
         self.static_objs = static_objs
+        # the hash of each static string by static object index, None for other static objects
+        self.static_hashes = [hash_bytes(obj[8:]) if obj[0] == Values.StaticObjectType.STATIC_STRING.value else None for obj in static_objs]
+        self.intern_static_strings()
+    
+    def set_static_global(self, slot, val):
+        if slot >= len(self.static_globals):
+            self.grow_static_globals(slot + 1)
+        self.static_globals[slot] = val
+    
+    def get_static_global(self, slot):
+        # globals that were never set are null
+        if slot >= len(self.static_globals):
+            return NULL_VALUE
+        return self.static_globals[slot]
+    
+    def grow_static_globals(self, count):
+        # at least doubles, so setting globals one after another takes amortized constant time
+        new_count = max(count, 2 * len(self.static_globals))
+        self.static_globals.extend([NULL_VALUE] * (new_count - len(self.static_globals)))
+
+    def allocate(self, id, size):
+        """
+        Allocates a heap object. An object allocated while marking is marked (see generate_flag_byte) and queued to be scanned, whatever it's filled with before then is traced.
+        """
+        dynamic_heap = self.dynamic_heap
+        addr = dynamic_heap.allocate(id, size)
+        if self.gc_phase == GC_MARK:
+            self.gc_gray.append(id)
+        if dynamic_heap.cap - dynamic_heap.remaining > self.peak_heap_used:
+            self.peak_heap_used = dynamic_heap.cap - dynamic_heap.remaining
+        return addr
     
-    def set_static_global(self, addr, val):
-        self.static_heap.write_bytes(addr, 8, val)
+    def gc_needed(self):
+        dynamic_heap = self.dynamic_heap
+        return dynamic_heap.cap - dynamic_heap.remaining >= self.gc_threshold or dynamic_heap.alias_count >= self.gc_alias_threshold
+    
+    def gc_shade(self, id):
+        """
+        Marks an object and queues it to be scanned, unless it's already marked (gray or black).
+        """
+        addr = self.dynamic_heap.handles[id]
+        if addr == FREE_HANDLE:
+            return
+        flags = self.dynamic_heap.arr[addr+1]
+        if flags & SHARED_FLAG:
+            # the mark bit is the block's, which ids reached it is kept for the sweep
+            self.gc_shared_marks.add(id)
+        # Skip objects that are already marked
+        if not flags & MARK_FLAG:
+            self.dynamic_heap.arr[addr+1] = flags | MARK_FLAG
+            self.gc_gray.append(id)
+    
+    def gc_shade_values(self, values):
+        for val in values:
+            if val[0] == Values.HEAP_OBJ_TYPE:
+                self.gc_shade(U32.unpack_from(val, 4)[0])
+    
+    def gc_write_barrier(self, val):
+        """
+        Called when a value is stored in a heap object. While marking, the stored object is shaded, so a scanned (black) object never refers to an unmarked (white) one.
+        """
+        if self.gc_phase == GC_MARK and val[0] == Values.HEAP_OBJ_TYPE:
+            self.gc_shade(U32.unpack_from(val, 4)[0])
+    
+    def gc_mark_values(self, start, end):
+        """
+        Shades the heap objects referred to by the 8 byte values in [start, end).
+        """
+        arr = self.dynamic_heap.arr
+        while start < end:
+            if arr[start] == Values.HEAP_OBJ_TYPE:
+                self.gc_shade(U32.unpack_from(arr, start+4)[0])
+            start += 8
+    
+    def gc_mark_table(self, addr, size):
+        # keys and values are both values, empty cells are null; the key hashes after the cells aren't values
+        _, cappacity = self.extract_table_sizes(addr, size, bool(self.dynamic_heap.arr[addr+3] & 0b0010))
+        self.gc_mark_values(addr+12, addr+size-4*cappacity)
+    
+    def gc_mark_array(self, addr, num_elements):
+        self.gc_mark_values(addr+12, addr+12+num_elements*8)
+    
+    def gc_mark_deque(self, addr, size):
+        # only the elements in use, from the head to the end of the ring and then the ones that wrapped around
+        num_elements = self.dynamic_heap.read_u32(addr+8)
+        head = self.dynamic_heap.read_u32(addr+12)
+        cappacity = (size - 16) // 8
+        start = addr + 16
+        self.gc_mark_values(start + head*8, start + min(head + num_elements, cappacity)*8)
+        self.gc_mark_values(start, start + max(head + num_elements - cappacity, 0)*8)
+    
+    def gc_mark_queue(self, addr, num_elements):
+        # the queue's table of positions, then its key, priority pairs
+        self.gc_mark_values(addr+12, addr+20)
+        self.gc_mark_values(addr+20, addr+20+num_elements*16)
+    
+    def gc_mark_struct(self, addr, size):
+        # the field values, then their keys
+        self.gc_mark_values(addr+12, addr+size)
+    
+    def gc_mark_closure(self, addr, size):
+        # the id and function, then 3 values per up value; a closed up value's first value refers to its dynamic up value
+        self.gc_mark_values(addr+8, addr+24)
+        self.gc_mark_values(addr+28, addr+size)
+    
+    def gc_mark_dynamic_up_value(self, addr):
+        self.gc_mark_values(addr+8, addr+16)
+    
+    def gc_mark_object(self, addr):
+        """
+        Scans the heap object at addr, shading every object it refers to. Returns the work done, one unit per 8 bytes.
+        """
+        type, flags, size = HEAP_OBJECT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
+        if type == TABLE:
+            self.gc_mark_table(addr, size)
+        elif type == ARRAY:
+            self.gc_mark_array(addr, self.dynamic_heap.read_u32(addr+8))
+        elif type == DEQUE:
+            self.gc_mark_deque(addr, size)
+        elif type == PRIORITY_QUEUE:
+            self.gc_mark_queue(addr, self.dynamic_heap.read_u32(addr+8))
+        elif type == STRUCT:
+            self.gc_mark_struct(addr, size)
+        elif type == HeapType.CLOSURE.value:
+            self.gc_mark_closure(addr, size)
+        elif type == HeapType.UP_VALUE.value:
+            self.gc_mark_dynamic_up_value(addr)
+        elif type != IMMUTABLE_STRING and type != PACKED_ARRAY:
+            # strings and packed arrays don't refer to other objects
+            raise Exception("Attempting to Mark an Invalid Heap Object!")
+        return 1 + size // 8
+    
+    def gc_start(self, roots):
+        """
+        Starts a collection cycle by shading the roots, the static globals and every object that isn't garbage collected.
+        """
+        self.gc_phase = GC_MARK
+        self.gc_cycle_reclaimed = 0
+        self.gc_shared_marks = set()
+        self.gc_shade_values(roots())
+        self.gc_shade_values(self.static_globals)
+        # Objects that aren't garbage collected, like the intern table, are always live
+        arr = self.dynamic_heap.arr
+        for id, addr in enumerate(self.dynamic_heap.handles):
+            if addr != FREE_HANDLE and not arr[addr+1] & GC_FLAG:
+                self.gc_shade(id)
+    
+    def gc_mark_step(self, roots, budget):
+        """
+        Scans gray objects until budget units of work are done, returns the work left. The VM's stack and the globals aren't behind a write barrier, so once nothing is gray they're shaded again; marking ends when that finds nothing new.
+        """
+        handles = self.dynamic_heap.handles
+        gray = self.gc_gray
+        while budget > 0:
+            if len(gray) == 0:
+                self.gc_shade_values(roots())
+                self.gc_shade_values(self.static_globals)
+                if len(gray) == 0:
+                    self.gc_phase = GC_SWEEP
+                    self.gc_sweep_ids = [id for id in range(len(handles)) if handles[id] != FREE_HANDLE]
+                    return budget
+            addr = handles[gray.pop()]
+            # the id is gone when a table was resized, it's queued again under the table's id
+            if addr != FREE_HANDLE:
+                budget -= self.gc_mark_object(addr)
+        return budget
+    
+    def gc_sweep_step(self, budget):
+        """
+        Sweeps objects that existed when marking ended until budget units of work are done, one per object. Garbage collected objects that aren't marked are freed, the marks of the rest are cleared.
+        """
+        dynamic_heap = self.dynamic_heap
+        arr = dynamic_heap.arr
+        sweep_ids = self.gc_sweep_ids
+        while budget > 0 and len(sweep_ids) > 0:
+            id = sweep_ids.pop()
+            budget -= 1
+            addr = dynamic_heap.handles[id]
+            if addr == FREE_HANDLE:
+                continue
+            flags = arr[addr+1]
+            if id in self.gc_shared_marks:
+                # reached while its block was shared, kept even if the block was unshared since
+                self.gc_shared_marks.discard(id)
+                arr[addr+1] = flags & ~MARK_FLAG
+            elif flags & SHARED_FLAG and flags & GC_FLAG:
+                # the mark bit is the block's, an id sharing it is only kept if it was reached itself
+                dynamic_heap.free(id, 0)
+            elif flags & MARK_FLAG:
+                arr[addr+1] = flags & ~MARK_FLAG
+            elif flags & GC_FLAG:
+                # the allocation map has the real size, arrays grow without updating their header
+                size = dynamic_heap.alloc_map[addr - BLOCK_HEADER]
+                dynamic_heap.free(id, size)
+                self.gc_cycle_reclaimed += size
+        if len(sweep_ids) == 0:
+            self.gc_finish()
+        return budget
+    
+    def gc_finish(self):
+        self.gc_phase = GC_IDLE
+        self.gc_shared_marks = set()
+        self.gc_count += 1
+        self.gc_reclaimed += self.gc_cycle_reclaimed
+        
+        # The end of a cycle is the idle point where compaction is cheapest to defer to, rather than stalling an allocation
+        dynamic_heap = self.dynamic_heap
+        if dynamic_heap.remaining - dynamic_heap.head_to_end > dynamic_heap.remaining // 2:
+            dynamic_heap.compact()
+        
+        # Collect again once half of the space that's left has been allocated
+        live = dynamic_heap.cap - dynamic_heap.remaining
+        self.gc_threshold = live + (dynamic_heap.cap - live) // 2
+        self.gc_alias_threshold = max(2 * dynamic_heap.alias_count, GC_ALIAS_THRESHOLD)
+    
+    def collect_garbage(self, roots, budget=None):
+        """
+        Runs the tri-color collector, roots returns the values the VM can reach directly: its stack, call frames, closures and open up values. With no budget the current cycle, or a new one, runs to the end. Otherwise up to budget units of work are done, so the pause is bounded and the rest of the cycle runs at later safe points. Returns the bytes freed so far in the cycle.
+        """
+        t0 = time.perf_counter()
+        if self.gc_phase == GC_IDLE:
+            self.gc_start(roots)
+        if budget == None:
+            budget = math.inf
+        if self.gc_phase == GC_MARK:
+            budget = self.gc_mark_step(roots, budget)
+        if self.gc_phase == GC_SWEEP and budget > 0:
+            self.gc_sweep_step(budget)
+        self.gc_pauses.append(time.perf_counter() - t0)
+        return self.gc_cycle_reclaimed
+    
+    def gc_safe_point(self, roots):
+        """
+        Called by the VM between instructions. Starts a cycle once the heap passes the threshold and continues one that's running.
+        """
+        if self.gc_phase == GC_IDLE and not self.gc_needed():
+            return
+        budget = self.gc_budget
+        # Finish the cycle when the heap is nearly full and can't grow much more, rather than run out in the middle of an instruction
+        dynamic_heap = self.dynamic_heap
+        if dynamic_heap.remaining + dynamic_heap.max_cap - dynamic_heap.cap < dynamic_heap.max_cap // 8:
+            budget = None
+        self.collect_garbage(roots, budget)
+    
+    def gc_pause_percentile(self, p):
+        if len(self.gc_pauses) == 0:
+            return 0
+        pauses = sorted(self.gc_pauses)
+        return pauses[min(len(pauses) - 1, int(p * len(pauses)))]
+    
+    def print_gc_report(self):
+        print(f"Garbage Collector: {self.gc_count} collections reclaimed {self.gc_reclaimed} bytes, {len(self.gc_pauses)} pauses took {sum(self.gc_pauses)*1000:.3f}ms (p99 {self.gc_pause_percentile(0.99)*1000:.3f}ms, longest {self.gc_pause_percentile(1)*1000:.3f}ms)")
+    
+    def print_memory_report(self):
+        dynamic_heap = self.dynamic_heap
+        print(f"Heap: peak {self.peak_heap_used} bytes used, {dynamic_heap.cap} bytes allocated (max {dynamic_heap.max_cap})")
     
-    def get_static_global(self, addr):
-        return self.static_heap.read_bytes(addr, 8)    
-
     def new_id(self):
         """ 
-        Create a new heap id
+        Create a new heap id, reusing a freed one unless a sweep is running. The sweep goes through the ids that were live when marking ended, so a new object mustn't take one it hasn't reached yet.
         """
-        self.id += 1
-        return self.id - 1
+        return self.dynamic_heap.new_id(self.gc_phase != GC_SWEEP)
     
     def generate_flag_byte(self, gc):
         """
@@ -390,6 +902,9 @@ class HeapManager:
         GARBAGE_COLLECTED = 0b0000
         if gc:
             GARBAGE_COLLECTED = 0b0001
+        # Objects allocated while marking are live for the rest of the cycle
+        if self.gc_phase == GC_MARK:
+            flags |= MARK_FLAG
             
         return flags | GARBAGE_COLLECTED
         
@@ -409,10 +924,7 @@ class HeapManager:
         """
         id = int.from_bytes(id_val[4:], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
-        type = self.dynamic_heap.arr[addr]
-        flags = self.dynamic_heap.arr[addr+1]
-
-        size = int.from_bytes(self.dynamic_heap.arr[addr+4:addr+8], byteorder="little")
+        type, flags, size = HEAP_OBJECT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
         return addr, type, flags, size
 
     def read_heap_object(self, heap_value):
@@ -475,6 +987,29 @@ class HeapManager:
         arr_str += "}"
         return arr_str
     
+    def packed_array_to_string(self, arr_val):
+        # printed like the array of values it was compiled from
+        with self.packed_view(arr_val) as view:
+            elements = view.tolist()
+        arr_str = "{"
+        for el in elements:
+            arr_str += str(el) + ","
+        arr_str += "}"
+        return arr_str
+
+    def deque_to_string(self, deque_val):
+        addr, size, num_elements, head, resizable, gc = self.read_deque_header(deque_val)
+        cappacity = (size - 16) // 8
+        i = 0
+        deque_str = "<|"
+        while i < num_elements:
+            index_addr = addr + 16 + ((head + i) % cappacity) * 8
+            deque_str += Values.value_to_string(self.dynamic_heap.arr[index_addr:index_addr+8], self.static_objs, self)
+            deque_str += ","
+            i += 1
+        deque_str += "|>"
+        return deque_str
+    
     def priority_queue_to_string(self, addr, num_entries):
         i = 0
         addr = addr + 20
@@ -491,6 +1026,22 @@ class HeapManager:
         queue_str += "|>"
         return queue_str
     
+    def struct_to_string(self, struct_val):
+        addr, size, num_fields, immutable, gc = self.read_struct_header(struct_val)
+        # structs print like their literals, records in parentheses
+        struct_str = "(" if immutable else "["
+        i = 0
+        while i < num_fields:
+            key_addr = addr + 12 + (num_fields + i) * 8
+            field_addr = addr + 12 + i * 8
+            struct_str += Values.value_to_string(self.dynamic_heap.arr[key_addr:key_addr+8], self.static_objs, self)
+            struct_str += ":"
+            struct_str += Values.value_to_string(self.dynamic_heap.arr[field_addr:field_addr+8], self.static_objs, self)
+            struct_str += ","
+            i += 1
+        struct_str += ")" if immutable else "]"
+        return struct_str
+    
     def heap_object_to_string(self, heap_value):
         addr, type, flags, size = self.read_heap_object_header(heap_value)
         if type == HeapType.TABLE.value:
@@ -502,6 +1053,12 @@ class HeapManager:
         elif type == HeapType.PRIORITY_QUEUE.value:
             addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(heap_value)
             return self.priority_queue_to_string(addr, num_elements)
+        elif type == HeapType.DEQUE.value:
+            return self.deque_to_string(heap_value)
+        elif type == HeapType.STRUCT.value:
+            return self.struct_to_string(heap_value)
+        elif type == HeapType.PACKED_ARRAY.value:
+            return self.packed_array_to_string(heap_value)
         elif type == HeapType.CLOSURE.value:
             return self.closure_to_string()
         else:
@@ -535,12 +1092,9 @@ class HeapManager:
         """
         Returns the characters stored in a string from a string value. Assumes that str_val is a valid string.
         """
-        obj = None
         if str_val[0] == Values.ValueType.HEAP_OBJ.value:
-            obj = self.read_heap_object(str_val)
-        else:
-            obj = self.read_static_object(str_val)
-        return obj[8:]
+            return self.read_heap_object(str_val)[STRING_HEADER.size:]
+        return self.read_static_object(str_val)[8:]
     
     def is_orderable(self, v):
         _, t, _, _ = heap_manager.read_heap_object_header(v)
@@ -564,6 +1118,9 @@ class HeapManager:
         """
         Compares two strings represented as values. If they have the same characters (represented by bytes), they are equivalent. Assumes both v1 and v2 are string values.
         """
+        # Two interned strings only have the same characters if they're the same string
+        if self.is_interned(v1) and self.is_interned(v2):
+            return v1 == v2
         s1 = self.read_string_payload(v1)
         s2 = self.read_string_payload(v2)
         return s1 == s2
@@ -576,7 +1133,8 @@ class HeapManager:
         addr1, size1, total_entries1, cappacity1, is_set1, resizable1 = self.read_table_header(v1)
         addr2, size2, total_entries2, cappacity2, is_set2, resizable2 = self.read_table_header(v2)
         
-        if cappacity1 != cappacity2:
+        # Tables that grew differently can hold the same entries
+        if total_entries1 != total_entries2 or is_set1 != is_set2:
             return False
         
         # Offset by the header (12 bytes)
@@ -599,17 +1157,17 @@ class HeapManager:
             if is_set1:
                 # If its a set, just move the key
                 if self.dynamic_heap.arr[index] != NULL:
-                    i = self.find_table_cell(addr2, cappacity2, is_set2, self.dynamic_heap.arr[index:index+8])
-                    if i == None:
+                    cell = self.find_table_cell(addr2, cappacity2, is_set2, self.dynamic_heap.arr[index:index+8])
+                    if cell == None:
                         return False
             else:
                 # If its a key:value, move both
                 if self.dynamic_heap.arr[index] != NULL:
-                    i = self.find_table_cell(addr2, cappacity2, is_set2, self.dynamic_heap.arr[index:index+8])
-                    if i == None:
+                    cell = self.find_table_cell(addr2, cappacity2, is_set2, self.dynamic_heap.arr[index:index+8])
+                    if cell == None:
                         return False
                     el1 = self.dynamic_heap.arr[index+8:index+8+8]
-                    el2 = self.dynamic_heap.arr[i+8:i+8+8]
+                    el2 = self.dynamic_heap.arr[cell+8:cell+8+8]
                     if not Values.compare_values(el1, el2, self):
                         return False
                     
@@ -659,6 +1217,57 @@ class HeapManager:
             i += 1
         return True
             
+    def compare_packed_arrays(self, arr1, arr2):
+        """
+        Compares a packed array with a packed array, or with an array of values, element by element.
+        """
+        size1 = self.struct_size(arr1)
+        if size1 != self.struct_size(arr2):
+            return False
+
+        i = 0
+        num_elements = Values.value_to_python_repr(size1)
+        while i < num_elements:
+            index = Values.python_repr_to_value(i)
+            if not Values.compare_values(self.access_structure(arr1, index), self.access_structure(arr2, index), self):
+                return False
+            i += 1
+        return True
+
+    def compare_deques(self, deque1, deque2):
+        _, _, num_elements1, _, _, _ = self.read_deque_header(deque1)
+        _, _, num_elements2, _, _, _ = self.read_deque_header(deque2)
+        if num_elements1 != num_elements2:
+            return False
+        
+        i = 0
+        while i < num_elements1:
+            index = Values.python_repr_to_value(i)
+            if not Values.compare_values(self.deque_get_index(deque1, index), self.deque_get_index(deque2, index), self):
+                return False
+            i += 1
+        return True
+    
+    def compare_structs(self, struct1, struct2):
+        """
+        Structs are equal when they have the same fields with equal values, in any order. A struct is never equal to a record.
+        """
+        addr1, _, num_fields1, immutable1, _ = self.read_struct_header(struct1)
+        addr2, _, num_fields2, immutable2, _ = self.read_struct_header(struct2)
+        if num_fields1 != num_fields2 or immutable1 != immutable2:
+            return False
+        
+        i = 0
+        while i < num_fields1:
+            key = self.dynamic_heap.unsafe_read_bytes(addr1 + 12 + (num_fields1 + i) * 8, 8)
+            index = self.struct_field_index(struct2, key)
+            if index == None:
+                return False
+            if not Values.compare_values(self.get_field(struct1, i), self.get_field(struct2, index), self):
+                return False
+            i += 1
+        return True
+    
     def compare_heap_objs(self, v1, v2):
         """
         Determines if two heap objects are (loosley) equivalent. Assumes that v1 and v2 are heap object values.
@@ -669,6 +1278,8 @@ class HeapManager:
         
         if self.is_string(v1) and self.is_string(v2):
             return Values.compare_strings(v1, v2, self)
+        elif type1 == PACKED_ARRAY and type2 in (ARRAY, PACKED_ARRAY) or type2 == PACKED_ARRAY and type1 == ARRAY:
+            return self.compare_packed_arrays(v1, v2)
         elif type1 != type2:
             return False
         elif type1 == HeapType.TABLE.value:
@@ -677,21 +1288,25 @@ class HeapManager:
             return self.compare_arrays(v1, v2)
         elif type1 == HeapType.PRIORITY_QUEUE.value:
             return self.compare_priority_queues(v1, v2)
+        elif type1 == HeapType.DEQUE.value:
+            return self.compare_deques(v1, v2)
+        elif type1 == HeapType.STRUCT.value:
+            return self.compare_structs(v1, v2)
         else:
             raise Exception("Attempting to Compare Invalid Heap Types!")
     
     def is_string(self, v):
-        if v[0] == Values.ValueType.STATIC_OBJ.value:
-            index = int.from_bytes(v[4:], byteorder="little")
-            return self.static_objs[index][0] == Values.StaticObjectType.STATIC_STRING.value
+        if v[0] == Values.STATIC_OBJ_TYPE:
+            # only static strings have a hash
+            return self.static_hashes[U32.unpack_from(v, 4)[0]] != None
             
-        if v[0] == Values.ValueType.HEAP_OBJ.value:
-            _, type, _, _ = self.read_heap_object_header(v)
+        if v[0] == Values.HEAP_OBJ_TYPE:
+            type = self.dynamic_heap.arr[self.dynamic_heap.get_addr(U32.unpack_from(v, 4)[0])]
             
-            if type == HeapType.IMMUTABLE_STRING.value:
+            if type == IMMUTABLE_STRING:
                 return True
                 
-            if type == HeapType.MUTABLE_STRING.value:
+            if type == MUTABLE_STRING:
                 return True
                 
         return False
@@ -710,33 +1325,39 @@ class HeapManager:
         val_ref[4:] = id.to_bytes(4, byteorder="little")
         return val_ref
 
-    def allocate_str(self, str, gc):
+    def allocate_str(self, str, gc, intern=False):
         """
-        Allocates an immutable string (max length 2^32) on the heap.
-        Subtract 8 bytes for the header size
+        Allocates an immutable string (max length 2^32) on the heap, or returns the interned string with its characters when intern is set.
+        Subtract 12 bytes for the header size
         """
-        chars = len(str)
-        if chars > 4294967288:
+        chars = bytes(str, 'utf-8')
+        if len(chars) > 4294967284:
             raise Exception("String is Too Long!")
         
         # generate a heap id
         id = self.new_id() 
         
-        # 1 byte of type, 3 byte of flags and spacing, 4 bytes of size 
-        size = 8 + chars
-        addr = self.dynamic_heap.allocate(id, size)
+        # 1 byte of type, 3 byte of flags and spacing, 4 bytes of size, 4 bytes of hash
+        size = STRING_HEADER.size + len(chars)
+        addr = self.allocate(id, size)
         
-        # Write the header (1 byte type | 1 byte flags | 4 bytes size)
-        self.dynamic_heap.arr[addr] = HeapType.IMMUTABLE_STRING.value
-        self.dynamic_heap.arr[addr+1] = self.generate_flag_byte(gc)
-        self.dynamic_heap.arr[addr+4:addr+8] = size.to_bytes(4, byteorder="little")
+        # Write the header (1 byte type | 1 byte flags | 4 bytes size | 4 bytes hash), the hash is computed once here rather than on every table lookup
+        STRING_HEADER.pack_into(self.dynamic_heap.arr, addr, HeapType.IMMUTABLE_STRING.value, self.generate_flag_byte(gc), size, hash_bytes(chars))
         
         # The write is unsafe because its writing in the middle of an allocated block
         # Write the chars to the heap
-        self.dynamic_heap.unsafe_write_bytes(addr+8, chars, bytes(str, 'utf-8'))
+        self.dynamic_heap.unsafe_write_bytes(addr+STRING_HEADER.size, len(chars), chars)
+        
+        str_val = self.val_as_heap_ref(id)
+        if intern:
+            interned = self.intern_string(str_val)
+            if interned != str_val and not gc:
+                # Nothing else refers to the new string
+                self.free_heap_object(str_val)
+            return interned
         
         # Return the heap object used by the VM
-        return self.val_as_heap_ref(id)       
+        return str_val
 
     def calculate_table_size(self, cappacity, is_set):
         # Header size
@@ -749,6 +1370,9 @@ class HeapManager:
         if not is_set:
             size += (cappacity * 8)
         
+        # The 4 byte hash of each cell's key, after the cells
+        size += 4 * cappacity
+        
         return size
         
     def generate_table_flags(self, resizable, is_set):
@@ -800,17 +1424,23 @@ class HeapManager:
     
     def new_table(self, cappacity, resizable, is_set, gc):
         """
-        Initializes a table of cappacity on the heap.
+        Initializes a table with room for cappacity entries on the heap. Resizable tables get enough cells to stay under the load factor.
+        """
+        cells = cappacity
+        if resizable:
+            cells = math.ceil(cappacity / self.table_load_factor)
+        return self.allocate_table(max(cells, 1), resizable, is_set, gc)
+    
+    def allocate_table(self, cappacity, resizable, is_set, gc):
+        """
+        Initializes a table of cappacity cells on the heap.
         """
         id = self.new_id()
         header, size = self.generate_table_header(id, cappacity, resizable, is_set, gc)
-        addr = self.dynamic_heap.allocate(id, size)
+        addr = self.allocate(id, size)
         self.dynamic_heap.write_bytes(addr, 12, header)
-        # Every byte must be null for probing to work
-        i = addr + 12
-        while i < size:
-            self.dynamic_heap.arr[i] = NULL
-            i += 1  
+        # Every cell must be null for probing to work
+        self.dynamic_heap.fill_bytes(addr + 12, size - 12, NULL)
         return self.val_as_heap_ref(id)
         
     def generate_array_header(self, id, cappacity, resizable, immutable, gc):
@@ -829,13 +1459,11 @@ class HeapManager:
     def read_priority_queue_header(self, priority_queue_val):
         id = int.from_bytes(priority_queue_val[4:], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
-        header = self.dynamic_heap.read_bytes(addr, 20)
-        gc = 0b0001 & header[1]
-        resizable = 0b0001 & header[3]
-        using_map = 0b0010 & header[3]
-        size = int.from_bytes(header[4:8], byteorder="little")
-        num_elements = int.from_bytes(header[8:12], byteorder="little")
-        table_val = header[12:20]
+        _, flags, queue_flags, size, num_elements = STRUCT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
+        gc = 0b0001 & flags
+        resizable = 0b0001 & queue_flags
+        using_map = 0b0010 & queue_flags
+        table_val = self.dynamic_heap.arr[addr+12:addr+20]
         return addr, table_val, size, num_elements, resizable, using_map, gc
     
     def generate_priority_queue_header(self, id, using_map, resizable, cappacity, gc):
@@ -855,137 +1483,212 @@ class HeapManager:
     def new_priority_queue(self, resizable, using_map, cappacity, gc):
         id = self.new_id()
         header, size = self.generate_priority_queue_header(id, using_map, resizable, cappacity, gc)
-        addr = self.dynamic_heap.allocate(id, size)
+        addr = self.allocate(id, size)
         self.dynamic_heap.write_bytes(addr, 20, header)
         return self.val_as_heap_ref(id)
     
-    def priority_queue_swap(self, addr1, key1, addr2, key2, table_val):
-        payload1 = self.dynamic_heap.unsafe_read_bytes(addr1, 16)
-        self.dynamic_heap.unsafe_write_bytes(addr1, 16, self.dynamic_heap.unsafe_read_bytes(addr2, 16))
-        self.dynamic_heap.unsafe_write_bytes(addr2, 16, payload1)
-        addr_val_1 = bytearray(8)
-        addr_val_1[0:4] = Values.ValueType.ADDR.value.to_bytes(4, byteorder="little")
-        addr_val_1[4:] = addr1.to_bytes(4, byteorder="little")
-        addr_val_2 = bytearray(8)
-        addr_val_2[0:4] = Values.ValueType.ADDR.value.to_bytes(4, byteorder="little")
-        addr_val_2[4:] = addr2.to_bytes(4, byteorder="little")
-        self.modify_table(table_val, key1, addr_val_1)
-        self.modify_table(table_val, key2, addr_val_2)
+    def priority_queue_position(self, index):
+        # The position table maps each key to the index of its entry, which stays the same when the queue moves
+        position = bytearray(8)
+        position[0] = Values.ValueType.ADDR.value
+        position[4:] = index.to_bytes(4, byteorder="little")
+        return position
+    
+    def priority_queue_index(self, table_val, key_val):
+        return U32.unpack_from(self.search_table(table_val, key_val), 4)[0]
+    
+    def priority_queue_priority(self, start_addr, index):
+        addr = start_addr + 16 * index
+        return self.dynamic_heap.arr[addr+8:addr+16]
+    
+    def priority_queue_swap(self, start_addr, index1, index2, table_val):
+        """
+        Swaps two entries of a queue, and where the position table has their keys.
+        """
+        arr = self.dynamic_heap.arr
+        addr1 = start_addr + 16 * index1
+        addr2 = start_addr + 16 * index2
+        entry1 = arr[addr1:addr1+16]
+        arr[addr1:addr1+16] = arr[addr2:addr2+16]
+        arr[addr2:addr2+16] = entry1
+        self.modify_table(table_val, arr[addr1:addr1+8], self.priority_queue_position(index1))
+        self.modify_table(table_val, entry1[0:8], self.priority_queue_position(index2))
     
     def extraxt_max_priority_queue_helper(self, queue_addr, table_val, num_elements):
         if num_elements == 0:
             raise Exception("Can't Extract Max from an Empty Queue!")
         
-        # Index of the first element
+        # Address of the first element
         start_addr = queue_addr+20
         
-        # Index of the last element
-        end_addr = queue_addr+20 + 16 * (num_elements-1)
-        
         # First key (max element)
-        max = self.dynamic_heap.unsafe_read_bytes(start_addr, 8)
+        max = self.dynamic_heap.arr[start_addr:start_addr+8]
         
-        # Decrement the elements
+        # Swap first and last, then drop the last
+        last = num_elements - 1
+        if last > 0:
+            self.priority_queue_swap(start_addr, 0, last, table_val)
         self.decrement_struct_entries(queue_addr, num_elements)
         
-        # Swap first and last
-        self.priority_queue_swap(end_addr, self.dynamic_heap.unsafe_read_bytes(end_addr, 8), start_addr, max, table_val)
-        
         # Sift the new first element down to its correct place
-        self.sift_down(start_addr, table_val, end_addr, start_addr) 
+        self.sift_down(start_addr, 0, last, table_val)
+        
+        # The key is no longer queued, so it can be inserted again
+        self.remove_from_table(table_val, max)
         
         # Return it
         return max
     
     def priority_queue_get_priority(self, queue_val, key_val):
         queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
-        
-        addr_val = self.search_table(table_val, key_val)
-        addr = int.from_bytes(addr_val[4:], byteorder="little")
-        
-        return self.dynamic_heap.unsafe_read_bytes(addr+8, 8)
+        return self.priority_queue_priority(queue_addr+20, self.priority_queue_index(table_val, key_val))
     
     def extract_max_priority_queue(self, queue_val):
         queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
         return self.extraxt_max_priority_queue_helper(queue_addr, table_val, num_elements)
     
-    def remove_key_priority_queue(self, queue_val, key_val):
+    def extract_max_batch_priority_queue(self, queue_val, count_val):
+        """
+        Extracts the count keys with the highest priorities into a new array, highest first.
+        """
+        if count_val[0] != Values.I32_TYPE:
+            raise Exception("Number of Keys to Extract Must be an Int!")
+        count = int.from_bytes(count_val[4:], byteorder="little", signed=True)
+        _, _, _, num_elements, _, _, _ = self.read_priority_queue_header(queue_val)
+        if count < 0 or count > num_elements:
+            raise Exception("Can't Extract More Keys than the Queue Has!")
+        
+        arr_val = self.new_array(count, True, False, True)
+        # Allocating can move the queue
+        queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
+        arr_addr = self.dynamic_heap.get_addr(U32.unpack_from(arr_val, 4)[0])
+        i = 0
+        while i < count:
+            key = self.extraxt_max_priority_queue_helper(queue_addr, table_val, num_elements - i)
+            # The array may already be marked, while the queue that had the key isn't
+            self.gc_write_barrier(key)
+            self.dynamic_heap.arr[arr_addr+12+i*8:arr_addr+20+i*8] = key
+            i += 1
+        self.dynamic_heap.write_u32(arr_addr+8, count)
+        return arr_val
+    
+    def remove_key_priority_queue(self, queue_val, key_val):
         queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
         if num_elements == 0:
             raise Exception("Priority Queue is Empty!")
         self.max_heap_increase_helper(queue_addr, table_val, key_val, Values.generate_max_val())
         return self.extraxt_max_priority_queue_helper(queue_addr, table_val, num_elements)
     
-    def addr_to_heap_index(self, addr, start_addr):
-        return (addr - start_addr) / 16
+    def sift_down(self, start_addr, index, num_elements, table_val):
+        while True:
+            largest = index
+            largest_priority = self.priority_queue_priority(start_addr, index)
             
-    def heap_index_to_addr(self, index, start_addr):
-        return int((index * 16) + start_addr)
-    
-    def get_parent_addr(self, start_addr, index_addr):
-        return int(self.heap_index_to_addr((self.addr_to_heap_index(index_addr, start_addr) - 1) // 2, start_addr))
-    
-    def left_child_priority_queue(self, index_addr, start_addr):
-        return int(self.heap_index_to_addr(self.addr_to_heap_index(index_addr, start_addr) * 2 + 1, start_addr))
-    
-    def right_child_priority_queue(self, index_addr, start_addr):
-        return int(self.heap_index_to_addr(self.addr_to_heap_index(index_addr, start_addr) * 2 + 2, start_addr))
-    
-    def sift_down(self, index_addr, table_val, end_addr, start_addr):
-        left_addr = self.left_child_priority_queue(index_addr, start_addr)
-        left_key = self.dynamic_heap.unsafe_read_bytes(left_addr, 8)
-        left_priority = self.dynamic_heap.unsafe_read_bytes(left_addr+8, 8)
-
-        right_addr = self.right_child_priority_queue(index_addr, start_addr)
-        right_key = self.dynamic_heap.unsafe_read_bytes(right_addr, 8)
-        right_priority = self.dynamic_heap.unsafe_read_bytes(right_addr+8, 8)
-
-        largest_addr = index_addr
-        largest_key = self.dynamic_heap.unsafe_read_bytes(index_addr, 8)
-        largest_priority = self.dynamic_heap.unsafe_read_bytes(index_addr+8, 8)
-        
-        if left_addr < end_addr and Values.greater_than(left_priority, largest_priority, self):
-            largest_addr = left_addr
-            largest_key = left_key
-            largest_priority = left_priority
-        if right_addr < end_addr and Values.greater_than(right_priority, largest_priority, self):
-            largest_addr = right_addr
-            largest_key = right_key
-            largest_priority = right_priority
-         
-        if largest_addr != index_addr:
-            index_key = self.dynamic_heap.unsafe_read_bytes(index_addr, 8)
-            self.priority_queue_swap(largest_addr, largest_key, index_addr, index_key, table_val)
-            self.sift_down(largest_addr, table_val, end_addr, start_addr)
-    
-    def sift_up(self, index_addr, start_addr, table_val):
-        parent_addr = self.get_parent_addr(start_addr, index_addr)
-        parent_key = self.dynamic_heap.unsafe_read_bytes(parent_addr, 8)
-        parent_priority = self.dynamic_heap.unsafe_read_bytes(parent_addr+8, 8)
-        
-        index_key = self.dynamic_heap.unsafe_read_bytes(index_addr, 8)
-        index_priority = self.dynamic_heap.unsafe_read_bytes(index_addr+8, 8)
-                
-        while index_addr > start_addr and Values.greater_than(index_priority, parent_priority, self):
-            # If the index is in range and the parent is bigger swap them
-            self.priority_queue_swap(parent_addr, parent_key, index_addr, index_key, table_val)
+            left = 2 * index + 1
+            right = left + 1
+            if left < num_elements:
+                left_priority = self.priority_queue_priority(start_addr, left)
+                if Values.greater_than(left_priority, largest_priority, self):
+                    largest = left
+                    largest_priority = left_priority
+            if right < num_elements and Values.greater_than(self.priority_queue_priority(start_addr, right), largest_priority, self):
+                largest = right
             
-            # Adjust parent and index, repeat
-            index_addr = parent_addr
-            index_key = index_key
-            index_priority = index_priority
-                        
-            parent_addr = self.get_parent_addr(start_addr, parent_addr)
-            parent_key = self.dynamic_heap.unsafe_read_bytes(parent_addr, 8)
-            parent_priority = self.dynamic_heap.unsafe_read_bytes(parent_addr+8, 8)
+            if largest == index:
+                return
+            self.priority_queue_swap(start_addr, index, largest, table_val)
+            index = largest
+    
+    def sift_up(self, start_addr, index, table_val):
+        priority = self.priority_queue_priority(start_addr, index)
+        # While the parent has a lower priority, swap them
+        while index > 0:
+            parent = (index - 1) // 2
+            if not Values.greater_than(priority, self.priority_queue_priority(start_addr, parent), self):
+                return
+            self.priority_queue_swap(start_addr, parent, index, table_val)
+            index = parent
+    
+    def heapify_entries(self, entries):
+        """
+        Orders a list of (key, priority) pairs into a max heap bottom up, sifting down every parent from the last one. That's O(n), where inserting them one at a time is O(n log n).
+        """
+        num_elements = len(entries)
+        i = num_elements // 2 - 1
+        while i >= 0:
+            index = i
+            while True:
+                largest = index
+                left = 2 * index + 1
+                right = left + 1
+                if left < num_elements and Values.greater_than(entries[left][1], entries[largest][1], self):
+                    largest = left
+                if right < num_elements and Values.greater_than(entries[right][1], entries[largest][1], self):
+                    largest = right
+                if largest == index:
+                    break
+                entries[index], entries[largest] = entries[largest], entries[index]
+                index = largest
+            i -= 1
+    
+    def build_priority_queue(self, queue_val, entries):
+        """
+        Fills an empty queue with a list of (key, priority) pairs: they're heapified, written in one pass, and each key is added to the position table once, with its final index.
+        """
+        entries = list(entries)
+        self.heapify_entries(entries)
+        queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
+        if num_elements != 0:
+            raise Exception("Can Only Build an Empty Priority Queue!")
+        while len(entries) > (size - 20) // 16:
+            if not resizable:
+                raise Exception("Priority Queue is Full!")
+            self.resize_priority_queue(queue_val)
+            queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
+        
+        index = 0
+        for key_val, priority_val in entries:
+            self.gc_write_barrier(key_val)
+            self.gc_write_barrier(priority_val)
+            self.add_table(table_val, key_val, self.priority_queue_position(index))
+            index += 1
+        _, _, total_entries, _, _, _ = self.read_table_header(table_val)
+        if total_entries != len(entries):
+            raise Exception("Priority Queue Keys Must be Unique!")
+        
+        # Adding to the table can move the queue
+        queue_addr = self.dynamic_heap.get_addr(U32.unpack_from(queue_val, 4)[0])
+        arr = self.dynamic_heap.arr
+        addr = queue_addr + 20
+        for key_val, priority_val in entries:
+            arr[addr:addr+8] = key_val
+            arr[addr+8:addr+16] = priority_val
+            addr += 16
+        self.dynamic_heap.write_u32(queue_addr+8, len(entries))
+    
+    def resize_priority_queue(self, queue_val):
+        """
+        Doubles the cappacity of a queue, returns its new address. Keys are found by the index of their entry, so the position table doesn't change when the queue moves.
+        """
+        queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(queue_val)
+        cappacity = (size - 20) // 16
+        new_size = 20 + max(2 * cappacity, 1) * 16
+        dynamic_heap = self.dynamic_heap
+        addr = dynamic_heap.reallocate(U32.unpack_from(queue_val, 4)[0], size, new_size)
+        dynamic_heap.write_u32(addr+4, new_size)
+        if dynamic_heap.cap - dynamic_heap.remaining > self.peak_heap_used:
+            self.peak_heap_used = dynamic_heap.cap - dynamic_heap.remaining
+        return addr
     
     def max_heap_increase_helper(self, queue_addr, table_val, key_val, priority_val):
-        # Extract the Address of the Key:Priority in the Queue
-        addr_val = self.search_table(table_val, key_val)
-        addr = int.from_bytes(addr_val[4:], byteorder="little")
+        start_addr = queue_addr + 20
+        
+        # Find the Key's Entry in the Queue
+        index = self.priority_queue_index(table_val, key_val)
+        addr = start_addr + 16 * index
         
         # Read in the Old Priority
-        old_priority_val = self.dynamic_heap.unsafe_read_bytes(addr+8, 8)
+        old_priority_val = self.dynamic_heap.arr[addr+8:addr+16]
                 
         if Values.less_than(priority_val, old_priority_val, self):
             raise Exception("New Priority is Less than Old Priority!")
@@ -994,7 +1697,7 @@ class HeapManager:
         self.dynamic_heap.unsafe_write_bytes(addr+8, 8, priority_val) 
                 
         # Sift Up
-        self.sift_up(addr, queue_addr+20, table_val)
+        self.sift_up(start_addr, index, table_val)
     
     def max_heap_increase(self, priority_queue_val, key_val, priority_val):
         # Read in table meta data
@@ -1006,52 +1709,233 @@ class HeapManager:
     def insert_priority_queue(self, priority_queue_val, key_val, priority_val):
         queue_addr, table_val, size, num_elements, resizable, using_map, gc = self.read_priority_queue_header(priority_queue_val)
         
-        cappacity = (size - 20) / 16
+        # A key is only queued once, max_heap_increase changes its priority
+        table_addr, _, _, table_cappacity, is_set, _ = self.read_table_header(table_val)
+        if self.find_table_cell(table_addr, table_cappacity, is_set, key_val) != None:
+            raise Exception("Key is Already in the Priority Queue!")
+        
+        cappacity = (size - 20) // 16
         if num_elements == cappacity:
             if resizable:
                 self.resize_priority_queue(priority_queue_val)
             else:
                 raise Exception("Priority Queue is Full!")
         
-        # Add the Key:Priority to the End
+        # Update the Table with the New Index
+        self.gc_write_barrier(key_val)
+        self.gc_write_barrier(priority_val)
+        self.add_table(table_val, key_val, self.priority_queue_position(num_elements))
+        
+        # Add the Key:Priority to the End, resizing the queue or its table can move it
+        queue_addr = self.dynamic_heap.get_addr(U32.unpack_from(priority_queue_val, 4)[0])
         end_addr = queue_addr + 20 + (num_elements * 16)
         self.dynamic_heap.unsafe_write_bytes(end_addr, 8, key_val)
         self.dynamic_heap.unsafe_write_bytes(end_addr+8, 8, priority_val)
-
-        # Update the Table with the New Address
-        new_addr = bytearray(8)
-        new_addr[0] = Values.ValueType.ADDR.value
-        new_addr[4:] = end_addr.to_bytes(4, byteorder="little")
-        self.add_table(table_val, key_val, new_addr)              
         self.increment_struct_entries(queue_addr, num_elements)
                             
-        # Increase the Priority
-        # It uses its own priority, but its out of place, so it will be shifted up
-        self.max_heap_increase_helper(queue_addr, table_val, key_val, priority_val)
+        # It's out of place, so it will be shifted up
+        self.sift_up(queue_addr+20, num_elements, table_val)
 
         # Return something
         return key_val
     
-    def generate_deque_header(self, id, resizable, cappacity):
-        size = 12 + cappacity * 8
-        header = bytearray(12)
+    def generate_deque_header(self, id, resizable, cappacity, gc):
+        # Deques are ring buffers, the header is followed by the head index (4 bytes), the index of the front element
+        size = 16 + cappacity * 8
+        header = bytearray(16)
         header[0] = HeapType.DEQUE.value
         header[1] = self.generate_flag_byte(gc)
         if resizable:
             header[3] |= 0b0001
         header[4:8] = size.to_bytes(4, byteorder="little") 
         header[8:12] = (0).to_bytes(4, byteorder="little") 
+        header[12:16] = (0).to_bytes(4, byteorder="little") 
         return header, size
     
     def read_deque_header(self, deque_val):
         id = int.from_bytes(deque_val[4:], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
-        header = self.dynamic_heap.read_bytes(addr, 12)
-        gc = 0b0001 & header[1]
-        resizable = 0b0001 & header[3]
-        size = int.from_bytes(header[4:8], byteorder="little")
-        num_elements = int.from_bytes(header[8:], byteorder="little")
-        return addr, size, num_elements, resizable, gc
+        _, flags, deque_flags, size, num_elements = STRUCT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
+        head = U32.unpack_from(self.dynamic_heap.arr, addr+12)[0]
+        gc = 0b0001 & flags
+        resizable = 0b0001 & deque_flags
+        return addr, size, num_elements, head, resizable, gc
+    
+    def resize_deque(self, deque_val):
+        """
+        Doubles the cappacity of a deque, returns its new address. The elements that wrapped around to the start of the ring are moved after the old end, so they follow the others again.
+        """
+        addr, size, num_elements, head, resizable, gc = self.read_deque_header(deque_val)
+        cappacity = (size - 16) // 8
+        new_size = 16 + 2 * cappacity * 8
+        dynamic_heap = self.dynamic_heap
+        addr = dynamic_heap.reallocate(U32.unpack_from(deque_val, 4)[0], size, new_size)
+        dynamic_heap.write_u32(addr+4, new_size)
+        
+        wrapped = head + num_elements - cappacity
+        if wrapped > 0:
+            start = addr + 16
+            dynamic_heap.arr[start+cappacity*8:start+(cappacity+wrapped)*8] = dynamic_heap.arr[start:start+wrapped*8]
+        
+        if dynamic_heap.cap - dynamic_heap.remaining > self.peak_heap_used:
+            self.peak_heap_used = dynamic_heap.cap - dynamic_heap.remaining
+        return addr
+    
+    def reserve_deque_slot(self, deque_val):
+        """
+        Returns the address, cappacity, element count and head of a deque with room for one more element, growing it when it's full.
+        """
+        addr, size, num_elements, head, resizable, gc = self.read_deque_header(deque_val)
+        cappacity = (size - 16) // 8
+        if num_elements == cappacity:
+            if not resizable:
+                raise Exception("Deque is Full!")
+            addr = self.resize_deque(deque_val)
+            cappacity *= 2
+        return addr, cappacity, num_elements, head
+    
+    def deque_push_back(self, deque_val, val):
+        addr, cappacity, num_elements, head = self.reserve_deque_slot(deque_val)
+        index_addr = addr + 16 + ((head + num_elements) % cappacity) * 8
+        self.gc_write_barrier(val)
+        self.dynamic_heap.unsafe_write_bytes(index_addr, 8, val)
+        self.increment_struct_entries(addr, num_elements)
+    
+    def deque_push_front(self, deque_val, val):
+        addr, cappacity, num_elements, head = self.reserve_deque_slot(deque_val)
+        head = (head - 1) % cappacity
+        self.gc_write_barrier(val)
+        self.dynamic_heap.unsafe_write_bytes(addr + 16 + head * 8, 8, val)
+        self.dynamic_heap.write_u32(addr+12, head)
+        self.increment_struct_entries(addr, num_elements)
+    
+    def deque_pop_back(self, deque_val):
+        addr, size, num_elements, head, resizable, gc = self.read_deque_header(deque_val)
+        if num_elements == 0:
+            raise Exception("Attempting to Pop an Empty Deque!")
+        index_addr = addr + 16 + ((head + num_elements - 1) % ((size - 16) // 8)) * 8
+        self.decrement_struct_entries(addr, num_elements)
+        return self.dynamic_heap.unsafe_read_bytes(index_addr, 8)
+    
+    def deque_pop_front(self, deque_val):
+        addr, size, num_elements, head, resizable, gc = self.read_deque_header(deque_val)
+        if num_elements == 0:
+            raise Exception("Attempting to Pop an Empty Deque!")
+        val = self.dynamic_heap.unsafe_read_bytes(addr + 16 + head * 8, 8)
+        self.dynamic_heap.write_u32(addr+12, (head + 1) % ((size - 16) // 8))
+        self.decrement_struct_entries(addr, num_elements)
+        return val
+    
+    def deque_index_addr(self, deque_val, index_val):
+        addr, size, num_elements, head, resizable, gc = self.read_deque_header(deque_val)
+        index = int.from_bytes(index_val[4:], byteorder="little")
+        if index >= num_elements:
+            raise Exception("Attempting to Access Out of Bounds Deque Index")
+        return addr + 16 + ((head + index) % ((size - 16) // 8)) * 8
+    
+    def deque_get_index(self, deque_val, index_val):
+        return self.dynamic_heap.unsafe_read_bytes(self.deque_index_addr(deque_val, index_val), 8)
+    
+    def deque_modify_index(self, deque_val, index_val, val):
+        self.dynamic_heap.unsafe_write_bytes(self.deque_index_addr(deque_val, index_val), 8, val)
+        
+    def generate_struct_header(self, id, num_fields, immutable, gc):
+        # Structs have a fixed set of fields: the header is followed by a value per field, then the field keys in the same order
+        size = 12 + num_fields * 16
+        header = bytearray(12)
+        header[0] = HeapType.STRUCT.value
+        header[1] = self.generate_flag_byte(gc)
+        if immutable:
+            header[3] |= 0b0010
+        header[4:8] = size.to_bytes(4, byteorder="little") 
+        header[8:12] = num_fields.to_bytes(4, byteorder="little") 
+        return header, size
+    
+    def read_struct_header(self, struct_val):
+        id = int.from_bytes(struct_val[4:], byteorder="little")
+        addr = self.dynamic_heap.get_addr(id)
+        _, flags, struct_flags, size, num_fields = STRUCT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
+        gc = 0b0001 & flags
+        immutable = 0b0010 & struct_flags
+        return addr, size, num_fields, immutable, gc
+    
+    def new_struct(self, fields, immutable, gc):
+        """
+        Creates a new struct, or a record when it's immutable, from a list of key, value pairs. Field i is the i-th pair, that's the offset the compiler resolves field accesses to.
+        """
+        id = self.new_id()
+        num_fields = len(fields)
+        header, size = self.generate_struct_header(id, num_fields, immutable, gc)
+        addr = self.allocate(id, size)
+        dynamic_heap = self.dynamic_heap
+        dynamic_heap.write_bytes(addr, 12, header)
+        struct_val = self.val_as_heap_ref(id)
+        
+        i = 0
+        while i < num_fields:
+            key, val = fields[i]
+            if self.struct_field_index(struct_val, key, i) != None:
+                raise Exception("Duplicate Struct Field!")
+            # a struct made while marking is born marked, so what it refers to has to be shaded
+            self.gc_write_barrier(key)
+            self.gc_write_barrier(val)
+            dynamic_heap.unsafe_write_bytes(addr + 12 + (num_fields + i) * 8, 8, key)
+            dynamic_heap.unsafe_write_bytes(addr + 12 + i * 8, 8, val)
+            i += 1
+        return struct_val
+    
+    def struct_field_index(self, struct_val, key_val, num_keys=None):
+        """
+        Returns the index of the field with a key, or None. Only the first num_keys keys are searched, all of them by default.
+        """
+        addr, size, num_fields, immutable, gc = self.read_struct_header(struct_val)
+        if num_keys == None:
+            num_keys = num_fields
+        key_addr = addr + 12 + num_fields * 8
+        i = 0
+        while i < num_keys:
+            if Values.compare_values(self.dynamic_heap.unsafe_read_bytes(key_addr, 8), key_val, self):
+                return i
+            key_addr += 8
+            i += 1
+        return None
+    
+    def struct_addr(self, struct_val, index):
+        """
+        Returns the address of a struct, checking it has a field at index. The compiler resolves a field's key to its index, so the field is read without searching the keys.
+        """
+        if struct_val[0] != Values.HEAP_OBJ_TYPE:
+            raise Exception("Attempting to Access a Field of an Invalid Structure!")
+        dynamic_heap = self.dynamic_heap
+        addr = dynamic_heap.get_addr(U32.unpack_from(struct_val, 4)[0])
+        if dynamic_heap.arr[addr] != STRUCT:
+            raise Exception("Attempting to Access a Field of an Invalid Structure!")
+        if index >= U32.unpack_from(dynamic_heap.arr, addr+8)[0]:
+            raise Exception("Attempting to Access Invalid Struct Field!")
+        return addr
+    
+    def get_field(self, struct_val, index):
+        addr = self.struct_addr(struct_val, index)
+        return self.dynamic_heap.unsafe_read_bytes(addr + 12 + index * 8, 8)
+    
+    def set_field(self, struct_val, index, val):
+        addr = self.struct_addr(struct_val, index)
+        if self.dynamic_heap.arr[addr+3] & 0b0010:
+            raise Exception("Attempting to Modify an Immutable Record!")
+        self.gc_write_barrier(val)
+        self.dynamic_heap.unsafe_write_bytes(addr + 12 + index * 8, 8, val)
+    
+    def struct_get_key(self, struct_val, key_val):
+        index = self.struct_field_index(struct_val, key_val)
+        if index == None:
+            raise Exception("Attempting to Access Invalid Struct Field!")
+        return self.get_field(struct_val, index)
+    
+    def struct_modify_key(self, struct_val, key_val, val):
+        index = self.struct_field_index(struct_val, key_val)
+        if index == None:
+            raise Exception("Attempting to Modify Invalid Struct Field!")
+        self.set_field(struct_val, index, val)
         
     def load_function(self, addr, body_size, up_value_count, op_codes, op_addr):
         func_op_addr = addr + 28
@@ -1080,16 +1964,18 @@ class HeapManager:
         header[1] = self.generate_flag_byte(gc)
         header[4:8] = (16).to_bytes(4, byteorder="little") 
         header[8:16] = value
-        addr = self.dynamic_heap.allocate(id, 16)
+        addr = self.allocate(id, 16)
         self.dynamic_heap.write_bytes(addr, 16, header)
         return self.val_as_heap_ref(id)
     
     def read_dynamic_up_value(self, id_val):
         id = int.from_bytes(id_val[4:8], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
-        return self.dynamic_heap.unsafe_read_bytes(addr+8, 8)
+        return self.dynamic_heap.arr[addr+8:addr+16]
     
     def write_dynamic_up_value(self, id_val, val):
+        # set_up_value writes closed up values through here
+        self.gc_write_barrier(val)
         id = int.from_bytes(id_val[4:8], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
         return self.dynamic_heap.unsafe_write_bytes(addr+8, 8, val) 
@@ -1100,6 +1986,10 @@ class HeapManager:
     def is_closed(self, up_val_addr):
         return Values.value_to_python_repr(self.dynamic_heap.unsafe_read_bytes(up_val_addr+16, 8))
     
+    def up_value_addr(self, closure_val, index):
+        id = int.from_bytes(closure_val[4:], byteorder="little")
+        return self.dynamic_heap.get_addr(id) + 28 + (index * 24)
+    
     def close_up_value(self, up_val_addr, closed_ref):
         self.dynamic_heap.unsafe_write_bytes(up_val_addr, 8, closed_ref)
         self.dynamic_heap.unsafe_write_bytes(up_val_addr+16, 8, TRUE)
@@ -1113,12 +2003,12 @@ class HeapManager:
     def read_closure_header(self, closure_val):
         id = int.from_bytes(closure_val[4:], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
-        header = self.dynamic_heap.read_bytes(addr, 28)
-        gc = bool(0b0001 & header[1])
-        size = int.from_bytes(header[4:8], byteorder="little")
-        id_val = header[8:16]
-        func_val = header[16:24]
-        up_value_count = int.from_bytes(header[24:28], byteorder="little")
+        arr = self.dynamic_heap.arr
+        _, flags, size = HEAP_OBJECT_HEADER.unpack_from(arr, addr)
+        gc = bool(0b0001 & flags)
+        id_val = arr[addr+8:addr+16]
+        func_val = arr[addr+16:addr+24]
+        up_value_count = U32.unpack_from(arr, addr+24)[0]
         return addr, size, id_val, func_val, up_value_count, gc    
     
     def generate_closure_header(self, id_val, func_val, up_value_count, gc):
@@ -1135,7 +2025,7 @@ class HeapManager:
     def new_closure(self, id_val, func_val, up_value_count, gc):
         id = self.new_id()
         header, size = self.generate_closure_header(id_val, func_val, up_value_count, gc)
-        addr = self.dynamic_heap.allocate(id, size)
+        addr = self.allocate(id, size)
         self.dynamic_heap.write_bytes(addr, 28, header)
         return self.val_as_heap_ref(id)
     
@@ -1169,6 +2059,21 @@ class HeapManager:
             stack[stack_addr:stack_addr+8] = val
             
     
+    def up_value_location(self, closure_val, index):
+        """
+        Finds where a closure's up value lives. Returns whether it is closed, and either the reference to its dynamic up value (closed) or its stack address (open).
+        """
+        addr, size, id_val, func_val, up_value_count, gc = self.read_closure_header(closure_val)
+
+        up_val_addr = addr + 28 + (index * 24)
+        
+        payload = self.dynamic_heap.unsafe_read_bytes(up_val_addr, 24)
+        
+        if Values.value_to_python_repr(payload[16:24]):
+            return True, payload[0:8]
+        else:
+            return False, Values.value_to_python_repr(payload[0:8])
+    
     def get_up_value(self, closure_val, index, stack):
         addr, size, id_val, func_val, up_value_count, gc = self.read_closure_header(closure_val)
 
@@ -1186,13 +2091,16 @@ class HeapManager:
             stack_addr = Values.value_to_python_repr(payload[0:8])
             return stack[stack_addr:stack_addr+8]
         
-    def new_deque(self, cappacity, gc):
+    def new_deque(self, cappacity, resizable, gc):
         """
-        Creates a new Array on the Heap
+        Creates a new Deque on the Heap
         """
         id = self.new_id()
-        header, size = self.generate_deque_header(id, cappacity, resizable, gc)
-        addr = self.dynamic_heap.allocate(id, size)
+        # A ring needs at least one cell to grow from
+        header, size = self.generate_deque_header(id, resizable, max(cappacity, 1), gc)
+        addr = self.allocate(id, size)
+        self.dynamic_heap.write_bytes(addr, 16, header)
+        return self.val_as_heap_ref(id)
 
     def new_array(self, cappacity, resizable, immutable, gc):
         """
@@ -1200,38 +2108,94 @@ class HeapManager:
         """
         id = self.new_id()
         header, size = self.generate_array_header(id, cappacity, resizable, immutable, gc)
-        addr = self.dynamic_heap.allocate(id, size)
+        addr = self.allocate(id, size)
         self.dynamic_heap.write_bytes(addr, 12, header)
         return self.val_as_heap_ref(id)
     
+    def freeze_array(self, arr_val):
+        """
+        Makes an array immutable, once it's been filled in
+        """
+        addr = self.dynamic_heap.get_addr(U32.unpack_from(arr_val, 4)[0])
+        self.dynamic_heap.arr[addr+3] |= 0b0010
+
     def read_arr_header(self, arr_val):
         id = int.from_bytes(arr_val[4:], byteorder="little")
         addr = self.dynamic_heap.get_addr(id)
-        header = self.dynamic_heap.read_bytes(addr, 12)
-        gc = 0b0001 & header[1]
-        resizable = 0b0001 & header[3]
-        immutable = 0b0010 & header[3]
-        size = int.from_bytes(header[4:8], byteorder="little")
-        num_elements = int.from_bytes(header[8:], byteorder="little")
+        _, flags, arr_flags, size, num_elements = STRUCT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
+        gc = 0b0001 & flags
+        resizable = 0b0001 & arr_flags
+        immutable = 0b0010 & arr_flags
         return addr, size, num_elements, resizable, immutable, gc
     
     def increment_struct_entries(self, addr, num_entries):
-        self.dynamic_heap.unsafe_write_bytes(addr+8, 4, (num_entries+1).to_bytes(4, byteorder="little"))
+        self.dynamic_heap.write_u32(addr+8, num_entries+1)
     
     def decrement_struct_entries(self, addr, num_entries):
-        self.dynamic_heap.unsafe_write_bytes(addr+8, 4, (num_entries-1).to_bytes(4, byteorder="little"))
+        self.dynamic_heap.write_u32(addr+8, num_entries-1)
     
+    def writable_arr_header(self, arr_val):
+        """
+        read_arr_header for an array that's about to be written to. Immutable arrays (tuples) can't be, an array that shares its block gets a copy of its own first.
+        """
+        header = self.read_arr_header(arr_val)
+        if header[4]:
+            raise Exception("Attempting to Modify an Immutable Array!")
+        if self.dynamic_heap.arr[header[0]+1] & SHARED_FLAG:
+            self.materialize(arr_val)
+            header = self.read_arr_header(arr_val)
+        return header
+    
+    def share_array(self, arr_val):
+        """
+        Returns a copy of an array that shares its block, nothing is copied until one of them is written to (see materialize). While the block's shared its header has SHARED_FLAG, and the collector tracks which of the ids sharing it were reached.
+        """
+        dynamic_heap = self.dynamic_heap
+        id = U32.unpack_from(arr_val, 4)[0]
+        alias = dynamic_heap.share(id)
+        addr = dynamic_heap.get_addr(id)
+        flags = dynamic_heap.arr[addr+1]
+        dynamic_heap.arr[addr+1] = flags | SHARED_FLAG
+        if self.gc_phase == GC_MARK and flags & MARK_FLAG:
+            # the block was reached before it was shared
+            self.gc_shared_marks.update((id, alias))
+        elif self.gc_phase == GC_SWEEP and flags & MARK_FLAG:
+            # the alias isn't swept this cycle, only the id still waiting to be is tracked
+            self.gc_shared_marks.add(id)
+        return self.val_as_heap_ref(alias)
+    
+    def materialize(self, arr_val):
+        """
+        Gives an array that shares its block a private copy of it, called before it's written to. Does nothing if the block isn't shared.
+        """
+        dynamic_heap = self.dynamic_heap
+        id = U32.unpack_from(arr_val, 4)[0]
+        addr = dynamic_heap.get_addr(id)
+        if not dynamic_heap.arr[addr+1] & SHARED_FLAG:
+            return
+        _, _, size = HEAP_OBJECT_HEADER.unpack_from(dynamic_heap.arr, addr)
+        data = dynamic_heap.arr[addr:addr+size]
+        if dynamic_heap.unshare(id):
+            dynamic_heap.arr[addr+1] &= ~SHARED_FLAG
+        # the block's mark bit was shared too, the copy is marked if the id was reached
+        data[1] &= ~(SHARED_FLAG | MARK_FLAG)
+        if self.gc_phase == GC_MARK or id in self.gc_shared_marks:
+            data[1] |= MARK_FLAG
+        new_addr = self.allocate(id, size)
+        dynamic_heap.view[new_addr:new_addr+size] = data
+
     def arr_push_back(self, arr_val, val):
-        addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(arr_val)
-        cappacity = (size - 12) / 8
+        addr, size, num_elements, resizable, immutable, gc = self.writable_arr_header(arr_val)
+        cappacity = (size - 12) // 8
         if num_elements == cappacity:
             addr = self.resize_arr(arr_val, size, 2)
         index_addr = addr + 12 + num_elements * 8
+        self.gc_write_barrier(val)
         self.dynamic_heap.unsafe_write_bytes(index_addr, 8, val)          
         self.increment_struct_entries(addr, num_elements)   
         
     def arr_pop_back(self, arr_val):
-        addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(arr_val)
+        addr, size, num_elements, resizable, immutable, gc = self.writable_arr_header(arr_val)
         if num_elements == 0:
             raise Exception("Attempting to Pop an Empty Array!")
         index_addr = addr + 12 + (num_elements-1) * 8
@@ -1239,7 +2203,7 @@ class HeapManager:
         return self.dynamic_heap.unsafe_read_bytes(index_addr, 8)
         
     def arr_modify_index(self, arr_val, index_val, val):
-        addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(arr_val)
+        addr, size, num_elements, resizable, immutable, gc = self.writable_arr_header(arr_val)
         index = int.from_bytes(index_val[4:], byteorder="little")
         if index >= num_elements:
             raise Exception("Attempting to Modify Out of Bounds Array Index")
@@ -1256,68 +2220,461 @@ class HeapManager:
         
     def resize_arr(self, arr_val, size, growth_factor):
         id = int.from_bytes(arr_val[4:], byteorder="little")
-        return self.dynamic_heap.reallocate(id, size, size*growth_factor) 
+        dynamic_heap = self.dynamic_heap
+        # Grow the cappacity, not the header, and record the new size so the array knows it has room
+        new_size = 12 + max((size - 12) // 8 * growth_factor, 1) * 8
+        addr = dynamic_heap.reallocate(id, size, new_size)
+        dynamic_heap.write_u32(addr+4, new_size)
+        if dynamic_heap.cap - dynamic_heap.remaining > self.peak_heap_used:
+            self.peak_heap_used = dynamic_heap.cap - dynamic_heap.remaining
+        return addr
     
+    def generate_packed_array_header(self, id, cappacity, el_type, resizable, gc):
+        size = 12 + cappacity * 4
+        header = bytearray(12)
+        header[0] = HeapType.PACKED_ARRAY.value
+        header[1] = self.generate_flag_byte(gc)
+        if resizable:
+            header[3] |= 0b0001
+        if el_type == Values.F32_TYPE:
+            header[3] |= PACKED_F32_FLAG
+        header[4:8] = size.to_bytes(4, byteorder="little")
+        header[8:12] = (0).to_bytes(4, byteorder="little")
+        return header, size
+
+    def read_packed_array_header(self, arr_val):
+        id = int.from_bytes(arr_val[4:], byteorder="little")
+        addr = self.dynamic_heap.get_addr(id)
+        _, flags, arr_flags, size, num_elements = STRUCT_HEADER.unpack_from(self.dynamic_heap.arr, addr)
+        gc = 0b0001 & flags
+        resizable = 0b0001 & arr_flags
+        el_type = Values.F32_TYPE if arr_flags & PACKED_F32_FLAG else Values.I32_TYPE
+        return addr, size, num_elements, el_type, resizable, gc
+
+    def new_packed_array(self, cappacity, el_type, resizable, gc):
+        """
+        Creates a new packed array on the heap. Its elements are stored as the raw 4 byte ints or floats of el_type (I32 or F32) values, not as 8 byte values.
+        """
+        if not el_type in PACKED_FORMATS:
+            raise Exception("Packed Arrays Can Only Hold I32s or F32s!")
+        id = self.new_id()
+        header, size = self.generate_packed_array_header(id, cappacity, el_type, resizable, gc)
+        addr = self.allocate(id, size)
+        self.dynamic_heap.write_bytes(addr, 12, header)
+        return self.val_as_heap_ref(id)
+
+    def packed_view(self, arr_val):
+        """
+        Returns a memoryview of a packed array's elements, as C ints or floats. The view shares the heap's memory, nothing is copied, so it can be handed to anything that reads buffers (like numpy.frombuffer).
+        The heap can't grow while a view exists: release it (use it in a with statement) before anything else is allocated.
+        """
+        addr, size, num_elements, el_type, resizable, gc = self.read_packed_array_header(arr_val)
+        return self.dynamic_heap.view[addr+12:addr+12+num_elements*4].cast(PACKED_FORMATS[el_type])
+
+    def packed_element_addr(self, arr_val, index_val):
+        addr, size, num_elements, el_type, resizable, gc = self.read_packed_array_header(arr_val)
+        index = int.from_bytes(index_val[4:], byteorder="little")
+        if index >= num_elements:
+            raise Exception("Attempting to Access Out of Bounds Array Index")
+        return addr + 12 + index * 4, el_type
+
+    def packed_get_index(self, arr_val, index_val):
+        el_addr, el_type = self.packed_element_addr(arr_val, index_val)
+        val = bytearray(8)
+        val[0] = el_type
+        val[4:8] = self.dynamic_heap.arr[el_addr:el_addr+4]
+        return val
+
+    def packed_modify_index(self, arr_val, index_val, val):
+        self.materialize(arr_val)
+        el_addr, el_type = self.packed_element_addr(arr_val, index_val)
+        if val[0] != el_type:
+            raise Exception("Attempting to Store a Value of the Wrong Type in a Packed Array!")
+        self.dynamic_heap.unsafe_write_bytes(el_addr, 4, val[4:8])
+
+    def packed_push_back(self, arr_val, val):
+        self.materialize(arr_val)
+        addr, size, num_elements, el_type, resizable, gc = self.read_packed_array_header(arr_val)
+        if val[0] != el_type:
+            raise Exception("Attempting to Store a Value of the Wrong Type in a Packed Array!")
+        if num_elements == (size - 12) // 4:
+            addr = self.resize_packed_array(arr_val, size, 2)
+        self.dynamic_heap.unsafe_write_bytes(addr + 12 + num_elements * 4, 4, val[4:8])
+        self.increment_struct_entries(addr, num_elements)
+
+    def packed_pop_back(self, arr_val):
+        self.materialize(arr_val)
+        addr, size, num_elements, el_type, resizable, gc = self.read_packed_array_header(arr_val)
+        if num_elements == 0:
+            raise Exception("Attempting to Pop an Empty Array!")
+        val = self.packed_get_index(arr_val, Values.python_repr_to_value(num_elements-1))
+        self.decrement_struct_entries(addr, num_elements)
+        return val
+
+    def resize_packed_array(self, arr_val, size, growth_factor):
+        id = int.from_bytes(arr_val[4:], byteorder="little")
+        dynamic_heap = self.dynamic_heap
+        new_size = 12 + max((size - 12) // 4 * growth_factor, 1) * 4
+        addr = dynamic_heap.reallocate(id, size, new_size)
+        dynamic_heap.write_u32(addr+4, new_size)
+        if dynamic_heap.cap - dynamic_heap.remaining > self.peak_heap_used:
+            self.peak_heap_used = dynamic_heap.cap - dynamic_heap.remaining
+        return addr
+
+    def array_numbers(self, arr_val):
+        """
+        The elements of an array of values as python numbers, for the builtins that work on numbers
+        """
+        addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(arr_val)
+        numbers = []
+        index = addr + 12
+        end = index + num_elements * 8
+        while index < end:
+            if not self.dynamic_heap.arr[index] in PACKED_FORMATS:
+                raise Exception("Expected an Array of Numbers!")
+            numbers.append(Values.value_to_python_repr(self.dynamic_heap.arr[index:index+8]))
+            index += 8
+        return numbers
+
+    def array_type(self, arr_val):
+        if arr_val[0] != Values.ValueType.HEAP_OBJ.value:
+            raise Exception("Expected an Array!")
+        _, type, _, _ = self.read_heap_object_header(arr_val)
+        if type != ARRAY and type != PACKED_ARRAY:
+            raise Exception("Expected an Array!")
+        return type
+
+    def array_sum(self, arr_val):
+        """
+        Builtin sum(arr), the sum of an array of numbers. A packed array is summed in one pass over its memory.
+        """
+        if self.array_type(arr_val) == PACKED_ARRAY:
+            with self.packed_view(arr_val) as view:
+                total = sum(view)
+                is_f32 = view.format == "f"
+            if is_f32:
+                return Values.f32_to_value(float(total))
+            return Values.i32_to_value(total)
+        return Values.python_repr_to_value(sum(self.array_numbers(arr_val)))
+
+    def array_extreme(self, arr_val, pick):
+        # pick is the builtin min or max
+        if self.array_type(arr_val) == PACKED_ARRAY:
+            with self.packed_view(arr_val) as view:
+                if len(view) == 0:
+                    raise Exception("Attempting to Find the Minimum or Maximum of an Empty Array!")
+                res = pick(view)
+            return Values.python_repr_to_value(res)
+        numbers = self.array_numbers(arr_val)
+        if len(numbers) == 0:
+            raise Exception("Attempting to Find the Minimum or Maximum of an Empty Array!")
+        return Values.python_repr_to_value(pick(numbers))
+
+    def array_min(self, arr_val):
+        return self.array_extreme(arr_val, min)
+
+    def array_max(self, arr_val):
+        return self.array_extreme(arr_val, max)
+
+    def read_any_array_header(self, arr_val):
+        """
+        Reads the header of an array of values or of a packed array, returns its address, size, number of elements, element size, element type (None for values, I32 or F32 for packed arrays), resizable and immutable flags
+        """
+        if self.array_type(arr_val) == PACKED_ARRAY:
+            addr, size, num_elements, el_type, resizable, gc = self.read_packed_array_header(arr_val)
+            return addr, size, num_elements, 4, el_type, resizable, 0
+        addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(arr_val)
+        return addr, size, num_elements, 8, None, resizable, immutable
+
+    def reserve_array(self, arr_val, cappacity):
+        """
+        Makes room for at least cappacity elements in one reallocation, returns the array's (possibly new) address. It at least doubles, so extending an array over and over is amortized linear.
+        """
+        addr, size, num_elements, el_size, el_type, resizable, immutable = self.read_any_array_header(arr_val)
+        if 12 + cappacity * el_size <= size:
+            return addr
+        id = int.from_bytes(arr_val[4:], byteorder="little")
+        dynamic_heap = self.dynamic_heap
+        new_size = max(12 + cappacity * el_size, 12 + (size - 12) * 2)
+        addr = dynamic_heap.reallocate(id, size, new_size)
+        dynamic_heap.write_u32(addr+4, new_size)
+        if dynamic_heap.cap - dynamic_heap.remaining > self.peak_heap_used:
+            self.peak_heap_used = dynamic_heap.cap - dynamic_heap.remaining
+        return addr
+
+    def array_element_bytes(self, arr_val, el_type, start=0, end=None):
+        """
+        Returns a copy of the bytes of elements [start, end) of an array, laid out like the elements of an array with element type el_type (see read_any_array_header). Packed elements are boxed into values, and values unboxed into packed elements, with strided slices rather than element by element.
+        """
+        addr, size, num_elements, el_size, src_type, resizable, immutable = self.read_any_array_header(arr_val)
+        end = num_elements if end == None else end
+        data = self.dynamic_heap.arr[addr+12+start*el_size:addr+12+end*el_size]
+        if src_type == el_type:
+            return data
+        elif el_type == None:
+            values = bytearray(2 * len(data))
+            values[0::8] = bytes((src_type,)) * (end - start)
+            i = 0
+            while i < 4:
+                values[4+i::8] = data[i::4]
+                i += 1
+            return values
+        elif src_type == None and data[0::8].count(el_type) == end - start:
+            payloads = bytearray(len(data) // 2)
+            i = 0
+            while i < 4:
+                payloads[i::4] = data[4+i::8]
+                i += 1
+            return payloads
+        raise Exception("Attempting to Store a Value of the Wrong Type in a Packed Array!")
+
+    def write_array_elements(self, arr_val, index, data):
+        """
+        Writes data, elements laid out like the array's, at an element index then sets the array's element count to the end of them. Assumes the array has room.
+        """
+        addr, size, num_elements, el_size, el_type, resizable, immutable = self.read_any_array_header(arr_val)
+        start = addr + 12 + index * el_size
+        self.dynamic_heap.view[start:start+len(data)] = data
+        self.dynamic_heap.write_u32(addr+8, index + len(data) // el_size)
+        if el_type == None and self.gc_phase == GC_MARK:
+            # the write barrier, for every value copied in at once
+            self.gc_mark_values(start, start + len(data))
+
+    def check_mutable_array(self, arr_val):
+        addr, size, num_elements, el_size, el_type, resizable, immutable = self.read_any_array_header(arr_val)
+        if immutable:
+            raise Exception("Attempting to Modify an Immutable Array!")
+        self.materialize(arr_val)
+        return num_elements, el_size, el_type
+
+    def array_extend(self, arr_val, src_val):
+        """
+        extend(arr, src), appends the elements of the array src to arr and returns arr. The room is reserved and the elements are copied in one step, rather than pushed one at a time.
+        """
+        num_elements, el_size, el_type = self.check_mutable_array(arr_val)
+        # copied out first, src can be arr and reserving can move it
+        data = self.array_element_bytes(src_val, el_type)
+        self.reserve_array(arr_val, num_elements + len(data) // el_size)
+        self.write_array_elements(arr_val, num_elements, data)
+        return arr_val
+
+    def array_slice(self, arr_val, start_val, end_val):
+        """
+        slice(arr, start, end), returns a new array of the same kind holding elements [start, end) of arr
+        """
+        addr, size, num_elements, el_size, el_type, resizable, immutable = self.read_any_array_header(arr_val)
+        if start_val[0] != Values.I32_TYPE or end_val[0] != Values.I32_TYPE:
+            raise Exception("Slice Bounds Must be Ints!")
+        start = Values.value_to_python_repr(start_val)
+        end = Values.value_to_python_repr(end_val)
+        if not (0 <= start <= end <= num_elements):
+            raise Exception("Attempting to Slice Out of Bounds!")
+        if immutable and end - start == num_elements:
+            return arr_val
+        return self.copy_array_range(arr_val, start, end)
+
+    def array_copy(self, arr_val):
+        """
+        copy(arr), returns a new array of the same kind with the same elements. Nothing is copied: a tuple or a string can't change, so its copy is itself, and a copy of an array shares its block until one of them is written to.
+        """
+        if self.is_string(arr_val):
+            return arr_val
+        addr, size, num_elements, el_size, el_type, resizable, immutable = self.read_any_array_header(arr_val)
+        if immutable:
+            return arr_val
+        return self.share_array(arr_val)
+
+    def copy_array_range(self, arr_val, start, end):
+        addr, size, num_elements, el_size, el_type, resizable, immutable = self.read_any_array_header(arr_val)
+        # read before allocating, which can move arr
+        data = self.array_element_bytes(arr_val, el_type, start, end)
+        if el_type == None:
+            res_val = self.new_array(end - start, resizable, immutable, True)
+        else:
+            res_val = self.new_packed_array(end - start, el_type, resizable, True)
+        self.write_array_elements(res_val, 0, data)
+        return res_val
+
+    def array_fill(self, arr_val, val, count_val=None):
+        """
+        fill(arr, val), sets every element of an array to val and returns the array. fill(arr, val, count) first resizes the array to count elements, reserving the room at once.
+        """
+        num_elements, el_size, el_type = self.check_mutable_array(arr_val)
+        if count_val != None:
+            if count_val[0] != Values.I32_TYPE or Values.value_to_python_repr(count_val) < 0:
+                raise Exception("Fill Count Must be a Positive Int!")
+            num_elements = Values.value_to_python_repr(count_val)
+            self.reserve_array(arr_val, num_elements)
+        if el_type == None:
+            data = bytes(val) * num_elements
+        elif val[0] == el_type:
+            data = bytes(val[4:8]) * num_elements
+        else:
+            raise Exception("Attempting to Store a Value of the Wrong Type in a Packed Array!")
+        self.write_array_elements(arr_val, 0, data)
+        return arr_val
+
+    def array_map(self, arr_val, op_val, const_val):
+        """
+        Builtin map(arr, op, const), returns a new array with op (one of the strings "+", "-", "*", "/" or "%") applied to each element and the constant.
+        A packed array maps to a packed array, of F32s when the constant is an F32 or op is "/".
+        """
+        op = self.read_string_payload(op_val).decode("utf-8") if self.is_string(op_val) else None
+        if not op in MAP_OPERATORS:
+            raise Exception("Invalid Map Operator!")
+        if not const_val[0] in PACKED_FORMATS:
+            raise Exception("Expected a Number to Map With!")
+        fn = MAP_OPERATORS[op]
+        const = Values.value_to_python_repr(const_val)
+
+        if self.array_type(arr_val) == PACKED_ARRAY:
+            addr, size, num_elements, el_type, resizable, gc = self.read_packed_array_header(arr_val)
+            res_type = Values.I32_TYPE if el_type == Values.I32_TYPE and const_val[0] == Values.I32_TYPE and op != "/" else Values.F32_TYPE
+            # the whole map runs in C, the result is built before anything is allocated
+            with self.packed_view(arr_val) as view:
+                try:
+                    res = array.array(PACKED_FORMATS[res_type], map(fn, view, itertools.repeat(const)))
+                except OverflowError:
+                    raise Exception("Int is Too Big!" if res_type == Values.I32_TYPE else "Float is Too Big!")
+            # floats too big for an F32 are stored as infinity rather than raising
+            if res_type == Values.F32_TYPE and any(map(math.isinf, res)):
+                raise Exception("Float is Too Big!")
+            res_val = self.new_packed_array(num_elements, res_type, True, True)
+            res_addr = self.dynamic_heap.get_addr(U32.unpack_from(res_val, 4)[0])
+            self.dynamic_heap.view[res_addr+12:res_addr+12+num_elements*4] = memoryview(res).cast("B")
+            self.dynamic_heap.write_u32(res_addr+8, num_elements)
+            return res_val
+
+        numbers = self.array_numbers(arr_val)
+        res_val = self.new_array(len(numbers), True, False, True)
+        for n in numbers:
+            self.arr_push_back(res_val, Values.python_repr_to_value(fn(n, const)))
+        return res_val
+
+    def array_sort(self, arr_val):
+        """
+        Builtin sort(arr), sorts an array of numbers in place, smallest first, and returns it
+        """
+        self.check_mutable_array(arr_val)
+        if self.array_type(arr_val) == PACKED_ARRAY:
+            with self.packed_view(arr_val) as view:
+                res = array.array(view.format, sorted(view))
+                view[:] = res
+            return arr_val
+        addr, size, num_elements, resizable, immutable, gc = self.read_arr_header(arr_val)
+        numbers = self.array_numbers(arr_val)
+        values = sorted(range(num_elements), key=lambda i: numbers[i])
+        elements = [self.dynamic_heap.arr[addr+12+i*8:addr+20+i*8] for i in values]
+        self.dynamic_heap.view[addr+12:addr+12+num_elements*8] = b"".join(elements)
+        return arr_val
+
     def extract_table_sizes(self, addr, size, is_set):
-        total_entries = int.from_bytes(self.dynamic_heap.arr[addr+8:addr+12], byteorder="little")
+        total_entries = self.dynamic_heap.read_u32(addr+8)
         
         payload_size = size - 12
                         
+        # Each cell is a key, a value unless it's a set, and the key's 4 byte hash
         cappacity = -1                
         if is_set:
-            cappacity = payload_size // 8
+            cappacity = payload_size // (8 + 4)
         else:
-            cappacity = payload_size // (8 + 8)
+            cappacity = payload_size // (8 + 8 + 4)
         return total_entries, cappacity
         
+    def intern_static_strings(self):
+        """
+        Interns each distinct static string once, when the program is loaded. Static strings with the same characters all load the value of the first one.
+        """
+        self.intern_table_ref = self.new_table(max(len(self.static_objs), 1), True, True, False)
+        # the value STATIC_STR loads, by static object index; None for other static objects
+        self.static_string_values = [None] * len(self.static_objs)
+        first_index = {}
+        for index, obj in enumerate(self.static_objs):
+            if self.static_hashes[index] == None:
+                continue
+            first = first_index.setdefault(bytes(obj[8:]), index)
+            if first == index:
+                str_val = bytearray(8)
+                str_val[0] = Values.ValueType.STATIC_OBJ.value
+                str_val[4:8] = index.to_bytes(4, byteorder="little")
+                self.add_table(self.intern_table_ref, str_val, None)
+                self.static_string_values[index] = str_val
+            else:
+                self.static_string_values[index] = self.static_string_values[first]
+    
     def load_static_string(self, obj_str, static_obj_index):
         """
-        Loads a static string into the intern table
+        Returns the interned value of a static string, it was interned when the program was loaded.
         """
-        str_val = bytearray(8)
-        str_val[0] = Values.ValueType.STATIC_OBJ.value
-        str_val[4:8] = static_obj_index.to_bytes(4, byteorder="little")
-        addr, _, total_entries, cappacity, is_set, resizable = self.read_table_header(self.intern_table_ref)
-        return self.add_table(self.intern_table_ref, str_val, None) 
+        return self.static_string_values[static_obj_index]
+    
+    def is_interned(self, str_val):
+        if str_val[0] == Values.STATIC_OBJ_TYPE:
+            # only the first static string with its characters is interned
+            return self.static_string_values[U32.unpack_from(str_val, 4)[0]] == str_val
+        if str_val[0] == Values.HEAP_OBJ_TYPE:
+            addr = self.dynamic_heap.get_addr(U32.unpack_from(str_val, 4)[0])
+            return bool(self.dynamic_heap.arr[addr+1] & INTERNED_FLAG)
+        return False
+    
+    def intern_string(self, str_val):
+        """
+        Returns the interned string with str_val's characters, interning str_val if there isn't one. Interned strings stay live as long as the intern table does.
+        """
+        if self.is_interned(str_val):
+            return str_val
+        if str_val[0] != Values.HEAP_OBJ_TYPE:
+            raise Exception("Can Only Intern Immutable Strings!")
+        addr = self.dynamic_heap.get_addr(U32.unpack_from(str_val, 4)[0])
+        if self.dynamic_heap.arr[addr] != IMMUTABLE_STRING:
+            raise Exception("Can Only Intern Immutable Strings!")
+        
+        table_addr, _, _, cappacity, is_set, _ = self.read_table_header(self.intern_table_ref)
+        cell = self.find_table_cell(table_addr, cappacity, is_set, str_val)
+        if cell != None:
+            return self.dynamic_heap.arr[cell:cell+8]
+        
+        self.dynamic_heap.arr[addr+1] |= INTERNED_FLAG
+        self.add_table(self.intern_table_ref, str_val, None)
+        return str_val
 
+    def key_hash(self, key_value):
+        """
+        Hashes a table key. Strings use the hash stored with them. Nulls, ints, floats and bools hash their 4 byte payload, since Values.compare_values finds them equal when their payloads are.
+        """
+        type = key_value[0]
+        if type == Values.STATIC_OBJ_TYPE:
+            # static string
+            hash = self.static_hashes[U32.unpack_from(key_value, 4)[0]]
+            if hash != None:
+                return hash
+        elif type == Values.HEAP_OBJ_TYPE:
+            addr = self.dynamic_heap.get_addr(U32.unpack_from(key_value, 4)[0])
+            if self.dynamic_heap.arr[addr] == IMMUTABLE_STRING:
+                return U32.unpack_from(self.dynamic_heap.arr, addr+8)[0]
+        elif type <= Values.F32_TYPE:
+            return hash_u32(U32.unpack_from(key_value, 4)[0])
+        raise Exception("Can Only Hash Strings, Numbers, Bools and Null!")
+    
     def hash_value(self, cappacity, key_value, probe_num):
         """
         Determines the index of a key in a given table.
         """
-        if key_value[0] == Values.ValueType.HEAP_OBJ.value:
-            obj = self.read_heap_object(key_value)
-            if obj[0] == HeapType.IMMUTABLE_STRING.value:
-                key = obj[8:].decode("utf-8") 
-                hash_value = 0
-                for char in key:
-                    hash_value = (hash_value * 31 + ord(char)) % cappacity
-                return (hash_value + probe_num) % cappacity
-        elif key_value[0] == Values.ValueType.STATIC_OBJ.value:
-            # static string
-            i = int.from_bytes(key_value[4:], byteorder="little")
-            key = self.static_objs[i][8:].decode("utf-8") 
-            hash_value = 0
-            for char in key:
-                hash_value = (hash_value * 31 + ord(char)) % cappacity
-                return (hash_value + probe_num) % cappacity
-        raise Exception("Can Only Hash Strings (for now)!")      
+        return (self.key_hash(key_value) + probe_num) % cappacity
     
     def probe_num(self, cappacity, key_value, index):
         """
         Determines the probe number of a key in a given table.
         """
-        return (index - self.hash(cappacity, key_value, 0)) % cappacity
+        return (index - self.key_hash(key_value)) % cappacity
     
-    def find_table_cell(self, table_addr, cappacity, is_set, key_value):
+    def find_table_slot(self, table_addr, cappacity, is_set, key_value, key_hash):
         """
-        Finds the potentially null cell of the table where key_value belongs. Backbone of: insert, search and modify
-        """        
-        # Offset by the header (12 bytes)
-        offset = table_addr + 12
+        Finds the cell number of key_value in a table, or None if it isn't there.
+        Tables use Robin Hood linear probing, the cells of a probe chain are ordered by how far they are from the cell their key hashes to. A search can stop at a cell closer to its own start than the key would be, the key would have taken that cell.
+        """
+        arr = self.dynamic_heap.arr
         
-        # Determine the index, relative to the begining of the array
-        relative_index = self.hash_value(cappacity, key_value, 0)
-
         # Step size; how far to move to the next cell
         step_size = 8
         
@@ -1325,29 +2682,95 @@ class HeapManager:
         if not is_set:
             step_size += 8
         
-        # Index of the start of the next cell
-        index = offset + (relative_index * step_size)
+        # Offset by the header (12 bytes), the key hashes follow the cells
+        offset = table_addr + 12
+        hashes = offset + cappacity * step_size
+        
+        relative_index = key_hash % cappacity
         
         # Starting with a probe number of 0
         i = 0
         while i < cappacity:
-            # If null is reached, end of probe chain, return
-            if self.dynamic_heap.arr[index] == NULL:
-                return index
-
-            # Compare the keys, if they match, return the index
-            if Values.compare_values(key_value, self.dynamic_heap.arr[index:index+8], self):
-                return index
+            index = offset + relative_index * step_size
+            # If null is reached, end of probe chain
+            if arr[index] == NULL:
+                return None
+            
+            cell_hash = U32.unpack_from(arr, hashes + 4 * relative_index)[0]
+            if (relative_index - cell_hash) % cappacity < i:
+                return None
             
-            # Update the relative index (next cell relative to start)
-            relative_index = ((relative_index + 1) % cappacity)
-            # Calculate the acctual index (index of next cell)
-            index = offset + (relative_index * step_size)
-            i += 1   
+            # Keys with different hashes can't match, so most collisions skip comparing keys
+            if cell_hash == key_hash:
+                cell = arr[index:index+8]
+                if cell == key_value or Values.compare_values(key_value, cell, self):
+                    return relative_index
             
-        # If the end of the table is reached, there's no room or the key wasn't found
+            relative_index += 1
+            if relative_index == cappacity:
+                relative_index = 0
+            i += 1
+        
         return None
     
+    def find_table_cell(self, table_addr, cappacity, is_set, key_value):
+        """
+        Finds the index of the cell holding key_value, or None if it isn't in the table. Backbone of: search, modify and compare
+        """
+        relative_index = self.find_table_slot(table_addr, cappacity, is_set, key_value, self.key_hash(key_value))
+        if relative_index == None:
+            return None
+        step_size = 8
+        if not is_set:
+            step_size += 8
+        return table_addr + 12 + relative_index * step_size
+    
+    def place_in_table(self, table_addr, cappacity, is_set, key_value, value, key_hash):
+        """
+        Puts a key that isn't in the table into its probe chain. Whenever the key is further from its start than the key in a cell, it takes the cell and that key is placed further along instead, which keeps probe chains short and ordered.
+        """
+        arr = self.dynamic_heap.arr
+        step_size = 8
+        if not is_set:
+            step_size += 8
+        offset = table_addr + 12
+        hashes = offset + cappacity * step_size
+        
+        # The cell being placed
+        cell = bytearray(key_value)
+        if not is_set:
+            cell += value
+        
+        relative_index = key_hash % cappacity
+        probe_num = 0
+        i = 0
+        while i < cappacity:
+            index = offset + relative_index * step_size
+            hash_index = hashes + 4 * relative_index
+            if arr[index] == NULL:
+                arr[index:index+step_size] = cell
+                U32.pack_into(arr, hash_index, key_hash)
+                return
+            
+            cell_hash = U32.unpack_from(arr, hash_index)[0]
+            cell_probe_num = (relative_index - cell_hash) % cappacity
+            if cell_probe_num < probe_num:
+                # Swap, the key that was here is placed further along
+                resident = arr[index:index+step_size]
+                arr[index:index+step_size] = cell
+                U32.pack_into(arr, hash_index, key_hash)
+                cell = resident
+                key_hash = cell_hash
+                probe_num = cell_probe_num
+            
+            relative_index += 1
+            if relative_index == cappacity:
+                relative_index = 0
+            probe_num += 1
+            i += 1
+        
+        raise Exception("Table is Full!")
+    
     def calculate_indices(self, key_index, is_set):
         start_index = key_index
         end_index = key_index+8
@@ -1359,30 +2782,23 @@ class HeapManager:
     
     # Should work for all objects that store entries
     def increment_table_entries(self, table_addr):
-        val = int.from_bytes(self.dynamic_heap.arr[table_addr+8:table_addr+12], byteorder='little')
-        val += 1
-        self.dynamic_heap.arr[table_addr+8:table_addr+12] = val.to_bytes(4, byteorder='little')
+        self.dynamic_heap.write_u32(table_addr+8, self.dynamic_heap.read_u32(table_addr+8) + 1)
         
     def add_table_helper(self, table_addr, cappacity, is_set, key_value, value):
-        key_index = self.find_table_cell(table_addr, cappacity, is_set, key_value)
-
-        if key_index == None:
-            raise Exception("Table is Full!")
-        
-        start_index, end_index = self.calculate_indices(key_index, is_set)
-            
-        if self.dynamic_heap.arr[key_index] != NULL:
-            # If the key-value is none, it's already in the table
+        # a null key would look like an empty cell
+        if key_value[0] == Values.NULL_TYPE:
+            raise Exception("Tables Can't Have Null Keys!")
+        key_hash = self.key_hash(key_value)
+        key_index = self.find_table_slot(table_addr, cappacity, is_set, key_value, key_hash)
+        
+        if key_index != None:
+            # It's already in the table
+            start_index, end_index = self.calculate_indices(table_addr + 12 + key_index * (8 if is_set else 16), is_set)
             return self.dynamic_heap.arr[start_index:end_index]
-        else:     
-            self.increment_table_entries(table_addr)
-            if is_set:
-                self.dynamic_heap.arr[start_index:end_index] = key_value
-                return key_value
-            else:
-                self.dynamic_heap.arr[key_index:start_index] = key_value
-                self.dynamic_heap.arr[start_index:end_index] = value  
-                return key_value
+        
+        self.place_in_table(table_addr, cappacity, is_set, key_value, value, key_hash)
+        self.increment_table_entries(table_addr)
+        return key_value
                 
     def add_table(self, table_value, key_value, value):
         """
@@ -1391,31 +2807,30 @@ class HeapManager:
                 
         addr, _, total_entries, cappacity, is_set, resizable = self.read_table_header(table_value)
 
-        # Extract the flags here
-        gc = False
+        # Extract the flags here, a resized table is collected like the one it replaces
+        gc = bool(self.dynamic_heap.arr[addr+1] & GC_FLAG)
         
         if self.dynamic_heap.arr[addr] != HeapType.TABLE.value:
             raise Exception("Attempting to Add to a Non-Table Object")
+        
+        self.gc_write_barrier(key_value)
+        if value != None:
+            self.gc_write_barrier(value)
 
-        if total_entries + 1 > cappacity:
-            if resizable:
-                _, addr, cappacity = self.resize_table_helper(addr, resizable, cappacity, is_set, gc, 2) 
-            else:
-                raise Exception("Panic: Attempting to Add to Full Map!")     
+        if resizable and total_entries + 1 > cappacity * self.table_load_factor:
+            _, addr, cappacity = self.resize_table_helper(addr, resizable, cappacity, is_set, gc, 2) 
+        elif total_entries + 1 > cappacity:
+            raise Exception("Panic: Attempting to Add to Full Map!")     
         return self.add_table_helper(addr, cappacity, is_set, key_value, value)
           
     def search_table_helper(self, table_addr, cappacity, is_set, key_value):
         key_index = self.find_table_cell(table_addr, cappacity, is_set, key_value)
         
         if key_index == None:
-            raise Exception("Coulnd't Find Key in Table!")
+            raise Exception("Couldn't Find Key in Table!")
         
         start_index, end_index = self.calculate_indices(key_index, is_set)
-            
-        if self.dynamic_heap.arr[key_index] == NULL:
-            raise Exception("Couldn't Find Key in Table!")
-        else:
-            return self.dynamic_heap.arr[start_index:end_index]
+        return self.dynamic_heap.arr[start_index:end_index]
         
     def search_table(self, table_val, key_value):
         addr, size, total_entries, cappacity, is_set, resizable = self.read_table_header(table_val)
@@ -1428,14 +2843,10 @@ class HeapManager:
             raise Exception("Can't Modify Value of a Set!")
         
         if key_index == None:
-            raise Exception("Coulnd't Find Key in Table!")
+            raise Exception("Couldn't Find Key in Table!")
         
         start_index, end_index = self.calculate_indices(key_index, is_set)
-            
-        if self.dynamic_heap.arr[key_index] == NULL:
-            raise Exception("Couldn't Find Key in Table!")
-        else:
-            self.dynamic_heap.arr[start_index:end_index] = value                
+        self.dynamic_heap.arr[start_index:end_index] = value                
     
     def modify_table(self, table_val, key_value, value):
         addr, size, total_entries, cappacity, is_set, resizable = self.read_table_header(table_val)
@@ -1451,6 +2862,12 @@ class HeapManager:
             return self.arr_get_index(struct_val, key_value)
         elif type == PRIORITY_QUEUE:
             return self.priority_queue_get_priority(struct_val, key_value)
+        elif type == DEQUE:
+            return self.deque_get_index(struct_val, key_value)
+        elif type == STRUCT:
+            return self.struct_get_key(struct_val, key_value)
+        elif type == PACKED_ARRAY:
+            return self.packed_get_index(struct_val, key_value)
         else:
             raise Exception("Attempting to Modify Invalid Heap Structure!")
     
@@ -1463,14 +2880,60 @@ class HeapManager:
             return self.extract_max_priority_queue(struct_val)
         elif type == ARRAY:
             return self.arr_pop_back(struct_val)
+        elif type == DEQUE:
+            return self.deque_pop_back(struct_val)
+        elif type == PACKED_ARRAY:
+            return self.packed_pop_back(struct_val)
         else:
-            print(type, PRIORITY_QUEUE)
             raise Exception("Attempting to Pop Back of an Invalid Heap Structure!")
+    
+    def struct_insert(self, struct_val, key_val, val):
+        """
+        Inserts a key and value with <<, into a table or, with the value as its priority, a priority queue.
+        """
+        if struct_val[0] == Values.ValueType.HEAP_OBJ.value and self.read_heap_object_header(struct_val)[1] == PRIORITY_QUEUE:
+            return self.insert_priority_queue(struct_val, key_val, val)
+        return self.add_table(struct_val, key_val, val)
+    
+    def struct_push_back(self, struct_val, val):
+        if struct_val[0] != Values.ValueType.HEAP_OBJ.value:
+            raise Exception("Attempting to Push Back onto an Invalid Structure!")
+        _, type, _, _ = self.read_heap_object_header(struct_val)    
+        
+        if type == ARRAY:
+            return self.arr_push_back(struct_val, val)
+        elif type == DEQUE:
+            return self.deque_push_back(struct_val, val)
+        elif type == PACKED_ARRAY:
+            return self.packed_push_back(struct_val, val)
+        else:
+            raise Exception("Attempting to Push Back onto an Invalid Heap Structure!")
+    
+    def struct_push_front(self, struct_val, val):
+        if struct_val[0] != Values.ValueType.HEAP_OBJ.value:
+            raise Exception("Attempting to Push Front onto an Invalid Structure!")
+        _, type, _, _ = self.read_heap_object_header(struct_val)    
+        
+        if type == DEQUE:
+            return self.deque_push_front(struct_val, val)
+        else:
+            raise Exception("Attempting to Push Front onto an Invalid Heap Structure!")
+    
+    def struct_pop_front(self, struct_val):
+        if struct_val[0] != Values.ValueType.HEAP_OBJ.value:
+            raise Exception("Attempting to Pop Front of an Invalid Structure!")
+        _, type, _, _ = self.read_heap_object_header(struct_val)    
+        
+        if type == DEQUE:
+            return self.deque_pop_front(struct_val)
+        else:
+            raise Exception("Attempting to Pop Front of an Invalid Heap Structure!")
             
     def modify_structure(self, struct_val, key_value, value):
         if struct_val[0] != Values.ValueType.HEAP_OBJ.value:
             raise Exception("Attempting to Modify an Invalid Structure!")
         _, type, _, _ = self.read_heap_object_header(struct_val)    
+        self.gc_write_barrier(value)
         
         if type == TABLE:
             return self.modify_table(struct_val, key_value, value)
@@ -1478,6 +2941,12 @@ class HeapManager:
             return self.arr_modify_index(struct_val, key_value, value)
         elif type == PRIORITY_QUEUE:
             return self.max_heap_increase(struct_val, key_value, value)
+        elif type == DEQUE:
+            return self.deque_modify_index(struct_val, key_value, value)
+        elif type == STRUCT:
+            return self.struct_modify_key(struct_val, key_value, value)
+        elif type == PACKED_ARRAY:
+            return self.packed_modify_index(struct_val, key_value, value)
         else:
             raise Exception("Attempting to Modify Invalid Heap Structure!")
     
@@ -1486,7 +2955,9 @@ class HeapManager:
             raise Exception("Attempting to Modify an Invalid Structure!")
         _, type, _, _ = self.read_heap_object_header(struct_val)    
         
-        if type == PRIORITY_QUEUE:
+        if type == TABLE:
+            return self.remove_from_table(struct_val, key_val)
+        elif type == PRIORITY_QUEUE:
             return self.remove_key_priority_queue(struct_val, key_val)
         else:
             raise Exception("Attempting to Remove from an Invalid Heap Structure!")
@@ -1502,14 +2973,52 @@ class HeapManager:
         v[4:] = size_bytes
         return v
         
-    def remove_from_table(self):
-        pass
+    def remove_from_table(self, table_val, key_value):
+        """
+        Removes a key from a table, returning its value, or the key for sets. The cells after it in its probe chain move back one cell, so there are no tombstones to skip.
+        """
+        addr, size, total_entries, cappacity, is_set, resizable = self.read_table_header(table_val)
+        relative_index = self.find_table_slot(addr, cappacity, is_set, key_value, self.key_hash(key_value))
+        if relative_index == None:
+            raise Exception("Couldn't Find Key in Table!")
+        
+        arr = self.dynamic_heap.arr
+        step_size = 8
+        if not is_set:
+            step_size += 8
+        offset = addr + 12
+        hashes = offset + cappacity * step_size
+        
+        index = offset + relative_index * step_size
+        start_index, end_index = self.calculate_indices(index, is_set)
+        removed = arr[start_index:end_index]
+        
+        # Shift back until an empty cell, or a key that's in the cell it hashes to
+        i = 1
+        while i < cappacity:
+            next_relative_index = (relative_index + 1) % cappacity
+            next_index = offset + next_relative_index * step_size
+            if arr[next_index] == NULL:
+                break
+            next_hash = U32.unpack_from(arr, hashes + 4 * next_relative_index)[0]
+            if next_hash % cappacity == next_relative_index:
+                break
+            arr[index:index+step_size] = arr[next_index:next_index+step_size]
+            U32.pack_into(arr, hashes + 4 * relative_index, next_hash)
+            relative_index = next_relative_index
+            index = next_index
+            i += 1
+        
+        # Values in the emptied cell would still be marked by the garbage collector
+        self.dynamic_heap.fill_bytes(index, step_size, NULL)
+        self.decrement_struct_entries(addr, total_entries)
+        return removed
     
     def free_heap_object_helper(self, id):
         # Get the address
         addr = self.dynamic_heap.get_addr(id)
         # Read the size
-        size = int.from_bytes(self.dynamic_heap.arr[addr+4:addr+8], byteorder="little")
+        size = self.dynamic_heap.read_u32(addr+4)
         # Call free with the address and size
         self.dynamic_heap.free(id, size)
     
@@ -1518,26 +3027,13 @@ class HeapManager:
         id = int.from_bytes(obj_val[4:], byteorder="little")
         self.free_heap_object_helper(id)
     
-    def no_check_insert_table(self, table_addr, cappacity,  is_set, key_value, value):
+    def no_check_insert_table(self, table_addr, cappacity,  is_set, key_value, value, key_hash=None):
         """
-        Inserts an element into a table without checking if the element is already in the table. Used by resize for copying elements into a table.
+        Inserts an element into a table without checking if the element is already in the table. Used by resize for copying elements into a table, which passes the hash it already has.
         """
-        i = 0
-        offset = table_addr + 12
-        relative_index = self.hash_value(cappacity, key_value, 0)
-        step_size = 8
-        if not is_set:
-            step_size += 8
-        index = offset + (relative_index * step_size)
-        while i < cappacity:
-            if self.dynamic_heap.arr[index] == NULL:
-                self.dynamic_heap.arr[index:index+8] =key_value
-                if not is_set:     
-                    self.dynamic_heap.arr[index+8:index+8+8] = value
-                return 
-            relative_index = (relative_index + 1) % cappacity
-            index = offset + (relative_index * step_size)
-            i += 1
+        if key_hash == None:
+            key_hash = self.key_hash(key_value)
+        self.place_in_table(table_addr, cappacity, is_set, key_value, value, key_hash)
     
     def print_heap_object(self, obj_val):
         pass
@@ -1548,13 +3044,16 @@ class HeapManager:
         
         # Retrieve the original table ID
         og_id = self.dynamic_heap.get_id(table_addr)
+        og_flags = self.dynamic_heap.arr[table_addr+1]
         
         # Create a new table
-        new_table = self.new_table(new_cappacity, resizable, is_set, gc)
+        new_table = self.allocate_table(new_cappacity, resizable, is_set, gc)
 
         # Extract the address and ID of the new table
         new_table_id = int.from_bytes(new_table[4:], byteorder="little")
         new_table_addr = self.dynamic_heap.get_addr(new_table_id)
+        # Allocating can compact the heap and move the old table
+        table_addr = self.dynamic_heap.get_addr(og_id)
 
         # Offset by the header (12 bytes)
         offset = table_addr + 12
@@ -1566,6 +3065,9 @@ class HeapManager:
         if not is_set:
             step_size += 8
         
+        # The key hashes follow the cells, they're reused rather than computed again
+        hashes = offset + cappacity * step_size
+        
         # Index of the current cell, start at relative 0
         index = offset
         i = 0
@@ -1574,26 +3076,30 @@ class HeapManager:
         # Go through the elements linearly
         while i < cappacity:
             # Add each non null value in the old table into the new table
-            if is_set:
-                # If its a set, just move the key
-                if self.dynamic_heap.arr[index] != NULL:
-                    self.no_check_insert_table(new_table_addr, new_cappacity, is_set, self.dynamic_heap.arr[index:index+8], None)
-                    entry_count += 1
-            else:
-                # If its a key:value, move both
-                if self.dynamic_heap.arr[index] != NULL:
-                    self.no_check_insert_table(new_table_addr, new_cappacity, is_set, self.dynamic_heap.arr[index:index+8], self.dynamic_heap.arr[index+8:index+8+8])
-                    entry_count += 1
+            if self.dynamic_heap.arr[index] != NULL:
+                key_hash = U32.unpack_from(self.dynamic_heap.arr, hashes + 4 * i)[0]
+                if is_set:
+                    # If its a set, just move the key
+                    self.no_check_insert_table(new_table_addr, new_cappacity, is_set, self.dynamic_heap.arr[index:index+8], None, key_hash)
+                else:
+                    # If its a key:value, move both
+                    self.no_check_insert_table(new_table_addr, new_cappacity, is_set, self.dynamic_heap.arr[index:index+8], self.dynamic_heap.arr[index+8:index+8+8], key_hash)
+                entry_count += 1
             
             index += step_size
             i += 1
 
         # update entry count for the new table
-        self.dynamic_heap.arr[new_table_addr+8:new_table_addr+12] = entry_count.to_bytes(4, byteorder="little")        
-        self.free_heap_object_helper(og_id)
-        self.dynamic_heap.heap_addrs[new_table_addr] = og_id
-        del self.dynamic_heap.heap_ids[new_table_id]
-        self.dynamic_heap.heap_ids[og_id] = new_table_addr        
+        self.dynamic_heap.write_u32(new_table_addr+8, entry_count)        
+        # The old table is freed and the new one takes its id
+        self.dynamic_heap.replace(og_id, new_table_id)
+        # The table keeps its id, so it keeps its place in a running collection
+        if self.gc_phase == GC_MARK:
+            # the new table was queued to be scanned under its own id, which is gone now
+            self.gc_gray.append(og_id)
+        elif self.gc_phase == GC_SWEEP:
+            # a table that hasn't been swept yet stays marked
+            self.dynamic_heap.arr[new_table_addr+1] |= og_flags & MARK_FLAG
         # Return an ID and essential meta data
         return self.val_as_heap_ref(og_id), new_table_addr, new_cappacity
     
@@ -1,4 +1,5 @@
 
+import functools, operator
 import heaping, compiling, Values, op_codes
 
 
@@ -7,18 +8,21 @@ A value is a tagged union consisting of an: int, float, char, bool, null, a stat
 """
 
 class UpValue:
-    def __init__(self, addr, stack_addr):
-        self.addr = addr
+    def __init__(self, closure_val, index, stack_addr):
+        # the closure and index are kept instead of the up value's heap address, which changes when the heap is compacted
+        self.closure_val = closure_val
+        self.index = index
         self.stack_addr = stack_addr
 
     def __str__(self):
         return f"UpValue[{self.stack_addr}]"
 
 class UpValueList:
-    def __init__(self, stack, heap_manager, up_val=None, next=None, stack_addr=None):
+    def __init__(self, stack_value, heap_manager, up_val=None, next=None, stack_addr=None):
         self.up_val = up_val
         self.next = next
-        self.stack = stack
+        # reads the stack slot at an address as a value
+        self.stack_value = stack_value
         self.heap_manager = heap_manager
         self.stack_addr = stack_addr
     
@@ -30,23 +34,24 @@ class UpValueList:
         else:
             n = self
             if n.stack_addr <= stack_addr:
-                return UpValueList(self.stack, self.heap_manager, up_val, n, stack_addr)
+                return UpValueList(self.stack_value, self.heap_manager, up_val, n, stack_addr)
             else:
                 while n.next != None and n.next.stack_addr > stack_addr:
                     n = n.next
-                n.next = UpValueList(self.stack, self.heap_manager, up_val, n.next, stack_addr)
+                n.next = UpValueList(self.stack_value, self.heap_manager, up_val, n.next, stack_addr)
                 return self
 
     def close_up_values(self, stack_addr):
         if self.up_val == None:
-            return
+            # nothing is open, the empty list stays
+            return self
         else:
             n = self
             while n != None and n.stack_addr >= stack_addr:
                 curr_stack_addr = n.stack_addr
-                ref = self.heap_manager.new_dynamic_up_value(self.stack[n.stack_addr:n.stack_addr+8], True)
+                ref = self.heap_manager.new_dynamic_up_value(self.stack_value(n.stack_addr), True)
                 while n != None and n.stack_addr == curr_stack_addr:
-                    self.heap_manager.close_up_value(n.up_val.addr, ref)
+                    self.heap_manager.close_up_value(self.heap_manager.up_value_addr(n.up_val.closure_val, n.up_val.index), ref)
                     
                     if n.next == None or (n.next != None and n.next.stack_addr != curr_stack_addr):
                     
@@ -56,7 +61,7 @@ class UpValueList:
                     
                 n = n.next
             if n == None:
-                return UpValueList(self.stack, self.heap_manager)
+                return UpValueList(self.stack_value, self.heap_manager)
             else:
                 return n
     
@@ -72,19 +77,21 @@ class UpValueList:
         return string
             
 class CallFrame:
-    def __init__(self, ops, ip_addr, arity, func_val, func_id, offset, is_closure):
-        self.ops = ops
-        self.ip_addr = ip_addr
-        self.arity = arity
-        self.func_val = func_val
-        self.func_id = func_id
-        self.offset = offset
-        self.is_closure = is_closure
+    """
+    The state of a caller saved while its callee runs. Frames are preallocated by the VM and reused, a call only overwrites their fields.
+    """
+    __slots__ = ("ops", "ip_addr", "arity", "func_val", "offset", "is_closure")
+    
+    def __init__(self):
+        self.ops = None
+        self.ip_addr = 0
+        self.arity = 0
+        self.func_val = None
+        self.offset = 0
+        self.is_closure = False
     
     def __str__(self):
         c_str = "CallFrame["
-        c_str += self.func_id
-        c_str += ","
         c_str += str(self.offset)
         c_str += ", "
         c_str += str(self.arity)
@@ -95,47 +102,97 @@ class CallFrame:
         return str(self)
 
 class VM:
-    def __init__(self, stack_size, ops, const_pool, static_objs):      
+    # size of a stack slot in stack addresses
+    SLOT_SIZE = 8
+    # call frames allocated up front, more are added when calls nest deeper
+    FRAME_COUNT = 64
+    # default hard caps, the stack (in slots) and dynamic heap (in bytes) grow up to them
+    MAX_STACK_SIZE = 1 << 20
+    MAX_HEAP_SIZE = 1 << 26
+    # ops that allocate on the heap, the garbage collector only runs after one of them
+    ALLOCATING_OPS = (op_codes.OpCode.NEW_TABLE.value, op_codes.OpCode.NEW_ARRAY.value, op_codes.OpCode.NEW_PRIORITY_QUEUE.value, op_codes.OpCode.NEW_CLOSURE.value,
+        op_codes.OpCode.INSERT_TABLE.value, op_codes.OpCode.PUSH_BACK_ARRAY.value, op_codes.OpCode.MODIFY_STRUCT.value, op_codes.OpCode.CLOSE_UP_VALUE.value,
+        op_codes.OpCode.NEW_DEQUE.value, op_codes.OpCode.PUSH_FRONT.value, op_codes.OpCode.NEW_STRUCT.value, op_codes.OpCode.NEW_PACKED_ARRAY.value, op_codes.OpCode.CALL_BUILTIN.value,
+        op_codes.OpCode.ARRAY_EXTEND.value, op_codes.OpCode.ARRAY_SLICE.value, op_codes.OpCode.ARRAY_COPY.value, op_codes.OpCode.ARRAY_FILL.value)
+    
+    def __init__(self, stack_size, ops, const_pool, static_objs, static_global_count=0, gc_budget=None, max_stack_size=None, heap_size=8*2048, max_heap_size=None):      
         # stack of 8 byte slots of values
-        self.stack = bytearray(8 * stack_size)
-        # instruction pointer, points to the current operation
+        self.stack = self.new_stack(stack_size)
+        # instruction pointer, points to the current (decoded) operation
         self.ip_addr = 0
-        # an array of opcodes representing operations
-        self.ops = ops
         
         self.closure_stack = []
         
         # Used by functions
         self.func_val = None
-        self.func_id = "main"
         self.arity = 0
         self.offset = 0
         self.is_closure = False
         
-        # Call stack
-        self.call_stack = []
+        # Call stack, frame_count of its frames are in use
+        self.call_stack = [CallFrame() for i in range(self.FRAME_COUNT)]
+        self.frame_count = 0
         
         # constants (literals) used in the program
         self.const_pool = const_pool
         self.static_objs = static_objs
-        # heap
-        self.heap_manager = heaping.HeapManager(8*2048, 8*2048, len(static_objs), static_objs)
-        self.up_values = UpValueList(self.stack, self.heap_manager)
+        # heap, gc_budget bounds the garbage collector's work per safe point (None stops the world for whole collections)
+        max_heap_size = self.MAX_HEAP_SIZE if max_heap_size == None else max_heap_size
+        self.heap_manager = heaping.HeapManager(heap_size, static_global_count, len(static_objs), static_objs, gc_budget=gc_budget, max_dynamic_size=max(heap_size, max_heap_size))
+        self.up_values = UpValueList(self.stack_value, self.heap_manager)
+        # heap manager methods run by CALL_BUILTIN, indexed like op_codes.BUILTINS
+        builtin_methods = {"sum": self.heap_manager.array_sum, "min": self.heap_manager.array_min, "max": self.heap_manager.array_max,
+            "map": self.heap_manager.array_map, "sort": self.heap_manager.array_sort, "extract_max": self.heap_manager.extract_max_batch_priority_queue}
+        self.builtins = [builtin_methods[name] for name in op_codes.BUILTINS]
 
         # points to the (available) top of the stack
         self.stack_ptr = 0
-        # the size of the stack
+        # the size of the stack in slots, it doubles when it's full up to max_stack_size
         self.stack_size = stack_size
+        self.max_stack_size = max(stack_size, self.MAX_STACK_SIZE if max_stack_size == None else max_stack_size)
+        # the end of the stack in stack addresses
+        self.stack_end = stack_size * self.SLOT_SIZE
+        
+        # handlers indexed by opcode
+        self.dispatch_table = self.build_dispatch_table()
+        
+        # the main program and every function body are decoded once, at load time
+        self.ops = self.decode(ops)
+        self.code_objects = self.decode_static_functions(static_objs)
+    
+    def new_stack(self, stack_size):
+        return bytearray(8 * stack_size)
+    
+    def grow_stack(self):
+        """
+        Doubles the stack, up to max_stack_size slots. The stack is extended in place, so handlers holding it stay valid.
+        """
+        if self.stack_size >= self.max_stack_size:
+            raise Exception("Stack Overflow!")
+        new_size = min(2 * self.stack_size, self.max_stack_size)
+        self.stack.extend(self.new_stack(new_size - self.stack_size))
+        self.stack_size = new_size
+        self.stack_end = new_size * self.SLOT_SIZE
+    
+    def stack_high_water(self):
+        """
+        The most stack slots in use at once. Popped slots aren't cleared, so it's found from the highest slot that isn't empty, nulls at the very top aren't counted.
+        """
+        return (len(self.stack.rstrip(bytes(1))) + self.SLOT_SIZE - 1) // self.SLOT_SIZE
+    
+    def print_memory_report(self):
+        print(f"Stack: peak {self.stack_high_water()} slots used, {self.stack_size} slots allocated (max {self.max_stack_size})")
+        self.heap_manager.print_memory_report()
     
     def close_up_value(self):
         n = self.up_values
-        ref = self.heap_manager.new_dynamic_up_value(self.pop(), True)
+        ref = self.heap_manager.new_dynamic_up_value(self.pop_value(), True)
         curr_stack_addr = self.stack_ptr
         while n != None and n.stack_addr == curr_stack_addr:
-            self.heap_manager.close_up_value(n.up_val.addr, ref)        
+            self.heap_manager.close_up_value(self.heap_manager.up_value_addr(n.up_val.closure_val, n.up_val.index), ref)
             n = n.next
         if n == None:
-            return UpValueList(self.stack, self.heap_manager)
+            return UpValueList(self.stack_value, self.heap_manager)
         else:
             return n
     
@@ -148,13 +205,13 @@ class VM:
             return bytearray(8)
     
     def next_instruction(self):
-        op = self.ops[self.ip_addr:self.ip_addr+1]
+        record = self.ops[self.ip_addr]
         self.ip_addr += 1
-        return op
+        return record
     
     def push(self, val):
-        if self.stack_ptr >= self.stack_size:
-            raise Exception("Stack Overflow!")
+        if self.stack_ptr >= self.stack_end:
+            self.grow_stack()
         self.stack[self.stack_ptr:self.stack_ptr+8] = val
         self.stack_ptr += 8
     
@@ -164,36 +221,108 @@ class VM:
             raise Exception("Stack Underflow!")
         return self.stack[self.stack_ptr:self.stack_ptr+8]
     
-    def push_const(self):
-        self.push(self.const_pool[Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])])
-        self.ip_addr += 8
+    def push_value(self, val):
+        """
+        Pushes an 8 byte value. Used wherever a value comes from the heap, so other stack representations can convert it.
+        """
+        self.push(val)
+    
+    def pop_value(self):
+        """
+        Pops the top of the stack as an 8 byte value. Used wherever a value is handed to the heap.
+        """
+        return self.pop()
+    
+    def stack_value(self, stack_addr):
+        """
+        Reads the slot at a stack address as an 8 byte value.
+        """
+        return self.stack[stack_addr:stack_addr+8]
+    
+    def decode_const(self, val):
+        """
+        Converts a constant from the pool into what CONST pushes.
+        """
+        return val
+    
+    def decode_local(self, offset):
+        """
+        Converts a local's offset from the compiler (in bytes) into a stack address relative to the frame.
+        """
+        return offset
+    
+    def decode_global(self, addr):
+        # The compiler lays static globals out in 8 byte slots
+        return addr // 8
     
-    def push_str(self):
-        val_ref = self.heap_manager.load_static_string(self.static_objs[Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])], Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8]))
-        self.push(val_ref)
-        self.ip_addr += 8
+    def push_const(self, val):
+        self.push(val)
+    
+    def push_str(self, index):
+        val_ref = self.heap_manager.load_static_string(self.static_objs[index], index)
+        self.push_value(val_ref)
     
-    def set_static_global(self):
-        self.heap_manager.set_static_global(Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8]), self.pop())
-        self.ip_addr += 8
+    def set_static_global(self, addr):
+        self.heap_manager.set_static_global(addr, self.pop_value())
     
-    def set_local(self):
-        index = self.offset + Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
+    def set_local(self, offset):
+        index = self.offset + offset
         self.stack[index:index+8] = self.pop()
-        self.ip_addr += 8
     
-    def get_static_global(self):
-        self.push(self.heap_manager.get_static_global(Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])))  
-        self.ip_addr += 8
+    def get_static_global(self, addr):
+        self.push_value(self.heap_manager.get_static_global(addr))  
 
-    def get_local(self):
-        index = self.offset + Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
+    def get_local(self, offset):
+        index = self.offset + offset
         self.push(self.stack[index:index+8])
-        self.ip_addr += 8        
+    
+    def inc_local(self, offset, val):
+        # GET_LOCAL; CONST; SUM; SET_LOCAL on one local, the constant is always a number
+        index = self.offset + offset
+        res = Values.value_to_python_repr(self.stack[index:index+8]) + Values.value_to_python_repr(val)
+        self.stack[index:index+8] = Values.python_repr_to_value(res)
+    
+    def get_local_get_local(self, offset1, offset2):
+        index = self.offset + offset1
+        self.push(self.stack[index:index+8])
+        index = self.offset + offset2
+        self.push(self.stack[index:index+8])
+    
+    def jump(self, target):
+        # Jump targets are resolved to absolute record indices when decoding
+        self.ip_addr = target
+    
+    def false_jump(self, target):
+        val = self.pop()
+        if val[0] != Values.ValueType.BOOL.value:
+            raise Exception("Expected a Boolean at Top of Stack!")
+        expr = bool(int.from_bytes(val[4:], byteorder='little'))
+        if not expr:
+            self.ip_addr = target
+    
+    def less_than_jump_false(self, target):
+        o1 = self.pop()
+        o2 = self.pop()
+        if not self.compare(op_codes.LESS_THAN, o1, o2):
+            self.ip_addr = target
+    
+    def out(self):
+        val = self.stack_value(self.stack_ptr - self.SLOT_SIZE)
+        Values.print_value(val, self.static_objs, self.heap_manager)
+    
+    def pop_op(self):
+        # Discards the popped value; handlers only return True to stop execution
+        self.pop()
+    
+    def stop(self):
+        return True
+    
+    def close_up_value_op(self):
+        self.up_values = self.close_up_value()
     
     def outer_offset(self):
         # used for getting the outer function when initializing closures
-        return self.call_stack[len(self.call_stack)-1].offset
+        return self.call_stack[self.frame_count-1].offset
     
     def num_binary_op(self, op):
         # need to handle the case where the result isn't an int
@@ -220,6 +349,12 @@ class VM:
         new_val = Values.python_repr_to_value(res)
         self.push(new_val)
         
+    def typed_binary_op(self, operator, decode, encode):
+        # ADD_I32, LT_F32...: the compiler proved both operands have the type decode reads, so their tags aren't checked
+        o1 = self.pop()
+        o2 = self.pop()
+        self.push(encode(operator(decode(o1), decode(o2))))
+    
     def factorial(self, i):
         if i == 1:
             return i
@@ -269,10 +404,7 @@ class VM:
         new_val[4:] = int(res).to_bytes(4, byteorder='little')
         self.push(new_val)
 
-    def comparison_op(self, op):
-        new_val = bytearray(8)
-        o1 = self.pop()
-        o2 = self.pop()
+    def compare(self, op, o1, o2):
         res = None
         if op == op_codes.EQUAL:
             res = Values.compare_values(o1, o2, self.heap_manager)
@@ -280,189 +412,236 @@ class VM:
             res = Values.greater_than(o1, o2, self.heap_manager)
         elif op == op_codes.LESS_THAN:
             res = Values.less_than(o1, o2, self.heap_manager)
-        self.push(Values.python_repr_to_value(res))
+        return res
+    
+    def comparison_op(self, op):
+        o1 = self.pop()
+        o2 = self.pop()
+        self.push(Values.python_repr_to_value(self.compare(op, o1, o2)))
     
     def push_null(self):
         # byte arrays default to 0b00000... (null)
         n = bytearray(8)
-        self.push(n)
-    
-    def new_table(self):    
-        cappacity = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        resizable = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        is_set = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        gc = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-
+        self.push_value(n)
+    
+    def new_table(self, cappacity, resizable, is_set, gc):    
         table_value = self.heap_manager.new_table(cappacity, resizable, is_set, gc)
         
         i = 0
         while i < cappacity:
-            el = self.pop()
-            key = self.pop()
+            el = self.pop_value()
+            key = self.pop_value()
             self.heap_manager.add_table(table_value, key, el)
             i += 1
-        self.push(table_value)
+        self.push_value(table_value)
 
-    def new_array(self):
-        cappacity = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        resizable = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        immutable = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        gc = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        arr_val = self.heap_manager.new_array(cappacity, resizable, immutable, gc)
+    def new_array(self, cappacity, resizable, immutable, gc):
+        arr_val = self.heap_manager.new_array(cappacity, resizable, False, gc)
         i = 0
         while i < cappacity:
-            index = self.pop()
-            el = self.pop()
+            index = self.pop_value()
+            el = self.pop_value()
             self.heap_manager.arr_push_back(arr_val, el)
             i += 1
-        self.push(arr_val)
+        # a tuple is filled in before it's made immutable
+        if immutable:
+            self.heap_manager.freeze_array(arr_val)
+        self.push_value(arr_val)
+    
+    def new_packed_array(self, cappacity, el_type, resizable, gc):
+        arr_val = self.heap_manager.new_packed_array(cappacity, el_type, resizable, gc)
+        i = 0
+        while i < cappacity:
+            index = self.pop_value()
+            el = self.pop_value()
+            self.heap_manager.packed_push_back(arr_val, el)
+            i += 1
+        self.push_value(arr_val)
+    
+    def call_builtin(self, builtin, num_args):
+        args = []
+        i = 0
+        while i < num_args:
+            args.append(self.pop_value())
+            i += 1
+        args.reverse()
+        res = self.builtins[builtin](*args)
+        self.push_value(res)
+    
+    def array_extend(self):
+        src = self.pop_value()
+        arr = self.pop_value()
+        res = self.heap_manager.array_extend(arr, src)
+        self.push_value(res)
+    
+    def array_slice(self):
+        end = self.pop_value()
+        start = self.pop_value()
+        arr = self.pop_value()
+        res = self.heap_manager.array_slice(arr, start, end)
+        self.push_value(res)
+    
+    def array_copy(self):
+        arr = self.pop_value()
+        res = self.heap_manager.array_copy(arr)
+        self.push_value(res)
+    
+    def array_fill(self, num_args):
+        count = self.pop_value() if num_args == 3 else None
+        val = self.pop_value()
+        arr = self.pop_value()
+        res = self.heap_manager.array_fill(arr, val, count)
+        self.push_value(res)
+        
+    def new_deque(self, cappacity, resizable, gc):
+        deque_val = self.heap_manager.new_deque(cappacity, resizable, gc)
+        i = 0
+        while i < cappacity:
+            index = self.pop_value()
+            el = self.pop_value()
+            self.heap_manager.deque_push_back(deque_val, el)
+            i += 1
+        self.push_value(deque_val)
+    
+    def new_struct(self, num_fields, immutable, gc):
+        fields = []
+        i = 0
+        while i < num_fields:
+            el = self.pop_value()
+            key = self.pop_value()
+            fields.append((key, el))
+            i += 1
+        # the last field was on top of the stack, fields keep the order they were written in
+        fields.reverse()
+        struct_val = self.heap_manager.new_struct(fields, immutable, gc)
+        self.push_value(struct_val)
+    
+    def get_field(self, index):
+        struct = self.pop_value()
+        res = self.heap_manager.get_field(struct, index)
+        self.push_value(res)
+    
+    def set_field(self, index):
+        val = self.pop_value()
+        struct = self.pop_value()
+        self.heap_manager.set_field(struct, index, val)
         
     def insert_table(self):
-        val = self.pop()
-        key = self.pop()
-        struct = self.pop()
-        self.heap_manager.add_table(struct, key, val) 
+        val = self.pop_value()
+        key = self.pop_value()
+        struct = self.pop_value()
+        self.heap_manager.struct_insert(struct, key, val)
     
     def push_back_arr(self):
-        val = self.pop()
-        arr = self.pop()
-        self.heap_manager.arr_push_back(arr, val)
+        val = self.pop_value()
+        arr = self.pop_value()
+        self.heap_manager.struct_push_back(arr, val)
+    
+    def push_front(self):
+        val = self.pop_value()
+        struct = self.pop_value()
+        self.heap_manager.struct_push_front(struct, val)
     
     def pop_back(self):
-        arr = self.pop()
+        arr = self.pop_value()
         res = self.heap_manager.struct_pop_back(arr)
-        self.push(res)
+        self.push_value(res)
+    
+    def pop_front(self):
+        struct = self.pop_value()
+        res = self.heap_manager.struct_pop_front(struct)
+        self.push_value(res)
     
     def modify_structure(self):
-        val = self.pop()
-        key = self.pop()
-        struct = self.pop()
+        val = self.pop_value()
+        key = self.pop_value()
+        struct = self.pop_value()
         self.heap_manager.modify_structure(struct, key, val) 
     
     def access_struct(self):
-        key = self.pop()
-        struct = self.pop()
+        key = self.pop_value()
+        struct = self.pop_value()
         res = self.heap_manager.access_structure(struct, key)
-        self.push(res)
+        self.push_value(res)
     
     def struct_size(self):
-        struct = self.pop()
+        struct = self.pop_value()
         res = self.heap_manager.struct_size(struct)
-        self.push(res)
+        self.push_value(res)
     
     def pop_key_struct(self):
-        struct = self.pop()
-        key = self.pop()
+        struct = self.pop_value()
+        key = self.pop_value()
         res = self.heap_manager.pop_key_structure(struct, key)
-        self.push(res)
-        
-    def new_priority_queue(self):
-        cappacity = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        resizable = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        using_map = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        gc = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
+        self.push_value(res)
+        
+    def new_priority_queue(self, cappacity, resizable, using_map, gc):
         queue_val = self.heap_manager.new_priority_queue(resizable, using_map, cappacity, gc)
+        entries = []
         i = 0
         while i < cappacity:
-            priority = self.pop()
-            key = self.pop()
-            self.heap_manager.insert_priority_queue(queue_val, key, priority)
+            priority = self.pop_value()
+            key = self.pop_value()
+            entries.append((key, priority))
             i += 1
-        self.push(queue_val)
+        # heapified all at once, rather than one insert per entry
+        self.heap_manager.build_priority_queue(queue_val, entries)
+        self.push_value(queue_val)
     
-    def get_up_value(self):
-        index = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
+    def get_up_value(self, index):
         val = self.heap_manager.get_up_value(self.func_val, index, self.stack)
         self.push(val)
     
-    def set_up_value(self):
+    def set_up_value(self, index):
         val = self.pop()
-        index = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
         self.heap_manager.set_up_value(self.func_val, val, index, self.stack)
         
-    def static_func(self):
-        id_val = self.pop()
-        arity = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        
-        up_value_count = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
+    def call(self, call_arity):
+        func_val = self.pop_value()   
         
-        body_size = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
+        if self.frame_count == len(self.call_stack):
+            self.call_stack.append(CallFrame())
+        frame = self.call_stack[self.frame_count]
+        self.frame_count += 1
+        frame.ops = self.ops
+        frame.ip_addr = self.ip_addr
+        frame.arity = self.arity
+        frame.func_val = self.func_val
+        frame.offset = self.offset
+        frame.is_closure = self.is_closure
         
-        gc = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        
-        # Create a new function object
-        func_val = self.heap_manager.new_function(id_val, arity, body_size, up_value_count, gc)
-        
-        # Read in 
-        addr, size, id_val, arity, body_size, up_value_count, gc = self.heap_manager.read_function_header(func_val)
-
-        # Write the operations
-        self.ip_addr = self.heap_manager.load_function(addr, body_size, up_value_count, self.ops, self.ip_addr)
-        # Push the function object to the stack
-
-        self.push(func_val)
-        
-    def call(self):
-        call_arity = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8        
-        func_val = self.pop()   
         self.func_val = func_val        
-        self.is_closure = False
-        if func_val[0] == Values.ValueType.HEAP_OBJ.value:
+        self.is_closure = func_val[0] == Values.HEAP_OBJ_TYPE
+        if self.is_closure:
             self.closure_stack.append(func_val)
             addr, size, id_val, func_val, up_value_count, gc = self.heap_manager.read_closure_header(func_val)
-            self.is_closure  = True
-                   
-        self.call_stack.append(CallFrame(self.ops, self.ip_addr, self.arity, self.func_val, self.func_id, self.offset, self.is_closure))
-        self.offset = self.stack_ptr - (call_arity * 8)      
-
-        index = int.from_bytes(func_val[4:], byteorder="little")
-
-        self.ops = self.static_objs[index][16:]
-
+        
+        self.offset = self.stack_ptr - (call_arity * self.SLOT_SIZE)      
+        # function bodies are decoded once, when the VM is created
+        self.ops = self.code_objects[int.from_bytes(func_val[4:], byteorder="little")]
         self.ip_addr = 0
         self.arity = call_arity
-        self.func_id = ""
-        
             
     def return_call(self):    
         ret_val = self.pop()                
         
         self.stack_ptr = self.offset
         
-        if self.up_values != None:
+        if self.up_values.up_val != None:
             self.up_values = self.up_values.close_up_values(self.offset)
         
         self.push(ret_val)
         
-        frame = self.call_stack.pop()
-         
-        if frame.is_closure:
+        # the returning function's closure, if it is one
+        if self.is_closure:
             self.closure_stack.pop()
-                
+        
+        self.frame_count -= 1
+        frame = self.call_stack[self.frame_count]
         self.ops = frame.ops
         self.ip_addr = frame.ip_addr
         self.arity = frame.arity
         self.func_val = frame.func_val
-        self.func_id = frame.func_id
         self.offset = frame.offset      
         self.is_closure = frame.is_closure
         
@@ -477,24 +656,20 @@ class VM:
         
         i = 0
         while i < self.stack_ptr:
-            stack_str += Values.value_to_string(self.stack[i:i+8], self.heap_manager.static_objs, self.heap_manager)
+            stack_str += Values.value_to_string(self.stack_value(i), self.heap_manager.static_objs, self.heap_manager)
             stack_str += "|"
-            i += 8
+            i += self.SLOT_SIZE
         return stack_str
 
     def print_stack(self):
         print(self.stack_to_string())
     
-    def new_closure(self):
+    def new_closure(self, up_value_count, gc, up_values):
         outer_func = self.get_outer_func()  
         
 
-        id_val = self.pop()
-        func_val = self.pop()
-        up_value_count = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
-        gc = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-        self.ip_addr += 8
+        id_val = self.pop_value()
+        func_val = self.pop_value()
         
         closure_val = self.heap_manager.new_closure(id_val, func_val, up_value_count, gc)
 
@@ -503,13 +678,12 @@ class VM:
         i = 0
         addr += 28
         while i < up_value_count:
-            index_or_offset = Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-            is_local = Values.value_to_python_repr(self.ops[self.ip_addr+8:self.ip_addr+16])
+            index_or_offset, is_local, is_local_val = up_values[i]
             
             if is_local:
                 stack_addr = index_or_offset + self.offset
-                self.heap_manager.load_up_value(addr, Values.python_repr_to_value(stack_addr), self.ops[self.ip_addr+8:self.ip_addr+16], bytearray(b'\x02\x00\x00\x00\x00\x00\x00\x00'))
-                self.up_values = self.up_values.insert(UpValue(addr, stack_addr), stack_addr)
+                self.heap_manager.load_up_value(addr, Values.python_repr_to_value(stack_addr), is_local_val, bytearray(b'\x02\x00\x00\x00\x00\x00\x00\x00'))
+                self.up_values = self.up_values.insert(UpValue(closure_val, i, stack_addr), stack_addr)
                 
             else:
                 outer_addr, outer_size, outer_id_val, outer_func_val, outer_up_value_count, outer_gc = self.heap_manager.read_closure_header(outer_func)
@@ -520,126 +694,825 @@ class VM:
                 
                     stack_addr = Values.value_to_python_repr(self.heap_manager.index_or_offset(outer_up_val_addr))
                     
-                    self.up_values = self.up_values.insert(UpValue(addr, stack_addr), stack_addr)
+                    self.up_values = self.up_values.insert(UpValue(closure_val, i, stack_addr), stack_addr)
                     
-                    self.heap_manager.load_up_value(addr, self.heap_manager.index_or_offset(outer_up_val_addr), self.ops[self.ip_addr+8:self.ip_addr+16], bytearray(b'\x02\x00\x00\x00\x00\x00\x00\x00'))
+                    self.heap_manager.load_up_value(addr, self.heap_manager.index_or_offset(outer_up_val_addr), is_local_val, bytearray(b'\x02\x00\x00\x00\x00\x00\x00\x00'))
                 else:
-                    self.heap_manager.load_up_value(addr, self.heap_manager.index_or_offset(outer_up_val_addr), self.ops[self.ip_addr+8:self.ip_addr+16], bytearray(b'\x02\x00\x00\x00\x10\x00\x00\x00'))
+                    self.heap_manager.load_up_value(addr, self.heap_manager.index_or_offset(outer_up_val_addr), is_local_val, bytearray(b'\x02\x00\x00\x00\x10\x00\x00\x00'))
 
-            self.ip_addr += 16
             addr += 24
             i += 1
-        self.push(closure_val)
+        self.push_value(closure_val)
+        
+
+        
+    def build_dispatch_table(self):
+        """
+        Builds a list of handlers indexed by OpCode.value, so dispatching an opcode is a single list index instead of a chain of comparisons.
+        """
+        table = [None] * 256
+        table[op_codes.OpCode.SUM.value] = lambda: self.num_binary_op(op_codes.SUM)
+        table[op_codes.OpCode.SUB.value] = lambda: self.num_binary_op(op_codes.SUB)
+        table[op_codes.OpCode.MULT.value] = lambda: self.num_binary_op(op_codes.MULT)
+        table[op_codes.OpCode.DIV.value] = lambda: self.num_binary_op(op_codes.DIV)
+        table[op_codes.OpCode.MOD.value] = lambda: self.num_binary_op(op_codes.MOD)
+        table[op_codes.OpCode.CONST.value] = self.push_const
+        table[op_codes.OpCode.STATIC_STR.value] = self.push_str
+        table[op_codes.OpCode.AND.value] = lambda: self.bool_binary_op(op_codes.AND)
+        table[op_codes.OpCode.OR.value] = lambda: self.bool_binary_op(op_codes.OR)
+        table[op_codes.OpCode.NEGATE.value] = lambda: self.boolean_unary_op(op_codes.NEGATE)
+        table[op_codes.OpCode.SET_STATIC_GLOBAL.value] = self.set_static_global
+        table[op_codes.OpCode.GET_STATIC_GLOBAL.value] = self.get_static_global
+        table[op_codes.OpCode.SET_LOCAL.value] = self.set_local
+        table[op_codes.OpCode.GET_LOCAL.value] = self.get_local
+        table[op_codes.OpCode.POP.value] = self.pop_op
+        table[op_codes.OpCode.JUMP.value] = self.jump
+        table[op_codes.OpCode.JUMP_BACK.value] = self.jump
+        table[op_codes.OpCode.LESS_THAN.value] = lambda: self.comparison_op(op_codes.LESS_THAN)
+        table[op_codes.OpCode.GREATER_THAN.value] = lambda: self.comparison_op(op_codes.GREATER_THAN)
+        table[op_codes.OpCode.LESS_THAN_EQ.value] = lambda: self.comparison_op(op_codes.LESS_THAN_EQ)
+        table[op_codes.OpCode.GREATER_THAN_EQ.value] = lambda: self.comparison_op(op_codes.GREATER_THAN_EQ)
+        table[op_codes.OpCode.EQUAL.value] = lambda: self.comparison_op(op_codes.EQUAL)
+        table[op_codes.OpCode.EXPONENT.value] = lambda: self.num_binary_op(op_codes.EXPONENT)
+        table[op_codes.OpCode.ADD_I32.value] = lambda: self.typed_binary_op(operator.add, Values.value_to_i32, Values.i32_to_value)
+        table[op_codes.OpCode.SUB_I32.value] = lambda: self.typed_binary_op(operator.sub, Values.value_to_i32, Values.i32_to_value)
+        table[op_codes.OpCode.MUL_I32.value] = lambda: self.typed_binary_op(operator.mul, Values.value_to_i32, Values.i32_to_value)
+        table[op_codes.OpCode.MOD_I32.value] = lambda: self.typed_binary_op(operator.mod, Values.value_to_i32, Values.i32_to_value)
+        table[op_codes.OpCode.LT_I32.value] = lambda: self.typed_binary_op(operator.lt, Values.value_to_i32, Values.python_repr_to_value)
+        table[op_codes.OpCode.GT_I32.value] = lambda: self.typed_binary_op(operator.gt, Values.value_to_i32, Values.python_repr_to_value)
+        table[op_codes.OpCode.ADD_F32.value] = lambda: self.typed_binary_op(operator.add, Values.value_to_f32, Values.f32_to_value)
+        table[op_codes.OpCode.SUB_F32.value] = lambda: self.typed_binary_op(operator.sub, Values.value_to_f32, Values.f32_to_value)
+        table[op_codes.OpCode.MUL_F32.value] = lambda: self.typed_binary_op(operator.mul, Values.value_to_f32, Values.f32_to_value)
+        table[op_codes.OpCode.DIV_F32.value] = lambda: self.typed_binary_op(operator.truediv, Values.value_to_f32, Values.f32_to_value)
+        table[op_codes.OpCode.LT_F32.value] = lambda: self.typed_binary_op(operator.lt, Values.value_to_f32, Values.python_repr_to_value)
+        table[op_codes.OpCode.GT_F32.value] = lambda: self.typed_binary_op(operator.gt, Values.value_to_f32, Values.python_repr_to_value)
+        table[op_codes.OpCode.FACTORIAL.value] = lambda: self.num_unary_op(op_codes.FACTORIAL)
+        table[op_codes.OpCode.NEGATIVE.value] = lambda: self.num_unary_op(op_codes.NEGATIVE)
+        table[op_codes.OpCode.FALSE_JUMP.value] = self.false_jump
+        table[op_codes.OpCode.OUT.value] = self.out
+        table[op_codes.OpCode.NEW_TABLE.value] = self.new_table
+        table[op_codes.OpCode.NEW_ARRAY.value] = self.new_array
+        table[op_codes.OpCode.PUSH_BACK_ARRAY.value] = self.push_back_arr
+        table[op_codes.OpCode.POP_BACK.value] = self.pop_back
+        table[op_codes.OpCode.NEW_DEQUE.value] = self.new_deque
+        table[op_codes.OpCode.PUSH_FRONT.value] = self.push_front
+        table[op_codes.OpCode.POP_FRONT.value] = self.pop_front
+        table[op_codes.OpCode.NEW_STRUCT.value] = self.new_struct
+        table[op_codes.OpCode.GET_FIELD.value] = self.get_field
+        table[op_codes.OpCode.SET_FIELD.value] = self.set_field
+        table[op_codes.OpCode.NEW_PACKED_ARRAY.value] = self.new_packed_array
+        table[op_codes.OpCode.CALL_BUILTIN.value] = self.call_builtin
+        table[op_codes.OpCode.ARRAY_EXTEND.value] = self.array_extend
+        table[op_codes.OpCode.ARRAY_SLICE.value] = self.array_slice
+        table[op_codes.OpCode.ARRAY_COPY.value] = self.array_copy
+        table[op_codes.OpCode.ARRAY_FILL.value] = self.array_fill
+        table[op_codes.OpCode.ACCESS_STRUCT.value] = self.access_struct
+        table[op_codes.OpCode.INSERT_TABLE.value] = self.insert_table
+        table[op_codes.OpCode.MODIFY_STRUCT.value] = self.modify_structure
+        table[op_codes.OpCode.NULL.value] = self.push_null
+        table[op_codes.OpCode.STRUCT_SIZE.value] = self.struct_size
+        table[op_codes.OpCode.NEW_PRIORITY_QUEUE.value] = self.new_priority_queue
+        table[op_codes.OpCode.POP_KEY_STRUCT.value] = self.pop_key_struct
+        table[op_codes.OpCode.STOP.value] = self.stop
+        table[op_codes.OpCode.CALL.value] = self.call
+        table[op_codes.OpCode.NEW_CLOSURE.value] = self.new_closure
+        table[op_codes.OpCode.RETURN.value] = self.return_call
+        table[op_codes.OpCode.CLOSE_UP_VALUE.value] = self.close_up_value_op
+        table[op_codes.OpCode.GET_UP_VALUE.value] = self.get_up_value
+        table[op_codes.OpCode.SET_UP_VALUE.value] = self.set_up_value
+        table[op_codes.OpCode.INC_LOCAL.value] = self.inc_local
+        table[op_codes.OpCode.LESS_THAN_JUMP_FALSE.value] = self.less_than_jump_false
+        table[op_codes.OpCode.GET_LOCAL_GET_LOCAL.value] = self.get_local_get_local
+        for op in self.ALLOCATING_OPS:
+            table[op] = self.gc_safe_point(table[op])
+        return table
+    
+    def gc_safe_point(self, handler):
+        """
+        Wraps the handler of an op that allocates, so the garbage collector can run once it's done. Between instructions every live value is on the stack, in a global, a call frame or a closure, where heap_roots finds it.
+        """
+        heap_manager = self.heap_manager
+        def safe_point_handler(*operands):
+            res = handler(*operands)
+            if heap_manager.gc_phase != heaping.GC_IDLE or heap_manager.gc_needed():
+                heap_manager.gc_safe_point(self.heap_roots)
+            return res
+        return safe_point_handler
+    
+    def heap_roots(self):
+        """
+        The values the program can reach without going through the heap, other than the static globals which the heap manager keeps.
+        """
+        roots = []
+        i = 0
+        while i < self.stack_ptr:
+            roots.append(self.stack_value(i))
+            i += self.SLOT_SIZE
+        roots.extend(self.closure_stack)
+        if self.func_val != None:
+            roots.append(self.func_val)
+        i = 0
+        while i < self.frame_count:
+            if self.call_stack[i].func_val != None:
+                roots.append(self.call_stack[i].func_val)
+            i += 1
+        # closures with open up values are written to when the up values close
+        n = self.up_values
+        while n != None and n.up_val != None:
+            roots.append(n.up_val.closure_val)
+            n = n.next
+        return roots
+    
+    def collect_garbage(self):
+        # finishes a running cycle, or runs a whole new one
+        return self.heap_manager.collect_garbage(self.heap_roots)
+
+    def decode(self, ops, ip=1, bytecode_format=None):
+        """
+        Decodes a bytecode stream, starting at ip, into a list of (handler, operands) records. Operands are converted to python values once, constants are resolved from the pool and jump offsets are resolved to absolute record indices, so executing a record never touches the bytes again.
+        A program names its format in its first byte, a function body's format is passed in from its header.
+        """
+        if bytecode_format == None:
+            bytecode_format = ops[0]
+        if bytecode_format != op_codes.WIDE_FORMAT and bytecode_format != op_codes.COMPACT_FORMAT:
+            raise Exception("Invalid Bytecode Format!")
+            
+        # First pass: split the stream into opcodes and operands, remembering which record starts at each byte address
+        instructions = []
+        record_indices = {}
+        while ip < len(ops):
+            op = ops[ip]
+            record_indices[ip] = len(instructions)
+            ip += 1
+            if self.dispatch_table[op] == None:
+                raise Exception("Decoding Op Unimplemented!")
+            operand_addr = ip
+            operands, ip = op_codes.read_operands(ops, ip, op_codes.OPERAND_WIDTHS[op], bytecode_format)
+            if op == op_codes.OpCode.NEW_CLOSURE.value:
+                up_values = []
+                i = 0
+                while i < operands[0]:
+                    up_value, ip = op_codes.read_operands(ops, ip, op_codes.UP_VALUE_WIDTHS, bytecode_format)
+                    up_values.append(self.decode_up_value(up_value[0], up_value[1]))
+                    i += 1
+                operands.append(tuple(up_values))
+            instructions.append((op, operand_addr, operands))
+        # Falling off the end of a stream stops the VM
+        record_indices[ip] = len(instructions)
+        instructions.append((op_codes.OpCode.STOP.value, ip, []))
         
+        # Second pass: resolve constants and jump targets
+        records = []
+        for op, operand_addr, operands in instructions:
+            if op == op_codes.OpCode.CONST.value:
+                operands = [self.decode_const(self.const_pool[operands[0]])]
+            elif op == op_codes.OpCode.GET_LOCAL.value or op == op_codes.OpCode.SET_LOCAL.value:
+                operands = [self.decode_local(operands[0])]
+            elif op == op_codes.OpCode.GET_STATIC_GLOBAL.value or op == op_codes.OpCode.SET_STATIC_GLOBAL.value:
+                operands = [self.decode_global(operands[0])]
+            elif op == op_codes.OpCode.INC_LOCAL.value:
+                operands = [self.decode_local(operands[0]), self.decode_const(self.const_pool[operands[1]])]
+            elif op == op_codes.OpCode.GET_LOCAL_GET_LOCAL.value:
+                operands = [self.decode_local(operands[0]), self.decode_local(operands[1])]
+            elif op in op_codes.FORWARD_JUMP_OPS:
+                operands = [record_indices[operand_addr + operands[0]]]
+            elif op == op_codes.OpCode.JUMP_BACK.value:
+                operands = [record_indices[operand_addr - operands[0]]]
+            records.append((self.dispatch_table[op], tuple(operands)))
+        return records
+    
+    def decode_up_value(self, index_or_offset, is_local):
+        # An up value is an index or offset and an is local flag, the flag is also kept as a value for load_up_value
+        is_local = bool(is_local)
+        if is_local:
+            index_or_offset = self.decode_local(index_or_offset)
+        return (index_or_offset, is_local, Values.python_repr_to_value(is_local))
+    
+    def decode_static_functions(self, static_objs):
+        """
+        Decodes the body of every static function object, indexed like static_objs. A function object is a 16 byte header (type, format, size and arity) followed by its body.
+        """
+        code_objects = [None] * len(static_objs)
+        i = 0
+        while i < len(static_objs):
+            if static_objs[i][0] == Values.StaticObjectType.STATIC_FUNC.value:
+                code_objects[i] = self.decode(static_objs[i], 16, static_objs[i][1])
+            i += 1
+        return code_objects
+    
+    def execute_instruction(self, record):
+        handler, operands = record
+        return handler(*operands)
+    
+    def execute(self):
+        while True:
+            handler, operands = self.ops[self.ip_addr]
+            self.ip_addr += 1
+            if handler(*operands):
+                break
+        print("Ending Stack:", self.stack[0:self.stack_ptr])
+
+class NativeVM(VM):
+    """
+    Runs the same decoded program as VM, but the stack holds native python values: ints, floats, bools, None and HeapRef/StaticRef handles. Values are only converted to the 8 byte format where it's needed, when they're handed to the heap, stored as a global, captured by a closure or printed.
+    
+    Arithmetic is rounded to 32 bits after every operation, like VM: ints are range checked and floats rounded to the nearest f32 (see Values.round_native), so both print the same.
+    """
+    
+    SLOT_SIZE = 1
+    NUMBER_TYPES = (int, float)
+    
+    def new_stack(self, stack_size):
+        # stack of native values, one per slot
+        return [None] * stack_size
+    
+    def stack_high_water(self):
+        i = len(self.stack)
+        while i > 0 and self.stack[i-1] is None:
+            i -= 1
+        return i
+    
+    def build_dispatch_table(self):
+        table = super().build_dispatch_table()
+        table[op_codes.OpCode.SUM.value] = lambda: self.native_binary_op(operator.add)
+        table[op_codes.OpCode.SUB.value] = lambda: self.native_binary_op(operator.sub)
+        table[op_codes.OpCode.MULT.value] = lambda: self.native_binary_op(operator.mul)
+        table[op_codes.OpCode.DIV.value] = lambda: self.native_binary_op(operator.truediv)
+        table[op_codes.OpCode.MOD.value] = lambda: self.native_binary_op(operator.mod)
+        table[op_codes.OpCode.EXPONENT.value] = lambda: self.native_binary_op(operator.pow)
+        table[op_codes.OpCode.LESS_THAN.value] = lambda: self.native_ordering_op(op_codes.LESS_THAN, operator.lt)
+        table[op_codes.OpCode.GREATER_THAN.value] = lambda: self.native_ordering_op(op_codes.GREATER_THAN, operator.gt)
+        table[op_codes.OpCode.EQUAL.value] = self.native_equal
+        table[op_codes.OpCode.ADD_I32.value] = lambda: self.native_typed_op(operator.add, Values.native_i32)
+        table[op_codes.OpCode.SUB_I32.value] = lambda: self.native_typed_op(operator.sub, Values.native_i32)
+        table[op_codes.OpCode.MUL_I32.value] = lambda: self.native_typed_op(operator.mul, Values.native_i32)
+        table[op_codes.OpCode.MOD_I32.value] = lambda: self.native_typed_op(operator.mod, Values.native_i32)
+        table[op_codes.OpCode.LT_I32.value] = lambda: self.native_typed_compare(operator.lt)
+        table[op_codes.OpCode.GT_I32.value] = lambda: self.native_typed_compare(operator.gt)
+        table[op_codes.OpCode.ADD_F32.value] = lambda: self.native_typed_op(operator.add, Values.native_f32)
+        table[op_codes.OpCode.SUB_F32.value] = lambda: self.native_typed_op(operator.sub, Values.native_f32)
+        table[op_codes.OpCode.MUL_F32.value] = lambda: self.native_typed_op(operator.mul, Values.native_f32)
+        table[op_codes.OpCode.DIV_F32.value] = lambda: self.native_typed_op(operator.truediv, Values.native_f32)
+        table[op_codes.OpCode.LT_F32.value] = lambda: self.native_typed_compare(operator.lt)
+        table[op_codes.OpCode.GT_F32.value] = lambda: self.native_typed_compare(operator.gt)
+        return table
+    
+    def push(self, val):
+        if self.stack_ptr >= self.stack_end:
+            self.grow_stack()
+        self.stack[self.stack_ptr] = val
+        self.stack_ptr += 1
+    
+    def pop(self):
+        self.stack_ptr -= 1
+        if self.stack_ptr < 0:
+            raise Exception("Stack Underflow!")
+        return self.stack[self.stack_ptr]
+    
+    def push_value(self, val):
+        self.push(Values.value_to_native(val))
+    
+    def pop_value(self):
+        return Values.native_to_value(self.pop())
+    
+    def stack_value(self, stack_addr):
+        return Values.native_to_value(self.stack[stack_addr])
+    
+    def decode_const(self, val):
+        return Values.value_to_native(val)
+    
+    def decode_local(self, offset):
+        # The compiler lays locals out in 8 byte slots
+        return offset // 8
+    
+    def set_local(self, offset):
+        self.stack[self.offset + offset] = self.pop()
+    
+    def get_local(self, offset):
+        self.push(self.stack[self.offset + offset])
+    
+    def inc_local(self, offset, val):
+        index = self.offset + offset
+        self.stack[index] = Values.round_native(self.stack[index] + val)
+    
+    def get_local_get_local(self, offset1, offset2):
+        self.push(self.stack[self.offset + offset1])
+        self.push(self.stack[self.offset + offset2])
+    
+    def false_jump(self, target):
+        val = self.pop()
+        if type(val) != bool:
+            raise Exception("Expected a Boolean at Top of Stack!")
+        if not val:
+            self.ip_addr = target
+    
+    def less_than_jump_false(self, target):
+        o1 = self.pop()
+        o2 = self.pop()
+        if type(o1) in self.NUMBER_TYPES and type(o2) in self.NUMBER_TYPES:
+            res = o1 < o2
+        else:
+            res = self.compare(op_codes.LESS_THAN, Values.native_to_value(o1), Values.native_to_value(o2))
+        if not res:
+            self.ip_addr = target
+    
+    def native_binary_op(self, operator):
+        v1 = self.pop()
+        v2 = self.pop()
+        self.push(Values.round_native(operator(v1, v2)))
+    
+    def native_typed_op(self, operator, round_result):
+        # Both operands are proven numbers of the same type, so the top two slots are combined in place; round_result is Values.native_i32 or native_f32
+        stack = self.stack
+        top = self.stack_ptr - 1
+        stack[top-1] = round_result(operator(stack[top], stack[top-1]))
+        self.stack_ptr = top
+    
+    def native_typed_compare(self, operator):
+        stack = self.stack
+        top = self.stack_ptr - 1
+        stack[top-1] = operator(stack[top], stack[top-1])
+        self.stack_ptr = top
+    
+    def num_unary_op(self, op):
+        v = self.pop()
+        if op == op_codes.FACTORIAL:
+            self.push(Values.round_native(self.factorial(v)))
+        elif op == op_codes.NEGATIVE:
+            self.push(Values.round_native(-v))
+        else:
+            raise Exception("Invalid Integer Unary Op!")
+    
+    def truth(self, n):
+        # Non booleans are truthy by their payload, like the 8 byte format
+        if type(n) == bool:
+            return n
+        return bool(int.from_bytes(Values.native_to_value(n)[4:], byteorder='little'))
+    
+    def bool_binary_op(self, op):
+        v1 = self.truth(self.pop())
+        v2 = self.truth(self.pop())
+        if op == op_codes.AND:
+            self.push(v1 and v2)
+        elif op == op_codes.OR:
+            self.push(v1 or v2)
+        else:
+            raise Exception("Invalid Operation!")
+    
+    def boolean_unary_op(self, op):
+        v = self.truth(self.pop())
+        if op == op_codes.NEGATE:
+            self.push(not v)
+        else:
+            raise Exception("Invalid Unary Boolean Operator!")
+    
+    def native_ordering(self, op, operator, o1, o2):
+        if type(o1) in self.NUMBER_TYPES and type(o2) in self.NUMBER_TYPES:
+            return operator(o1, o2)
+        # Strings and max values are ordered by the 8 byte format's rules
+        return self.compare(op, Values.native_to_value(o1), Values.native_to_value(o2))
+    
+    def native_equality(self, o1, o2):
+        if type(o1) == type(o2) and type(o1) in (int, float, bool):
+            return o1 == o2
+        return self.compare(op_codes.EQUAL, Values.native_to_value(o1), Values.native_to_value(o2))
+    
+    def native_ordering_op(self, op, operator):
+        o1 = self.pop()
+        o2 = self.pop()
+        self.push(self.native_ordering(op, operator, o1, o2))
+    
+    def native_equal(self):
+        o1 = self.pop()
+        o2 = self.pop()
+        self.push(self.native_equality(o1, o2))
+    
+    def comparison_op(self, op):
+        o1 = self.pop()
+        o2 = self.pop()
+        self.push(self.compare(op, Values.native_to_value(o1), Values.native_to_value(o2)))
+    
+    def get_up_value(self, index):
+        is_closed, ref_or_stack_addr = self.heap_manager.up_value_location(self.func_val, index)
+        if is_closed:
+            self.push_value(self.heap_manager.read_dynamic_up_value(ref_or_stack_addr))
+        else:
+            self.push(self.stack[ref_or_stack_addr])
+    
+    def set_up_value(self, index):
+        val = self.pop()
+        is_closed, ref_or_stack_addr = self.heap_manager.up_value_location(self.func_val, index)
+        if is_closed:
+            self.heap_manager.write_dynamic_up_value(ref_or_stack_addr, Values.native_to_value(val))
+        else:
+            self.stack[ref_or_stack_addr] = val
 
+
+
+class RegisterTranslator:
+    """
+    Translates a stack program, a list of op_codes.Instruction, into RegisterVM records.
+    The stack depth before every instruction is known when translating, so each stack slot of a frame is used as a register: locals keep the slots they have on the stack, and the values an expression works on get the slots above them.
+    Pushes of constants and locals are deferred. They're kept as pending operands that a later instruction reads in place (a register or a constant), so GET_LOCAL a; CONST k; SUM becomes a single SUM dst, a, k. Pending operands are written to their slots (materialized) before anything else could read those slots: ops without a register form, jumps and jump targets.
+    """
+    
+    # change in stack depth of the ops that run through the stack handlers, CALL, CALL_BUILTIN, ARRAY_FILL and the structure constructors depend on their operands
+    STACK_EFFECTS = {
+        op_codes.OpCode.NEGATE.value: 0,
+        op_codes.OpCode.NEGATIVE.value: 0,
+        op_codes.OpCode.FACTORIAL.value: 0,
+        op_codes.OpCode.POP_BACK.value: 0,
+        op_codes.OpCode.POP_FRONT.value: 0,
+        op_codes.OpCode.GET_FIELD.value: 0,
+        op_codes.OpCode.ARRAY_COPY.value: 0,
+        op_codes.OpCode.STRUCT_SIZE.value: 0,
+        op_codes.OpCode.OUT.value: 0,
+        op_codes.OpCode.RETURN.value: 0,
+        op_codes.OpCode.STOP.value: 0,
+        op_codes.OpCode.STATIC_STR.value: 1,
+        op_codes.OpCode.GET_UP_VALUE.value: 1,
+        op_codes.OpCode.SET_UP_VALUE.value: -1,
+        op_codes.OpCode.CLOSE_UP_VALUE.value: -1,
+        op_codes.OpCode.AND.value: -1,
+        op_codes.OpCode.OR.value: -1,
+        op_codes.OpCode.LESS_THAN_EQ.value: -1,
+        op_codes.OpCode.GREATER_THAN_EQ.value: -1,
+        op_codes.OpCode.POP_KEY_STRUCT.value: -1,
+        op_codes.OpCode.ACCESS_STRUCT.value: -1,
+        op_codes.OpCode.NEW_CLOSURE.value: -1,
+        op_codes.OpCode.ARRAY_EXTEND.value: -1,
+        op_codes.OpCode.PUSH_BACK_ARRAY.value: -2,
+        op_codes.OpCode.PUSH_FRONT.value: -2,
+        op_codes.OpCode.SET_FIELD.value: -2,
+        op_codes.OpCode.ARRAY_SLICE.value: -2,
+        op_codes.OpCode.INSERT_TABLE.value: -3,
+        op_codes.OpCode.MODIFY_STRUCT.value: -3,
+    }
+    STRUCT_OPS = (op_codes.OpCode.NEW_TABLE.value, op_codes.OpCode.NEW_ARRAY.value, op_codes.OpCode.NEW_PRIORITY_QUEUE.value, op_codes.OpCode.NEW_DEQUE.value, op_codes.OpCode.NEW_STRUCT.value,
+        op_codes.OpCode.NEW_PACKED_ARRAY.value)
+    # jump target of records that aren't jumps, None is the end of the stream
+    NO_TARGET = False
+    
+    def __init__(self, vm, instructions, depth):
+        self.vm = vm
+        self.instructions = instructions
         
-    def execute_instruction(self, op):
-            if op == op_codes.SUM:
-                self.num_binary_op(op)
-            elif op == op_codes.SUB:
-                self.num_binary_op(op)
-            elif op == op_codes.MULT:
-                self.num_binary_op(op)
-            elif op == op_codes.DIV:
-                self.num_binary_op(op)
-            elif op == op_codes.MOD:
-                self.num_binary_op(op)
-            elif op == op_codes.CONST:
-                self.push_const()          
-            elif op == op_codes.STATIC_STR:
-                self.push_str()
-            elif op == op_codes.AND:
-                self.bool_binary_op(op)
-            elif op == op_codes.OR:
-                self.bool_binary_op(op)
-            elif op == op_codes.NEGATE:
-                self.boolean_unary_op(op)
-            elif op == op_codes.SET_STATIC_GLOBAL:
-                self.set_static_global()                
-            elif op == op_codes.GET_STATIC_GLOBAL:
-                self.get_static_global()
-            elif op == op_codes.SET_LOCAL:
-                self.set_local()
-            elif op == op_codes.GET_LOCAL:
-                self.get_local()          
-            elif op == op_codes.POP:
+        # stack depth, relative to the frame's offset, before the instruction being translated (None when it can't be reached)
+        self.depth = depth
+        self.max_depth = depth
+        # slot -> ("R", register) or ("K", constant) for pushes that haven't been written to their slot
+        self.pending = {}
+        
+        # each record is [handler, operands, jump target], a jump's target is an Instruction or None
+        self.records = []
+        self.record_indices = {}
+    
+    def push(self, operand):
+        self.pending[self.depth] = operand
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+    
+    def pop(self):
+        self.depth -= 1
+        if self.depth in self.pending:
+            return self.pending.pop(self.depth)
+        return ("R", self.depth)
+    
+    def emit(self, handler, operands, target=False):
+        self.records.append([handler, list(operands), target])
+    
+    def materialize(self, slot):
+        if slot in self.pending:
+            kind, val = self.pending.pop(slot)
+            if kind == "K":
+                self.emit(self.vm.load_const, (slot, val))
+            else:
+                self.emit(self.vm.move, (slot, val))
+    
+    def flush(self):
+        for slot in sorted(self.pending):
+            self.materialize(slot)
+    
+    def overwrite(self, register):
+        """
+        Called before an instruction writes a register. Pending reads of the register are materialized first, so they see its old value, and a pending value for the register itself is dropped.
+        """
+        for slot in sorted(self.pending):
+            if self.pending[slot] == ("R", register):
+                self.materialize(slot)
+        self.pending.pop(register, None)
+    
+    def emit_stack_op(self, op, operands):
+        # everything is written to the stack, which the stack handler works on from the current depth
+        self.flush()
+        self.emit(self.vm.stack_op, (self.depth, self.vm.dispatch_table[op], operands))
+    
+    def translate(self):
+        vm = self.vm
+        OpCode = op_codes.OpCode
+        CONST, NULL, GET_LOCAL, SET_LOCAL, GET_LOCAL_GET_LOCAL, INC_LOCAL = OpCode.CONST.value, OpCode.NULL.value, OpCode.GET_LOCAL.value, OpCode.SET_LOCAL.value, OpCode.GET_LOCAL_GET_LOCAL.value, OpCode.INC_LOCAL.value
+        GET_STATIC_GLOBAL, SET_STATIC_GLOBAL, POP = OpCode.GET_STATIC_GLOBAL.value, OpCode.SET_STATIC_GLOBAL.value, OpCode.POP.value
+        JUMP, JUMP_BACK, FALSE_JUMP, LESS_THAN_JUMP_FALSE = OpCode.JUMP.value, OpCode.JUMP_BACK.value, OpCode.FALSE_JUMP.value, OpCode.LESS_THAN_JUMP_FALSE.value
+        RETURN, STOP, CALL, NEW_CLOSURE = OpCode.RETURN.value, OpCode.STOP.value, OpCode.CALL.value, OpCode.NEW_CLOSURE.value
+        CALL_BUILTIN, ARRAY_FILL = OpCode.CALL_BUILTIN.value, OpCode.ARRAY_FILL.value
+        
+        targets = set()
+        for ins in self.instructions:
+            if ins.target != None:
+                targets.add(id(ins.target))
+        # depth at each jump target, set by the jumps to it
+        target_depths = {}
+        
+        i = 0
+        while i < len(self.instructions):
+            ins = self.instructions[i]
+            op = ins.op
+            operands = ins.operands
+            if id(ins) in targets:
+                # whatever falls through is written out before the target, jumps to it have already done so
+                if self.depth == None:
+                    self.depth = target_depths.get(id(ins))
+                else:
+                    self.flush()
+            self.record_indices[id(ins)] = len(self.records)
+            if self.depth == None:
+                # unreachable
+                i += 1
+                continue
+            
+            if op == CONST:
+                self.push(("K", vm.decode_const(vm.const_pool[operands[0]])))
+            elif op == NULL:
+                self.push(("K", None))
+            elif op == GET_LOCAL or op == GET_LOCAL_GET_LOCAL:
+                for offset in operands:
+                    register = vm.decode_local(offset)
+                    self.materialize(register)
+                    self.push(("R", register))
+            elif op == SET_LOCAL:
+                register = vm.decode_local(operands[0])
+                src = self.pop()
+                self.overwrite(register)
+                if src != ("R", register):
+                    self.emit(vm.register_handler(vm.move, vm.load_const, src), (register, src[1]))
+            elif op == INC_LOCAL:
+                register = vm.decode_local(operands[0])
+                self.materialize(register)
+                self.overwrite(register)
+                self.emit(vm.inc_local, (register, vm.decode_const(vm.const_pool[operands[1]])))
+            elif op == GET_STATIC_GLOBAL:
+                self.emit(vm.get_global, (self.depth, vm.decode_global(operands[0])))
+                self.depth += 1
+                self.max_depth = max(self.max_depth, self.depth)
+            elif op == SET_STATIC_GLOBAL:
+                src = self.pop()
+                self.emit(vm.register_handler(vm.set_global_r, vm.set_global_k, src), (vm.decode_global(operands[0]), src[1]))
+            elif op == POP:
                 self.pop()
-            elif op == op_codes.JUMP:
-                self.ip_addr += Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-            elif op == op_codes.JUMP_BACK:
-                self.ip_addr -= Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
-            elif op == op_codes.LESS_THAN:
-                self.comparison_op(op)
-            elif op == op_codes.GREATER_THAN:
-                self.comparison_op(op)
-            elif op == op_codes.LESS_THAN_EQ:
-                self.comparison_op(op)
-            elif op == op_codes.GREATER_THAN_EQ:
-                self.comparison_op(op)
-            elif op == op_codes.EQUAL:
-                self.comparison_op(op)
-            elif op == op_codes.EXPONENT:
-                self.num_binary_op(op)
-            elif op == op_codes.FACTORIAL:
-                self.num_unary_op(op)
-            elif op == op_codes.NEGATIVE:
-                self.num_unary_op(op)
-            elif op == op_codes.FALSE_JUMP:
-                val = self.pop()
-                if val[0] != Values.ValueType.BOOL.value:
-                    raise Exception("Expected a Boolean at Top of Stack!")
-                expr = bool(int.from_bytes(val[4:], byteorder='little'))
-                if not expr:
-                    self.ip_addr += Values.value_to_python_repr(self.ops[self.ip_addr:self.ip_addr+8])
+            elif op in vm.register_binary_ops:
+                lhs = self.pop()
+                rhs = self.pop()
+                next_ins = self.instructions[i+1] if i + 1 < len(self.instructions) else None
+                if op in vm.register_comparison_ops and next_ins != None and next_ins.op == FALSE_JUMP and not id(next_ins) in targets:
+                    # a comparison that's only branched on never needs its result in a register
+                    self.flush()
+                    self.emit_compare_jump(op, lhs, rhs, next_ins.target, target_depths)
+                    self.record_indices[id(next_ins)] = len(self.records)
+                    i += 1
+                else:
+                    self.emit_binary(op, lhs, rhs)
+            elif op == LESS_THAN_JUMP_FALSE:
+                lhs = self.pop()
+                rhs = self.pop()
+                self.flush()
+                self.emit_compare_jump(OpCode.LESS_THAN.value, lhs, rhs, ins.target, target_depths)
+            elif op == FALSE_JUMP:
+                cond = self.pop()
+                if cond[0] == "K":
+                    self.emit(vm.load_const, (self.depth, cond[1]))
+                    cond = ("R", self.depth)
+                self.flush()
+                self.emit(vm.jump_false, [cond[1], None], ins.target)
+                target_depths[id(ins.target)] = self.depth
+            elif op == JUMP or op == JUMP_BACK:
+                self.flush()
+                self.emit(vm.jump, [None], ins.target)
+                target_depths[id(ins.target)] = self.depth
+                self.depth = None
+            elif op in self.STACK_EFFECTS or op in self.STRUCT_OPS or op == CALL or op == CALL_BUILTIN or op == ARRAY_FILL:
+                if op == NEW_CLOSURE:
+                    up_values = []
+                    j = 2
+                    while j < len(operands):
+                        up_values.append(vm.decode_up_value(operands[j], operands[j+1]))
+                        j += 2
+                    operands = [operands[0], operands[1], tuple(up_values)]
+                self.emit_stack_op(op, tuple(operands))
+                if op == CALL:
+                    self.depth -= operands[0]
+                elif op == CALL_BUILTIN:
+                    # the arguments are replaced by the result
+                    self.depth += 1 - operands[1]
+                elif op == ARRAY_FILL:
+                    self.depth += 1 - operands[0]
+                elif op in self.STRUCT_OPS:
+                    self.depth += 1 - 2 * operands[0]
                 else:
-                    self.ip_addr += 8       
-            elif op == op_codes.OUT:
-                val = self.stack[self.stack_ptr-8 : self.stack_ptr]
-                Values.print_value(val, self.static_objs, self.heap_manager)
-            elif op == op_codes.NEW_TABLE:
-                self.new_table()
-            elif op == op_codes.NEW_ARRAY:
-                self.new_array()
-            elif op == op_codes.PUSH_BACK_ARRAY:
-                self.push_back_arr()
-            elif op == op_codes.POP_BACK:
-                self.pop_back()
-            elif op == op_codes.ACCESS_STRUCT:
-                self.access_struct()
-            elif op == op_codes.INSERT_TABLE:
-                self.insert_table()   
-            elif op == op_codes.MODIFY_STRUCT:
-                self.modify_structure()
-            elif op == op_codes.NULL:
-                self.push_null()
-            elif op == op_codes.STRUCT_SIZE:
-                self.struct_size()
-            elif op == op_codes.NEW_PRIORITY_QUEUE:
-                self.new_priority_queue()
-            elif op == op_codes.POP_KEY_STRUCT:
-                self.pop_key_struct()
-            elif op == op_codes.STOP:
-                return True
-            elif op == op_codes.CALL:
-                self.call()
-            elif op == op_codes.NEW_CLOSURE:
-                self.new_closure()
-            elif op == op_codes.RETURN:
-                self.return_call()
-            elif op == op_codes.CLOSE_UP_VALUE:
-                self.up_values = self.close_up_value()
-            elif op == op_codes.GET_UP_VALUE:
-                self.get_up_value()
-            elif op == op_codes.SET_UP_VALUE:
-                self.set_up_value()
+                    self.depth += self.STACK_EFFECTS[op]
+                self.max_depth = max(self.max_depth, self.depth)
+                if op == RETURN or op == STOP:
+                    self.depth = None
             else:
-                print(int.from_bytes(op, byteorder="little"))
-                raise Exception("Invalid Opcode!")
-    
-    def execute(self):   
-        while self.ip_addr < len(self.ops):
-            op = self.next_instruction()
-            res = self.execute_instruction(op)
-            if res:
-                break
-        print("Ending Stack:", self.stack[0:self.stack_ptr])
\ No newline at end of file
+                raise Exception("Decoding Op Unimplemented!")
+            i += 1
+        
+        # Falling off the end of a stream stops the VM
+        end_index = len(self.records)
+        if self.depth == None:
+            self.depth = 0
+        self.emit_stack_op(STOP, ())
+        
+        records = []
+        for handler, operands, target in self.records:
+            if target != self.NO_TARGET:
+                # a jump, its last operand is the record index it goes to
+                operands[-1] = end_index if target == None else self.record_indices[id(target)]
+            records.append((handler, tuple(operands)))
+        return records, self.max_depth
+    
+    def emit_binary(self, op, lhs, rhs):
+        dst = self.depth
+        if lhs[0] == "K" and rhs[0] == "K":
+            self.emit(self.vm.load_const, (dst, lhs[1]))
+            lhs = ("R", dst)
+        self.emit(self.vm.register_binary(op, lhs[0] + rhs[0]), (dst, lhs[1], rhs[1]))
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+    
+    def emit_compare_jump(self, op, lhs, rhs, target, target_depths):
+        if lhs[0] == "K" and rhs[0] == "K":
+            self.emit(self.vm.load_const, (self.depth, lhs[1]))
+            lhs = ("R", self.depth)
+        self.emit(self.vm.register_compare_jump(op, lhs[0] + rhs[0]), [lhs[1], rhs[1], None], target)
+        target_depths[id(target)] = self.depth
+
+class RegisterVM(NativeVM):
+    """
+    Runs programs as three-address register code, over the same native stack, constant pool, static objects and heap as NativeVM. A frame's stack slots are its registers, see RegisterTranslator, so SUM dst, lhs, rhs reads and writes slots directly where the stack machine pops two values and pushes a third.
+    Ops without a register form (calls, structures, closures, output...) run on NativeVM's stack handlers, after the stack pointer is set to the depth the translator worked out for them.
+    """
+    
+    def __init__(self, stack_size, ops, const_pool, static_objs, static_global_count=0, gc_budget=None, max_stack_size=None, heap_size=8*2048, max_heap_size=None):
+        # handlers made for each register op and operand kinds, see register_binary
+        self.register_handlers = {}
+        self.register_binary_ops = {
+            op_codes.OpCode.SUM.value: self.rounded(operator.add, Values.round_native),
+            op_codes.OpCode.SUB.value: self.rounded(operator.sub, Values.round_native),
+            op_codes.OpCode.MULT.value: self.rounded(operator.mul, Values.round_native),
+            op_codes.OpCode.DIV.value: self.rounded(operator.truediv, Values.round_native),
+            op_codes.OpCode.MOD.value: self.rounded(operator.mod, Values.round_native),
+            op_codes.OpCode.EXPONENT.value: self.rounded(operator.pow, Values.round_native),
+            op_codes.OpCode.LESS_THAN.value: functools.partial(self.native_ordering, op_codes.LESS_THAN, operator.lt),
+            op_codes.OpCode.GREATER_THAN.value: functools.partial(self.native_ordering, op_codes.GREATER_THAN, operator.gt),
+            op_codes.OpCode.EQUAL.value: self.native_equality,
+            # the type specialized ops need no type checks, their results are rounded to the one type they make
+            op_codes.OpCode.ADD_I32.value: self.rounded(operator.add, Values.native_i32),
+            op_codes.OpCode.SUB_I32.value: self.rounded(operator.sub, Values.native_i32),
+            op_codes.OpCode.MUL_I32.value: self.rounded(operator.mul, Values.native_i32),
+            op_codes.OpCode.MOD_I32.value: self.rounded(operator.mod, Values.native_i32),
+            op_codes.OpCode.LT_I32.value: operator.lt,
+            op_codes.OpCode.GT_I32.value: operator.gt,
+            op_codes.OpCode.ADD_F32.value: self.rounded(operator.add, Values.native_f32),
+            op_codes.OpCode.SUB_F32.value: self.rounded(operator.sub, Values.native_f32),
+            op_codes.OpCode.MUL_F32.value: self.rounded(operator.mul, Values.native_f32),
+            op_codes.OpCode.DIV_F32.value: self.rounded(operator.truediv, Values.native_f32),
+            op_codes.OpCode.LT_F32.value: operator.lt,
+            op_codes.OpCode.GT_F32.value: operator.gt,
+        }
+        self.register_comparison_ops = (op_codes.OpCode.LESS_THAN.value, op_codes.OpCode.GREATER_THAN.value, op_codes.OpCode.EQUAL.value,
+            op_codes.OpCode.LT_I32.value, op_codes.OpCode.GT_I32.value, op_codes.OpCode.LT_F32.value, op_codes.OpCode.GT_F32.value)
+        # number of registers each decoded stream uses, keyed by the id of its records
+        self.frame_sizes = {}
+        super().__init__(stack_size, ops, const_pool, static_objs, static_global_count, gc_budget, max_stack_size, heap_size, max_heap_size)
+    
+    def decode(self, ops, ip=1, bytecode_format=None, arity=0):
+        if bytecode_format == None:
+            bytecode_format = ops[0]
+        instructions = op_codes.disassemble(ops, ip, bytecode_format)
+        # a function's parameters are its first registers
+        records, frame_size = RegisterTranslator(self, instructions, arity).translate()
+        self.frame_sizes[id(records)] = frame_size
+        return records
+    
+    def decode_static_functions(self, static_objs):
+        code_objects = [None] * len(static_objs)
+        i = 0
+        while i < len(static_objs):
+            if static_objs[i][0] == Values.StaticObjectType.STATIC_FUNC.value:
+                arity = Values.value_to_python_repr(static_objs[i][8:16])
+                code_objects[i] = self.decode(static_objs[i], 16, static_objs[i][1], arity)
+            i += 1
+        return code_objects
+    
+    def check_frame_size(self):
+        while self.offset + self.frame_sizes[id(self.ops)] > self.stack_size:
+            self.grow_stack()
+    
+    def rounded(self, fn, round_result):
+        # an arithmetic op whose result is rounded to 32 bits like the stack machine's, see NativeVM
+        return lambda lhs, rhs: round_result(fn(lhs, rhs))
+    
+    def register_handler(self, r_handler, k_handler, operand):
+        # picks the handler for a register (R) or constant (K) operand
+        if operand[0] == "R":
+            return r_handler
+        return k_handler
+    
+    def register_binary(self, op, kinds):
+        """
+        Returns a handler for dst = lhs op rhs, where each operand is a register (R) or a constant (K)
+        """
+        key = (op, kinds)
+        if key in self.register_handlers:
+            return self.register_handlers[key]
+        fn = self.register_binary_ops[op]
+        if kinds == "RR":
+            def handler(dst, lhs, rhs):
+                stack = self.stack
+                offset = self.offset
+                stack[offset+dst] = fn(stack[offset+lhs], stack[offset+rhs])
+        elif kinds == "RK":
+            def handler(dst, lhs, rhs):
+                stack = self.stack
+                offset = self.offset
+                stack[offset+dst] = fn(stack[offset+lhs], rhs)
+        else:
+            def handler(dst, lhs, rhs):
+                stack = self.stack
+                offset = self.offset
+                stack[offset+dst] = fn(lhs, stack[offset+rhs])
+        self.register_handlers[key] = handler
+        return handler
+    
+    def register_compare_jump(self, op, kinds):
+        """
+        Returns a handler that jumps to target unless lhs op rhs, where each operand is a register (R) or a constant (K)
+        """
+        key = ("jump", op, kinds)
+        if key in self.register_handlers:
+            return self.register_handlers[key]
+        fn = self.register_binary_ops[op]
+        if kinds == "RR":
+            def handler(lhs, rhs, target):
+                stack = self.stack
+                offset = self.offset
+                if not fn(stack[offset+lhs], stack[offset+rhs]):
+                    self.ip_addr = target
+        elif kinds == "RK":
+            def handler(lhs, rhs, target):
+                stack = self.stack
+                offset = self.offset
+                if not fn(stack[offset+lhs], rhs):
+                    self.ip_addr = target
+        else:
+            def handler(lhs, rhs, target):
+                stack = self.stack
+                offset = self.offset
+                if not fn(lhs, stack[offset+rhs]):
+                    self.ip_addr = target
+        self.register_handlers[key] = handler
+        return handler
+    
+    def stack_op(self, depth, handler, operands):
+        self.stack_ptr = self.offset + depth
+        return handler(*operands)
+    
+    def move(self, dst, src):
+        self.stack[self.offset+dst] = self.stack[self.offset+src]
+    
+    def load_const(self, dst, val):
+        self.stack[self.offset+dst] = val
+    
+    def get_global(self, dst, addr):
+        self.stack[self.offset+dst] = Values.value_to_native(self.heap_manager.get_static_global(addr))
+    
+    def set_global_r(self, addr, src):
+        self.heap_manager.set_static_global(addr, Values.native_to_value(self.stack[self.offset+src]))
+    
+    def set_global_k(self, addr, val):
+        self.heap_manager.set_static_global(addr, Values.native_to_value(val))
+    
+    def jump_false(self, cond, target):
+        val = self.stack[self.offset+cond]
+        if type(val) != bool:
+            raise Exception("Expected a Boolean at Top of Stack!")
+        if not val:
+            self.ip_addr = target
+    
+    def call(self, call_arity):
+        super().call(call_arity)
+        self.check_frame_size()
+    
+    def execute(self):
+        self.check_frame_size()
+        super().execute()
@@ -52,6 +52,39 @@ class OpCode(Enum):
     SET_UP_VALUE = 47
     CLOSE_UP_VALUE = 48
     STATIC_FUNC = 49
+    # superinstructions, see compiling.fuse_superinstructions
+    INC_LOCAL = 50
+    LESS_THAN_JUMP_FALSE = 51
+    GET_LOCAL_GET_LOCAL = 52
+    # type specialized ops, emitted when the analyzer proved both operands are i32s (or f32s)
+    ADD_I32 = 53
+    SUB_I32 = 54
+    MUL_I32 = 55
+    MOD_I32 = 56
+    LT_I32 = 57
+    GT_I32 = 58
+    ADD_F32 = 59
+    SUB_F32 = 60
+    MUL_F32 = 61
+    DIV_F32 = 62
+    LT_F32 = 63
+    GT_F32 = 64
+    # deques; PUSH_BACK_ARRAY and POP_BACK work on their back, PUSH_FRONT (d >> v) and POP_FRONT (pop_front(d), see DEQUE_OPS) on their front
+    NEW_DEQUE = 66
+    PUSH_FRONT = 67
+    POP_FRONT = 68
+    # structs and records, fields are read and written at offsets the compiler resolved from their keys
+    NEW_STRUCT = 69
+    GET_FIELD = 70
+    SET_FIELD = 71
+    # arrays of unboxed I32s or F32s, and the builtins (see BUILTINS) that work on whole arrays
+    NEW_PACKED_ARRAY = 72
+    CALL_BUILTIN = 73
+    # whole range array operations, see ARRAY_OPS
+    ARRAY_EXTEND = 74
+    ARRAY_SLICE = 75
+    ARRAY_COPY = 76
+    ARRAY_FILL = 77
 
 SUM = (OpCode.SUM.value).to_bytes(1, byteorder="little")
 SUB = (OpCode.SUB.value).to_bytes(1, byteorder="little")
@@ -99,8 +132,216 @@ NEW_CLOSURE = (OpCode.NEW_CLOSURE.value).to_bytes(1, byteorder="little")
 CLOSE_UP_VALUE = (OpCode.CLOSE_UP_VALUE.value).to_bytes(1, byteorder="little")
 GET_UP_VALUE = (OpCode.GET_UP_VALUE.value).to_bytes(1, byteorder="little")
 SET_UP_VALUE = (OpCode.SET_UP_VALUE.value).to_bytes(1, byteorder="little")
+INC_LOCAL = (OpCode.INC_LOCAL.value).to_bytes(1, byteorder="little")
+LESS_THAN_JUMP_FALSE = (OpCode.LESS_THAN_JUMP_FALSE.value).to_bytes(1, byteorder="little")
+GET_LOCAL_GET_LOCAL = (OpCode.GET_LOCAL_GET_LOCAL.value).to_bytes(1, byteorder="little")
+ADD_I32 = (OpCode.ADD_I32.value).to_bytes(1, byteorder="little")
+SUB_I32 = (OpCode.SUB_I32.value).to_bytes(1, byteorder="little")
+MUL_I32 = (OpCode.MUL_I32.value).to_bytes(1, byteorder="little")
+MOD_I32 = (OpCode.MOD_I32.value).to_bytes(1, byteorder="little")
+LT_I32 = (OpCode.LT_I32.value).to_bytes(1, byteorder="little")
+GT_I32 = (OpCode.GT_I32.value).to_bytes(1, byteorder="little")
+ADD_F32 = (OpCode.ADD_F32.value).to_bytes(1, byteorder="little")
+SUB_F32 = (OpCode.SUB_F32.value).to_bytes(1, byteorder="little")
+MUL_F32 = (OpCode.MUL_F32.value).to_bytes(1, byteorder="little")
+DIV_F32 = (OpCode.DIV_F32.value).to_bytes(1, byteorder="little")
+LT_F32 = (OpCode.LT_F32.value).to_bytes(1, byteorder="little")
+GT_F32 = (OpCode.GT_F32.value).to_bytes(1, byteorder="little")
+NEW_DEQUE = (OpCode.NEW_DEQUE.value).to_bytes(1, byteorder="little")
+PUSH_FRONT = (OpCode.PUSH_FRONT.value).to_bytes(1, byteorder="little")
+POP_FRONT = (OpCode.POP_FRONT.value).to_bytes(1, byteorder="little")
+NEW_STRUCT = (OpCode.NEW_STRUCT.value).to_bytes(1, byteorder="little")
+GET_FIELD = (OpCode.GET_FIELD.value).to_bytes(1, byteorder="little")
+SET_FIELD = (OpCode.SET_FIELD.value).to_bytes(1, byteorder="little")
+NEW_PACKED_ARRAY = (OpCode.NEW_PACKED_ARRAY.value).to_bytes(1, byteorder="little")
+CALL_BUILTIN = (OpCode.CALL_BUILTIN.value).to_bytes(1, byteorder="little")
+ARRAY_EXTEND = (OpCode.ARRAY_EXTEND.value).to_bytes(1, byteorder="little")
+ARRAY_SLICE = (OpCode.ARRAY_SLICE.value).to_bytes(1, byteorder="little")
+ARRAY_COPY = (OpCode.ARRAY_COPY.value).to_bytes(1, byteorder="little")
+ARRAY_FILL = (OpCode.ARRAY_FILL.value).to_bytes(1, byteorder="little")
 
-def stringify_op(op_codes, index, consts):
+# Builtin functions, CALL_BUILTIN's first operand is an index into BUILTINS and its second the argument count, which must match BUILTIN_ARITIES
+BUILTINS = ("sum", "min", "max", "map", "sort", "extract_max")
+BUILTIN_ARITIES = {"sum": 1, "min": 1, "max": 1, "map": 3, "sort": 1, "extract_max": 2}
+# Builtins compiled to their own op, and the argument counts they take. ARRAY_FILL's operand is its argument count, the third is an optional element count
+ARRAY_OPS = {"extend": OpCode.ARRAY_EXTEND, "slice": OpCode.ARRAY_SLICE, "copy": OpCode.ARRAY_COPY, "fill": OpCode.ARRAY_FILL}
+ARRAY_OP_ARITIES = {"extend": (2,), "slice": (3,), "copy": (1,), "fill": (2, 3)}
+# Deque builtins, compiled to their own op like the array ops
+DEQUE_OPS = {"pop_front": OpCode.POP_FRONT}
+DEQUE_OP_ARITIES = {"pop_front": 1}
+
+# how stringify_op prints the type specialized ops
+TYPED_OP_NAMES = {
+    ADD_I32: "+i32", SUB_I32: "-i32", MUL_I32: "*i32", MOD_I32: "%i32", LT_I32: "<i32", GT_I32: ">i32",
+    ADD_F32: "+f32", SUB_F32: "-f32", MUL_F32: "*f32", DIV_F32: "/f32", LT_F32: "<f32", GT_F32: ">f32",
+}
+
+# Bytecode formats, the first byte of a program (and byte 1 of a function object's header) names the format its ops are in
+# WIDE_FORMAT: every operand is an 8 byte value
+# COMPACT_FORMAT: every operand is an unsigned little endian int, 1, 2 or 4 bytes wide depending on the opcode (see OPERAND_WIDTHS)
+WIDE_FORMAT = 1
+COMPACT_FORMAT = 2
+WIDE_OPERAND_SIZE = 8
+
+# Widths in bytes of the operands that follow each opcode in COMPACT_FORMAT, indexed by OpCode.value
+# NEW_CLOSURE is also followed by two operands (index or offset, is local) per up value, with widths UP_VALUE_WIDTHS
+OPERAND_WIDTHS = [()] * 256
+OPERAND_WIDTHS[OpCode.CONST.value] = (4,)
+OPERAND_WIDTHS[OpCode.STATIC_STR.value] = (4,)
+OPERAND_WIDTHS[OpCode.SET_STATIC_GLOBAL.value] = (4,)
+OPERAND_WIDTHS[OpCode.GET_STATIC_GLOBAL.value] = (4,)
+OPERAND_WIDTHS[OpCode.SET_LOCAL.value] = (2,)
+OPERAND_WIDTHS[OpCode.GET_LOCAL.value] = (2,)
+OPERAND_WIDTHS[OpCode.JUMP.value] = (4,)
+OPERAND_WIDTHS[OpCode.JUMP_BACK.value] = (4,)
+OPERAND_WIDTHS[OpCode.FALSE_JUMP.value] = (4,)
+OPERAND_WIDTHS[OpCode.NEW_TABLE.value] = (4, 1, 1, 1)
+OPERAND_WIDTHS[OpCode.NEW_ARRAY.value] = (4, 1, 1, 1)
+OPERAND_WIDTHS[OpCode.NEW_PRIORITY_QUEUE.value] = (4, 1, 1, 1)
+OPERAND_WIDTHS[OpCode.NEW_DEQUE.value] = (4, 1, 1)
+OPERAND_WIDTHS[OpCode.NEW_STRUCT.value] = (4, 1, 1)
+OPERAND_WIDTHS[OpCode.GET_FIELD.value] = (2,)
+OPERAND_WIDTHS[OpCode.SET_FIELD.value] = (2,)
+OPERAND_WIDTHS[OpCode.NEW_PACKED_ARRAY.value] = (4, 1, 1, 1)
+OPERAND_WIDTHS[OpCode.CALL_BUILTIN.value] = (1, 1)
+OPERAND_WIDTHS[OpCode.ARRAY_FILL.value] = (1,)
+OPERAND_WIDTHS[OpCode.NEW_CLOSURE.value] = (2, 1)
+OPERAND_WIDTHS[OpCode.CALL.value] = (1,)
+OPERAND_WIDTHS[OpCode.GET_UP_VALUE.value] = (2,)
+OPERAND_WIDTHS[OpCode.SET_UP_VALUE.value] = (2,)
+OPERAND_WIDTHS[OpCode.INC_LOCAL.value] = (2, 4)
+OPERAND_WIDTHS[OpCode.LESS_THAN_JUMP_FALSE.value] = (4,)
+OPERAND_WIDTHS[OpCode.GET_LOCAL_GET_LOCAL.value] = (2, 2)
+UP_VALUE_WIDTHS = (2, 1)
+
+# Ops whose only operand is a jump offset, relative to the operand's address
+FORWARD_JUMP_OPS = (OpCode.JUMP.value, OpCode.FALSE_JUMP.value, OpCode.LESS_THAN_JUMP_FALSE.value)
+JUMP_OPS = FORWARD_JUMP_OPS + (OpCode.JUMP_BACK.value,)
+
+def operand_widths(op, operands):
+    # NEW_CLOSURE's first operand is its up value count
+    if op == NEW_CLOSURE[0]:
+        return OPERAND_WIDTHS[op] + UP_VALUE_WIDTHS * operands[0]
+    return OPERAND_WIDTHS[op]
+
+def encode_operand(operand, width, bytecode_format):
+    """
+    Encodes an operand of an instruction, width is ignored in WIDE_FORMAT
+    """
+    if bytecode_format == WIDE_FORMAT:
+        return Values.python_repr_to_value(operand)
+    elif bytecode_format == COMPACT_FORMAT:
+        if operand < 0 or operand >= 1 << (8 * width):
+            raise Exception("Operand Does Not Fit its Width!")
+        return int(operand).to_bytes(width, byteorder="little")
+    else:
+        raise Exception("Invalid Bytecode Format!")
+
+def read_operand(op_codes, index, width, bytecode_format):
+    """
+    Reads the operand at index, returning it as a python value along with the index after it
+    """
+    if bytecode_format == WIDE_FORMAT:
+        return Values.value_to_python_repr(op_codes[index:index+WIDE_OPERAND_SIZE]), index+WIDE_OPERAND_SIZE
+    elif bytecode_format == COMPACT_FORMAT:
+        return int.from_bytes(op_codes[index:index+width], byteorder="little"), index+width
+    else:
+        raise Exception("Invalid Bytecode Format!")
+
+def read_operands(op_codes, index, widths, bytecode_format):
+    operands = []
+    for width in widths:
+        operand, index = read_operand(op_codes, index, width, bytecode_format)
+        operands.append(operand)
+    return operands, index
+
+class Instruction:
+    """
+    An op and its operands, as read from a bytecode stream. A jump points at the instruction it goes to (None for the end of the stream) instead of holding an offset, so a list of instructions can be rewritten and then assembled again.
+    """
+    __slots__ = ("op", "operands", "target")
+    
+    def __init__(self, op, operands, target=None):
+        self.op = op
+        self.operands = operands
+        self.target = target
+    
+    def size(self, bytecode_format):
+        if bytecode_format == WIDE_FORMAT:
+            return 1 + WIDE_OPERAND_SIZE * len(self.operands)
+        return 1 + sum(operand_widths(self.op, self.operands))
+    
+    def __repr__(self):
+        return f"Instruction[{OpCode(self.op).name}, {self.operands}]"
+
+def disassemble(op_codes, index, bytecode_format):
+    """
+    Reads the ops from index to the end of the stream into a list of Instructions
+    """
+    # opcodes as ints, looking up an Enum member's value is slow
+    new_closure, jump_back = OpCode.NEW_CLOSURE.value, OpCode.JUMP_BACK.value
+    instructions = []
+    instruction_addrs = {}
+    jumps = []
+    while index < len(op_codes):
+        op = op_codes[index]
+        instruction_addrs[index] = len(instructions)
+        index += 1
+        operand_addr = index
+        operands, index = read_operands(op_codes, index, OPERAND_WIDTHS[op], bytecode_format)
+        if op == new_closure:
+            up_values, index = read_operands(op_codes, index, UP_VALUE_WIDTHS * operands[0], bytecode_format)
+            operands += up_values
+        if op in FORWARD_JUMP_OPS:
+            jumps.append((len(instructions), operand_addr + operands[0]))
+        elif op == jump_back:
+            jumps.append((len(instructions), operand_addr - operands[0]))
+        instructions.append(Instruction(op, operands))
+    
+    for i, target_addr in jumps:
+        if target_addr == index:
+            instructions[i].target = None
+        else:
+            instructions[i].target = instructions[instruction_addrs[target_addr]]
+    return instructions
+
+def assemble(instructions, bytecode_format):
+    """
+    Encodes a list of Instructions, working out every jump's offset from where its target ended up. JUMP and JUMP_BACK are picked by the direction of the jump.
+    """
+    jump, jump_back = OpCode.JUMP.value, OpCode.JUMP_BACK.value
+    addrs = {}
+    addr = 0
+    for ins in instructions:
+        addrs[id(ins)] = addr
+        addr += ins.size(bytecode_format)
+    end_addr = addr
+    
+    op_codes = bytearray()
+    for ins in instructions:
+        op = ins.op
+        operands = ins.operands
+        if op in JUMP_OPS:
+            operand_addr = len(op_codes) + 1
+            target_addr = end_addr if ins.target == None else addrs[id(ins.target)]
+            if target_addr >= operand_addr:
+                if op == jump_back:
+                    op = jump
+                operands = [target_addr - operand_addr]
+            elif op == jump or op == jump_back:
+                op = jump_back
+                operands = [operand_addr - target_addr]
+            else:
+                raise Exception("Conditional Jumps Can't Jump Back!")
+        op_codes += op.to_bytes(1, byteorder="little")
+        widths = operand_widths(op, operands)
+        i = 0
+        while i < len(operands):
+            op_codes += encode_operand(operands[i], widths[i], bytecode_format)
+            i += 1
+    return op_codes
+
+def stringify_op(op_codes, index, consts, bytecode_format=WIDE_FORMAT):
     if op_codes[index:index+1] == SUM:
         return "+", index+1
     elif op_codes[index:index+1] == SUB:
@@ -112,115 +353,166 @@ def stringify_op(op_codes, index, consts):
     elif op_codes[index:index+1] == MOD:
         return "%", index+1
     elif op_codes[index:index+1] == CONST:
-        index += 1
-        return f"Const[{consts[Values.value_to_python_repr(op_codes[index:index+8])]}]", index+8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.CONST.value], bytecode_format)
+        return f"Const[{consts[operands[0]]}]", index
     elif op_codes[index:index+1] == STATIC_STR:
-        index += 1
-        return f"Static String[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.STATIC_STR.value], bytecode_format)
+        return f"Static String[{operands[0]}]", index
     elif op_codes[index:index+1] == AND:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "&&", index+1
     elif op_codes[index:index+1] == OR:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "||", index+1
     elif op_codes[index:index+1] == NEGATE:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "!", index+1
     elif op_codes[index:index+1] == SET_STATIC_GLOBAL:
-        index += 1
-        return f"Set Global[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.SET_STATIC_GLOBAL.value], bytecode_format)
+        return f"Set Global[{operands[0]}]", index
     elif op_codes[index:index+1] == GET_STATIC_GLOBAL:
-        index += 1
-        return f"Get Global[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.GET_STATIC_GLOBAL.value], bytecode_format)
+        return f"Get Global[{operands[0]}]", index
     elif op_codes[index:index+1] == SET_LOCAL:
-        index += 1
-        return f"Set Local[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.SET_LOCAL.value], bytecode_format)
+        return f"Set Local[{operands[0]}]", index
     elif op_codes[index:index+1] == GET_LOCAL:
-        index += 1
-        return f"Get Local[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.GET_LOCAL.value], bytecode_format)
+        return f"Get Local[{operands[0]}]", index
     elif op_codes[index:index+1] == POP:
         return "pop", index+1
     elif op_codes[index:index+1] == JUMP:
-        raise Exception("Decompiling Op Unimplemented!")
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.JUMP.value], bytecode_format)
+        return f"Jump[{operands[0]}]", index
     elif op_codes[index:index+1] == JUMP_BACK:
-        raise Exception("Decompiling Op Unimplemented!")
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.JUMP_BACK.value], bytecode_format)
+        return f"Jump Back[{operands[0]}]", index
     elif op_codes[index:index+1] == LESS_THAN:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "<", index+1
     elif op_codes[index:index+1] == GREATER_THAN:
-        raise Exception("Decompiling Op Unimplemented!")
+        return ">", index+1
     elif op_codes[index:index+1] == LESS_THAN_EQ:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "<=", index+1
     elif op_codes[index:index+1] == GREATER_THAN_EQ:
-        raise Exception("Decompiling Op Unimplemented!")
+        return ">=", index+1
     elif op_codes[index:index+1] == EQUAL:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "==", index+1
     elif op_codes[index:index+1] == EXPONENT:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "^", index+1
     elif op_codes[index:index+1] == FACTORIAL:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Factorial", index+1
     elif op_codes[index:index+1] == NEGATIVE:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Negative", index+1
     elif op_codes[index:index+1] == FALSE_JUMP:
-        raise Exception("Decompiling Op Unimplemented!")
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.FALSE_JUMP.value], bytecode_format)
+        return f"False Jump[{operands[0]}]", index
     elif op_codes[index:index+1] == OUT:
         return "out", index+1   
     elif op_codes[index:index+1] == NEW_TABLE:
-        raise Exception("Decompiling Op Unimplemented!")
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_TABLE.value], bytecode_format)
+        return f"New {'Set' if operands[2] else 'Table'}[{operands[0]}]", index
     elif op_codes[index:index+1] == NEW_ARRAY:
-        raise Exception("Decompiling Op Unimplemented!")
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_ARRAY.value], bytecode_format)
+        return f"New {'Immutable ' if operands[2] else ''}Array[{operands[0]}]", index
     elif op_codes[index:index+1] == PUSH_BACK_ARRAY:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Push Back", index+1
     elif op_codes[index:index+1] == POP_BACK:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Pop Back", index+1
     elif op_codes[index:index+1] == ACCESS_STRUCT:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Access Struct", index+1
     elif op_codes[index:index+1] == INSERT_TABLE:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Insert Table", index+1
     elif op_codes[index:index+1] == MODIFY_STRUCT:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Modify Struct", index+1
     elif op_codes[index:index+1] == NULL:
         return "null", index+1    
     elif op_codes[index:index+1] == STRUCT_SIZE:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Struct Size", index+1
     elif op_codes[index:index+1] == NEW_PRIORITY_QUEUE:
-        raise Exception("Decompiling Op Unimplemented!")
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_PRIORITY_QUEUE.value], bytecode_format)
+        return f"New Priority Queue[{operands[0]}]", index
     elif op_codes[index:index+1] == POP_KEY_STRUCT:
-        raise Exception("Decompiling Op Unimplemented!")
+        return "Pop Key", index+1
     elif op_codes[index:index+1] == STOP:
         return "stop", index+1  
     elif op_codes[index:index+1] == RETURN:
         return "return", index+1  
     elif op_codes[index:index+1] == NEW_CLOSURE:
-        index += 1
-        up_value_count = Values.value_to_python_repr(op_codes[index:index+8])
-        index += 8
-        gc = Values.value_to_python_repr(op_codes[index:index+8])
-        index += 8
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_CLOSURE.value], bytecode_format)
+        up_value_count, gc = operands
         
         up_val_str = "["
         i = 0
         while i < up_value_count:
-            index_or_offset = Values.value_to_python_repr(op_codes[index:index+8])
-            is_local = Values.value_to_python_repr(op_codes[index+8:index+16])
-            up_val_str += f"[{index_or_offset}, {is_local}]"
-            index += 16
+            up_value, index = read_operands(op_codes, index, UP_VALUE_WIDTHS, bytecode_format)
+            index_or_offset, is_local = up_value
+            up_val_str += f"[{index_or_offset}, {bool(is_local)}]"
             i += 1
         up_val_str += "]"
         return f"New Closure[Up Values:{up_val_str}]", index
         
     elif op_codes[index:index+1] == CALL:
-        index += 1
-        return f"Call[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8  
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.CALL.value], bytecode_format)
+        return f"Call[{operands[0]}]", index  
     elif op_codes[index:index+1] == CLOSE_UP_VALUE:
         return "Close Up Value", index+1
     elif op_codes[index:index+1] == GET_UP_VALUE:
-        index += 1
-        return f"Get Up Value[{Values.value_to_python_repr(op_codes[index:index+8])}]", index+8  
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.GET_UP_VALUE.value], bytecode_format)
+        return f"Get Up Value[{operands[0]}]", index  
+    elif op_codes[index:index+1] == SET_UP_VALUE:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.SET_UP_VALUE.value], bytecode_format)
+        return f"Set Up Value[{operands[0]}]", index
+    elif op_codes[index:index+1] == INC_LOCAL:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.INC_LOCAL.value], bytecode_format)
+        return f"Inc Local[{operands[0]}, Const[{consts[operands[1]]}]]", index
+    elif op_codes[index:index+1] == LESS_THAN_JUMP_FALSE:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.LESS_THAN_JUMP_FALSE.value], bytecode_format)
+        return f"Less Than Jump False[{operands[0]}]", index
+    elif op_codes[index:index+1] == GET_LOCAL_GET_LOCAL:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.GET_LOCAL_GET_LOCAL.value], bytecode_format)
+        return f"Get Local Get Local[{operands[0]}, {operands[1]}]", index
+    elif op_codes[index:index+1] == NEW_DEQUE:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_DEQUE.value], bytecode_format)
+        return f"New Deque[{operands[0]}]", index
+    elif op_codes[index:index+1] == PUSH_FRONT:
+        return "Push Front", index+1
+    elif op_codes[index:index+1] == POP_FRONT:
+        return "Pop Front", index+1
+    elif op_codes[index:index+1] == NEW_STRUCT:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_STRUCT.value], bytecode_format)
+        return f"New {'Record' if operands[1] else 'Struct'}[{operands[0]}]", index
+    elif op_codes[index:index+1] == GET_FIELD:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.GET_FIELD.value], bytecode_format)
+        return f"Get Field[{operands[0]}]", index
+    elif op_codes[index:index+1] == SET_FIELD:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.SET_FIELD.value], bytecode_format)
+        return f"Set Field[{operands[0]}]", index
+    elif op_codes[index:index+1] == NEW_PACKED_ARRAY:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.NEW_PACKED_ARRAY.value], bytecode_format)
+        return f"New Packed {'F32' if operands[1] == Values.F32_TYPE else 'I32'} Array[{operands[0]}]", index
+    elif op_codes[index:index+1] == CALL_BUILTIN:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.CALL_BUILTIN.value], bytecode_format)
+        return f"Call Builtin[{BUILTINS[operands[0]]}, {operands[1]}]", index
+    elif op_codes[index:index+1] == ARRAY_EXTEND:
+        return "Array Extend", index+1
+    elif op_codes[index:index+1] == ARRAY_SLICE:
+        return "Array Slice", index+1
+    elif op_codes[index:index+1] == ARRAY_COPY:
+        return "Array Copy", index+1
+    elif op_codes[index:index+1] == ARRAY_FILL:
+        operands, index = read_operands(op_codes, index+1, OPERAND_WIDTHS[OpCode.ARRAY_FILL.value], bytecode_format)
+        return f"Array Fill[{operands[0]}]", index
+    elif bytes(op_codes[index:index+1]) in TYPED_OP_NAMES:
+        return TYPED_OP_NAMES[bytes(op_codes[index:index+1])], index+1
     else:
         raise Exception("Invalid Op Code!")
         
         
-def decompile(op_codes, consts):
+def decompile(op_codes, consts, index=1, bytecode_format=None):
+    """
+    Prints the ops of a program, which start after its format byte. For a function object pass index=16 and the format from byte 1 of its header.
+    """
+    if bytecode_format == None:
+        bytecode_format = op_codes[0]
     decompiled_ops = []
-    index = 0
     while index < len(op_codes):
-        str_op, index = stringify_op(op_codes, index, consts)
+        str_op, index = stringify_op(op_codes, index, consts, bytecode_format)
         decompiled_ops.append(str_op)
-    print(decompiled_ops)
\ No newline at end of file
+    print(decompiled_ops)
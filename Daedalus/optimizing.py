@@ -0,0 +1,176 @@
+import Values, op_codes
+
+class PeepholeOptimizer:
+    """
+    Optimizes compiled bytecode, it runs between BaseCompiler.compile and the VM. The main program and every function body are disassembled into lists of op_codes.Instruction, rewritten until nothing changes and then assembled again:
+    - a push followed by a POP is removed
+    - a jump to an unconditional jump goes straight to where that jump goes
+    - an unconditional jump to the next instruction is removed
+    - instructions that can't be reached are removed
+    """
+
+    # ops that only push a value, so they can be dropped along with a POP right after them
+    PUSH_OPS = (op_codes.OpCode.CONST.value, op_codes.OpCode.NULL.value, op_codes.OpCode.STATIC_STR.value, op_codes.OpCode.GET_LOCAL.value, op_codes.OpCode.GET_STATIC_GLOBAL.value, op_codes.OpCode.GET_UP_VALUE.value)
+    UNCONDITIONAL_JUMP_OPS = (op_codes.OpCode.JUMP.value, op_codes.OpCode.JUMP_BACK.value)
+    # ops that never fall through to the next instruction
+    TERMINATOR_OPS = UNCONDITIONAL_JUMP_OPS + (op_codes.OpCode.RETURN.value, op_codes.OpCode.STOP.value)
+
+    def __init__(self, ops, consts, static_objs):
+        self.ops = ops
+        self.consts = consts
+        self.static_objs = static_objs
+
+        self.bytes_removed = 0
+        self.instructions_removed = 0
+
+    def optimize(self):
+        """
+        Returns the optimized program as (ops, consts, static_objs), like BaseCompiler.compile
+        """
+        ops = self.optimize_stream(self.ops, 1, self.ops[0])
+        static_objs = []
+        for obj in self.static_objs:
+            if obj[0] == Values.StaticObjectType.STATIC_FUNC.value:
+                # function objects have a 16 byte header, byte 1 is the format and bytes 4 to 8 the size
+                obj = self.optimize_stream(obj, 16, obj[1])
+                obj[4:8] = len(obj).to_bytes(4, byteorder='little')
+            static_objs.append(obj)
+        return ops, self.consts, static_objs
+
+    def optimize_stream(self, ops, start, bytecode_format):
+        instructions = op_codes.disassemble(ops, start, bytecode_format)
+        instruction_count = len(instructions)
+
+        changed = True
+        while changed:
+            instructions, removed_pairs = self.remove_push_pops(instructions)
+            threaded = self.thread_jumps(instructions)
+            instructions, removed_jumps = self.remove_jumps_to_next(instructions)
+            instructions, removed_unreachable = self.remove_unreachable(instructions)
+            changed = removed_pairs or threaded or removed_jumps or removed_unreachable
+
+        optimized = ops[:start] + op_codes.assemble(instructions, bytecode_format)
+        self.instructions_removed += instruction_count - len(instructions)
+        self.bytes_removed += len(ops) - len(optimized)
+        return optimized
+
+    def jump_targets(self, instructions):
+        targets = set()
+        for ins in instructions:
+            if ins.target != None:
+                targets.add(id(ins.target))
+        return targets
+
+    def remove_instructions(self, instructions, removed):
+        """
+        Removes the instructions whose ids are in removed. A jump to a removed instruction goes to the next instruction kept instead.
+        """
+        kept = []
+        replacements = {}
+        pending = []
+        for ins in instructions:
+            if id(ins) in removed:
+                pending.append(ins)
+            else:
+                for r in pending:
+                    replacements[id(r)] = ins
+                pending = []
+                kept.append(ins)
+        # removed instructions at the end are replaced by the end of the stream
+        for r in pending:
+            replacements[id(r)] = None
+
+        for ins in kept:
+            if ins.target != None and id(ins.target) in replacements:
+                ins.target = replacements[id(ins.target)]
+        return kept
+
+    def remove_push_pops(self, instructions):
+        targets = self.jump_targets(instructions)
+        removed = set()
+        i = 0
+        while i < len(instructions) - 1:
+            ins = instructions[i]
+            next_ins = instructions[i+1]
+            if next_ins.op == op_codes.OpCode.POP.value and not id(next_ins) in targets:
+                if ins.op in self.PUSH_OPS:
+                    removed.add(id(ins))
+                    removed.add(id(next_ins))
+                    i += 2
+                    continue
+                elif ins.op == op_codes.OpCode.GET_LOCAL_GET_LOCAL.value:
+                    # only the second local is popped
+                    ins.op = op_codes.OpCode.GET_LOCAL.value
+                    ins.operands = [ins.operands[0]]
+                    removed.add(id(next_ins))
+                    i += 2
+                    continue
+            i += 1
+        return self.remove_instructions(instructions, removed), len(removed) > 0
+
+    def thread_jumps(self, instructions):
+        indices = {}
+        i = 0
+        while i < len(instructions):
+            indices[id(instructions[i])] = i
+            i += 1
+
+        threaded = False
+        for ins in instructions:
+            if not ins.op in op_codes.JUMP_OPS:
+                continue
+            target = ins.target
+            seen = set()
+            while target != None and target.op in self.UNCONDITIONAL_JUMP_OPS and not id(target) in seen:
+                seen.add(id(target))
+                target = target.target
+            if target is ins.target or id(target) in seen:
+                # no chain to follow, or the chain loops forever
+                continue
+            # conditional jumps can only go forward
+            if ins.op in self.UNCONDITIONAL_JUMP_OPS or target == None or indices[id(target)] > indices[id(ins)]:
+                ins.target = target
+                threaded = True
+        return threaded
+
+    def remove_jumps_to_next(self, instructions):
+        removed = set()
+        i = 0
+        while i < len(instructions):
+            ins = instructions[i]
+            next_ins = instructions[i+1] if i + 1 < len(instructions) else None
+            if ins.op in self.UNCONDITIONAL_JUMP_OPS and ins.target is next_ins:
+                removed.add(id(ins))
+            i += 1
+        return self.remove_instructions(instructions, removed), len(removed) > 0
+
+    def remove_unreachable(self, instructions):
+        indices = {}
+        i = 0
+        while i < len(instructions):
+            indices[id(instructions[i])] = i
+            i += 1
+
+        reachable = set()
+        work = [0]
+        while len(work) > 0:
+            i = work.pop()
+            if i >= len(instructions) or i in reachable:
+                continue
+            reachable.add(i)
+            ins = instructions[i]
+            if ins.target != None:
+                work.append(indices[id(ins.target)])
+            if not ins.op in self.TERMINATOR_OPS:
+                work.append(i+1)
+
+        removed = set()
+        i = 0
+        while i < len(instructions):
+            if not i in reachable:
+                removed.add(id(instructions[i]))
+            i += 1
+        return self.remove_instructions(instructions, removed), len(removed) > 0
+
+    def print_report(self):
+        print(f"Peephole Optimizer: removed {self.instructions_removed} instructions ({self.bytes_removed} bytes)")
@@ -1,6 +1,6 @@
 from mpi4py import MPI
-import time
-import base_lexing, base_parsing, compiling, interpreting, heaping, analyzing, expansion, interpreter, base_ast_objects
+import argparse, time
+import base_lexing, base_parsing, compiling, optimizing, interpreting, heaping, analyzing, expansion, interpreter, base_ast_objects
 from ParserBuilder import *
 
 def build_compiler(grammar, expansion_classes):
@@ -25,7 +25,10 @@ def build_compiler(grammar, expansion_classes):
     
     return parser, i
 
-def parallel_expand(parser, interpreter, program, run=False):
+def parallel_expand(parser, interpreter, program, run=False, stack_size=1024, vm_options={}, reports=False):
+    """
+    Expands a program in parallel, then (if run) compiles and runs it on the VM. vm_options are passed to the VM, e.g. its memory limits. If reports, the optimizer's, garbage collector's and VM's memory reports are printed after the run.
+    """
     t0 = time.perf_counter()
     
     # Generate a RAW AST for the program
@@ -55,9 +58,16 @@ def parallel_expand(parser, interpreter, program, run=False):
 
                 c = compiling.BaseCompiler(result_ast)
                 ops, consts, static_objs = c.compile()
+                optimizer = optimizing.PeepholeOptimizer(ops, consts, static_objs)
+                ops, consts, static_objs = optimizer.optimize()
+                if reports:
+                    optimizer.print_report()
                     
-                vm = interpreting.VM(1024, ops, consts, static_objs)
+                vm = interpreting.VM(stack_size, ops, consts, static_objs, c.static_global_count(), **vm_options)
                 vm.execute()
+                if reports:
+                    vm.heap_manager.print_gc_report()
+                    vm.print_memory_report()
                 print(time.perf_counter() - t0)
     else:
         # Run it in parallel only if the Raw AST can be partitioned into at least one statement per process
@@ -101,15 +111,31 @@ def parallel_expand(parser, interpreter, program, run=False):
 
                 c = compiling.BaseCompiler(result_ast)
                 ops, consts, static_objs = c.compile()
+                optimizer = optimizing.PeepholeOptimizer(ops, consts, static_objs)
+                ops, consts, static_objs = optimizer.optimize()
+                if reports:
+                    optimizer.print_report()
                 
-                vm = interpreting.VM(1024, ops, consts, static_objs)
+                vm = interpreting.VM(stack_size, ops, consts, static_objs, c.static_global_count(), **vm_options)
                 vm.execute()
+                if reports:
+                    vm.heap_manager.print_gc_report()
+                    vm.print_memory_report()
                 
     if rank == 0:
         # A useful tooltip for debugging (ensure the program finishes)
         print("Completed Execution")        
                 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Expand Daedalus programs in parallel and run them on the VM.")
+    arg_parser.add_argument("--stack-size", type=int, default=1024, help="initial VM stack size in slots")
+    arg_parser.add_argument("--max-stack-size", type=int, default=interpreting.VM.MAX_STACK_SIZE, help="slots the VM stack can grow to")
+    arg_parser.add_argument("--heap-size", type=int, default=8*2048, help="initial dynamic heap size in bytes")
+    arg_parser.add_argument("--max-heap-size", type=int, default=interpreting.VM.MAX_HEAP_SIZE, help="bytes the dynamic heap can grow to")
+    arg_parser.add_argument("--reports", action="store_true", help="print the optimizer, garbage collector and memory reports after each run")
+    args = arg_parser.parse_args()
+    vm_options = {"max_stack_size": args.max_stack_size, "heap_size": args.heap_size, "max_heap_size": args.max_heap_size}
+    
     # PEG
     grammar = """
             start = all_white_space* (statement[statement] all_white_space*)*;
@@ -341,7 +367,7 @@ if __name__ == "__main__":
     
 
     for prog in progs:
-        parallel_expand(p, i, prog, run=True)
+        parallel_expand(p, i, prog, run=True, stack_size=args.stack_size, vm_options=vm_options, reports=args.reports)
 
 
 